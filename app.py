@@ -2,6 +2,9 @@
 # A comprehensive Teacher and Student AI Analysis Tool with role-based auth, a live AI assistant,
 # automated alerts, and instructor-controlled sessions.
 
+import time
+BOOT_STARTED = time.perf_counter()
+
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -11,43 +14,144 @@ import calendar
 import base64
 import requests
 import re
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from flask import Flask, render_template_string, jsonify, request, session, redirect, url_for, send_file, send_from_directory, Response
-from datetime import datetime, timedelta
+import importlib
+from flask import Flask, render_template_string, jsonify, request, session, redirect, url_for, send_file, send_from_directory, Response, make_response, flash
+from datetime import datetime, timedelta, timezone
 from collections import defaultdict
-import pandas as pd
 from io import BytesIO
 from getpass import getpass
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 import uuid
-from fpdf import FPDF
+import numpy as np
+import threading
+import atexit
+import sys
+import hashlib
+import math
+import csv
+import io
+import zipfile
+from itertools import chain
+from array import array
+from collections import deque
+import queue
+import random
+import gzip
+import shutil
+import argparse
+import zlib
+try:
+    import brotli
+except ImportError:  # Responses are then compressed with gzip only.
+    brotli = None
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+try:
+    import resource
+except ImportError:  # Windows; peak memory is then left out of the startup report.
+    resource = None
+
+# --- Startup Profiling and Deferred Imports ---
+# Dependencies used only by exports, PDF reports, email alerts and AI attachment preprocessing (fpdf2,
+# openpyxl, the email MIME stack, Pillow, pypdf, the XML parsers, multiprocessing and concurrent.futures)
+# are imported on first use rather than at module load, so every worker process, spawned pool process and
+# reloader restart boots without paying for them. numpy stays a module-level import: the check-in table,
+# archive and rollup code declares its column dtypes with it and runs on the first check-in or dashboard view.
+STARTUP_BUDGET_MS = int(os.getenv('STARTUP_BUDGET_MS', 1500))
+
+startup_report = {'import_ms': None, 'deferred_imports': {}, 'forked_at': None}
+deferred_import_lock = threading.Lock()
+_missing_modules = set()
+
+def deferred_import(module_name, optional=False):
+    """Imports a heavy module on first use and records how long that took. Optional modules return None if missing."""
+    module = sys.modules.get(module_name)
+    # A module another thread is still importing is already in sys.modules; wait for that import instead.
+    if module is not None and not getattr(getattr(module, '__spec__', None), '_initializing', False):
+        return module
+    with deferred_import_lock:
+        if module_name in _missing_modules:
+            return None
+        started = time.perf_counter()
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            if not optional:
+                raise
+            _missing_modules.add(module_name)
+            return None
+        startup_report['deferred_imports'][module_name] = round((time.perf_counter() - started) * 1000, 1)
+        return module
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def print_startup_report(label, forked_at=None):
+    """`forked_at` (a perf_counter value) marks a worker forked from a master that already imported the app;
+    the worker then reports its own boot time and labels the import time as the master's."""
+    import_ms = startup_report['import_ms']
+    if forked_at is None:
+        timing = f"app import {import_ms:.0f} ms"
+    else:
+        timing = f"ready {(time.perf_counter() - forked_at) * 1000:.0f} ms after fork (app import {import_ms:.0f} ms, inherited from the master)"
+    print(f"[startup] {label} pid={os.getpid()} {timing}, "
+          f"{len(sys.modules)} modules loaded, peak RSS {peak_rss_mb() or 'n/a'} MB")
+    if forked_at is None and import_ms > STARTUP_BUDGET_MS:
+        print(f"[startup] WARNING: app import exceeded the {STARTUP_BUDGET_MS} ms budget; "
+              "run `python -X importtime app.py` to find the slow imports.")
 
 # --- App Initialization ---
 app = Flask(__name__)
-app.secret_key = 'a-super-secret-key-for-development-only-please-change-it'
+app.secret_key = os.getenv('FLASK_SECRET_KEY', 'a-super-secret-key-for-development-only-please-change-it')
 UPLOAD_FOLDER = 'uploads'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# 'workers' is set by `python app.py serve` before worker processes are forked; 'run_id' identifies this
+# server run so that work claimed by a previous, crashed run can be told apart from live claims.
+# 'stream_slots' caps the live-update streams one process holds open (0: no cap, as under the dev server).
+serve_state = {'workers': 1, 'stream_slots': 0, 'draining': False, 'run_id': uuid.uuid4().hex}
 
 # --- File Definitions ---
+# DATA_FILE, ALERTS_FILE, CALENDAR_UPLOADS_FILE and SENT_NOTIFICATIONS_FILE are only read once, when they
+# are moved into the write-ahead log stores (see JournaledStore).
 DATA_FILE = 'checkins.json'
+ARCHIVE_FOLDER = 'archive'
+ARCHIVE_MANIFEST_FILE = os.path.join(ARCHIVE_FOLDER, 'manifest.json')
+ROLLUP_FOLDER = 'rollups'
+ROLLUP_MANIFEST_FILE = os.path.join(ROLLUP_FOLDER, 'manifest.json')
+COLD_STORAGE_FOLDER = 'cold_storage'
+RETENTION_POLICY_FILE = 'retention_policy.json'
+RETENTION_REPORTS_FILE = 'retention_reports.json'
 STATUS_FILE = 'status.json'
 USERS_FILE = 'users.json'
 ALERTS_FILE = 'alerts.json'
+RESOLVED_ALERTS_FILE = 'alerts_resolved.jsonl'
 CALENDAR_UPLOADS_FILE = 'calendar_uploads.json'
 SENT_NOTIFICATIONS_FILE = 'sent_notifications.json'
+EXPORT_CACHE_FOLDER = 'export_cache'
+ALERT_RULES_FILE = 'alert_rules.json'
+TREND_SCORES_FILE = 'trend_scores.json'
 # EXPANDED to include a wide array of code and text file types
 ACCEPTED_FILE_TYPES = 'image/*,.pdf,.txt,.md,.py,.js,.html,.css,.java,.c,.cpp,.cs,.rb,.php,.swift,.go,.rs,.kt,.sql,.xml,.json,.yaml,.yml,.sh,.bat,.ps1,.doc,.docx,.ppt,.pptx,.xls,.xlsx,.pages,.key,.numbers,.odt,application/pdf,application/msword,application/vnd.openxmlformats-officedocument.wordprocessingml.document,text/*'
 
 # --- Data Persistence & Setup ---
 def setup_app():
-    if not os.path.exists(UPLOAD_FOLDER):
-        os.makedirs(UPLOAD_FOLDER)
-    for file, default in [(CALENDAR_UPLOADS_FILE, {}), (ALERTS_FILE, []), (SENT_NOTIFICATIONS_FILE, {})]:
-        if not os.path.exists(file):
-            save_data(file, default)
+    for folder in (UPLOAD_FOLDER, ARCHIVE_FOLDER, ROLLUP_FOLDER, COLD_STORAGE_FOLDER, EXPORT_CACHE_FOLDER, STORE_FOLDER):
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+    recover_stores()
+    sync_student_registry()
+    with checkin_lock:
+        finish_pending_seal()
+        finish_pending_compaction()
+    fail_orphaned_guidance_jobs()
+    prune_bundles()
 
 def load_data(file_path, default_data):
     if not os.path.exists(file_path): return default_data
@@ -56,10 +160,31 @@ def load_data(file_path, default_data):
             content = f.read()
             if not content: return default_data
             return json.loads(content)
-    except (FileNotFoundError, json.JSONDecodeError): return default_data
+    except FileNotFoundError: return default_data
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        # Keep the damaged file for inspection; the next save would otherwise overwrite it with the default.
+        # The copy is named after the file's own mtime and size, so repeated reads of the same bad file keep one copy.
+        stat = os.stat(file_path)
+        corrupt_path = f"{file_path}.corrupt-{datetime.fromtimestamp(stat.st_mtime).strftime('%Y%m%d%H%M%S')}-{stat.st_size}"
+        if not os.path.exists(corrupt_path):
+            shutil.copyfile(file_path, corrupt_path)
+            print(f"WARNING: {file_path} could not be parsed; a copy was kept at {corrupt_path}.")
+        return default_data
+
+def _replace_file(temp_path, file_path):
+    for attempt in range(5):
+        try:
+            os.replace(temp_path, file_path)
+            return
+        except PermissionError:  # Windows refuses to replace a file another process has open.
+            if attempt == 4: raise
+            time.sleep(0.05)
 
 def save_data(file_path, data):
-    with open(file_path, 'w', encoding='utf-8') as f: json.dump(data, f, indent=4)
+    # Written to a temporary file and swapped in, so readers (including other worker processes) never see half a file.
+    temp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f: json.dump(data, f, indent=4)
+    _replace_file(temp_path, file_path)
 
 def initial_setup():
     if not os.path.exists(USERS_FILE):
@@ -77,6 +202,1106 @@ def initial_setup():
         return True
     return False
 
+def file_signature(file_path):
+    try:
+        stat = os.stat(file_path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+LOCKS_FOLDER = 'locks'
+
+class ProcessLock:
+    """A lock held across threads and across every worker process serving the same data folder."""
+    def __init__(self, name):
+        self.path = os.path.join(LOCKS_FOLDER, f"{name}.lock")
+        self.thread_lock = threading.Lock()
+        self.handle = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        try:
+            os.makedirs(LOCKS_FOLDER, exist_ok=True)
+            self.handle = open(self.path, 'a+b')
+            if fcntl:
+                fcntl.flock(self.handle.fileno(), fcntl.LOCK_EX)
+            else:
+                while True:
+                    try:
+                        self.handle.seek(0)
+                        msvcrt.locking(self.handle.fileno(), msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError:
+                        time.sleep(0.01)
+        except BaseException:
+            if self.handle:
+                self.handle.close()
+                self.handle = None
+            self.thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            if fcntl:
+                fcntl.flock(self.handle.fileno(), fcntl.LOCK_UN)
+            else:
+                self.handle.seek(0)
+                msvcrt.locking(self.handle.fileno(), msvcrt.LK_UNLCK, 1)
+            self.handle.close()
+        finally:
+            self.handle = None
+            self.thread_lock.release()
+
+# --- Write-Ahead Log Stores ---
+# Check-ins, open alerts, upload metadata and sent-notification keys are each kept as a snapshot plus a
+# write-ahead log. Every change is appended to the log as one checksummed line ("<crc32> <json>\n")
+# instead of rewriting the whole file; after WAL_SNAPSHOT_RECORDS changes the current state is written
+# as a new snapshot and the log starts a new segment. Loading reads the newest snapshot and replays only
+# the records after it. The previous snapshot and the segments since it are kept, so a damaged snapshot
+# can be recovered from the one before it. `python app.py verify [--repair]` checks everything offline.
+STORE_FOLDER = 'store'
+STORE_DAMAGED_FOLDER = os.path.join(STORE_FOLDER, 'damaged')
+WAL_SNAPSHOT_RECORDS = int(os.getenv('WAL_SNAPSHOT_RECORDS', 1000))
+WAL_FSYNC = os.getenv('WAL_FSYNC', '1') != '0'
+
+journaled_stores = {}
+
+class StoreCorruptError(Exception):
+    pass
+
+def encode_wal_record(record):
+    body = json.dumps(record, separators=(',', ':')).encode('utf-8')
+    return b'%08x ' % zlib.crc32(body) + body + b'\n'
+
+def decode_wal_record(line):
+    """Returns the record in one complete log line, or None if its checksum does not match."""
+    crc, _, body = line.rstrip(b'\n').partition(b' ')
+    try:
+        if int(crc, 16) != zlib.crc32(body):
+            return None
+        return json.loads(body)
+    except ValueError:
+        return None
+
+def data_checksum(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+def write_durable(file_path, text):
+    """Atomically replaces file_path with text, flushed to disk before the swap."""
+    temp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    _replace_file(temp_path, file_path)
+
+def scan_wal_segment(path):
+    """Yields (offset, end offset, record) per line of a segment. record is None for a line failing its
+    checksum; a final line without a newline (a torn write) is yielded with end offset None."""
+    with open(path, 'rb') as f:
+        offset = 0
+        for line in f:
+            if not line.endswith(b'\n'):
+                yield offset, None, None
+                return
+            yield offset, offset + len(line), decode_wal_record(line)
+            offset += len(line)
+
+class JournaledStore:
+    """A JSON document persisted as snapshot + write-ahead log. Writers must hold `lock` (a ProcessLock);
+    readers call data(), which first replays records appended by other processes since the last read."""
+    def __init__(self, name, legacy_file, default, apply, lock, migrate=None):
+        self.name, self.legacy_file, self.default, self.apply, self.lock = name, legacy_file, default, apply, lock
+        self.migrate = migrate
+        self.snapshot_path = os.path.join(STORE_FOLDER, f"{name}.snapshot.json")
+        self.previous_snapshot_path = os.path.join(STORE_FOLDER, f"{name}.previous.snapshot.json")
+        self.state_lock = threading.RLock()
+        self.state = None
+        self.seq = 0
+        self.snapshot_seq = 0
+        self.segment_start = 1
+        self.offset = 0
+        journaled_stores[name] = self
+
+    def segment_path(self, start):
+        return os.path.join(STORE_FOLDER, f"{self.name}.{start:012d}.wal")
+
+    def segment_starts(self):
+        prefix, starts = f"{self.name}.", []
+        for filename in os.listdir(STORE_FOLDER) if os.path.isdir(STORE_FOLDER) else ():
+            middle = filename[len(prefix):-len('.wal')]
+            if filename.startswith(prefix) and filename.endswith('.wal') and middle.isdigit():
+                starts.append(int(middle))
+        return sorted(starts)
+
+    def read_snapshot(self, path):
+        """Returns (seq, data) from a snapshot file, or None if it is missing or fails its checksum."""
+        snapshot = load_data(path, None)
+        if not isinstance(snapshot, dict) or 'data' not in snapshot or data_checksum(snapshot['data']) != snapshot.get('checksum'):
+            return None
+        return snapshot['seq'], snapshot['data']
+
+    def _load(self):
+        for path in (self.snapshot_path, self.previous_snapshot_path):
+            if os.path.exists(path):
+                loaded = self.read_snapshot(path)
+                if loaded:
+                    break
+                print(f"Store '{self.name}': snapshot {path} is damaged; trying an older one.")
+        else:
+            loaded = None
+        if loaded is None:
+            starts = self.segment_starts()
+            if os.path.exists(self.snapshot_path) or os.path.exists(self.previous_snapshot_path) or (starts and starts[0] != 1):
+                raise StoreCorruptError(f"Store '{self.name}' has no usable snapshot. Run `python app.py verify --repair`.")
+            data = load_data(self.legacy_file, None) if self.legacy_file else None
+            if data is None:
+                data = json.loads(json.dumps(self.default))
+            loaded = (0, self.migrate(data) if self.migrate else data)
+        self.snapshot_seq, self.state = loaded
+        self.seq = self.snapshot_seq
+        # Replay starts in the segment holding snapshot_seq + 1.
+        covering = [start for start in self.segment_starts() if start <= self.seq + 1]
+        self.segment_start, self.offset = (covering[-1] if covering else self.seq + 1), 0
+        self._catch_up()
+
+    def _catch_up(self):
+        while True:
+            path = self.segment_path(self.segment_start)
+            if os.path.exists(path) and os.path.getsize(path) > self.offset:
+                with open(path, 'rb') as f:
+                    f.seek(self.offset)
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            break  # Still being written, or torn; recover() trims torn tails at startup.
+                        record = decode_wal_record(line)
+                        if record is None:
+                            raise StoreCorruptError(f"Store '{self.name}': damaged record in {path} at byte {self.offset}. "
+                                                    "Run `python app.py verify --repair`.")
+                        self.offset += len(line)
+                        if record['seq'] <= self.seq:
+                            continue
+                        if record['seq'] != self.seq + 1:
+                            raise StoreCorruptError(f"Store '{self.name}': records {self.seq + 1}-{record['seq'] - 1} are missing. "
+                                                    "Run `python app.py verify --repair`.")
+                        self.state = self.apply(self.state, record)
+                        self.seq = record['seq']
+            if self.segment_start != self.seq + 1 and os.path.exists(self.segment_path(self.seq + 1)):
+                self.segment_start, self.offset = self.seq + 1, 0
+                continue
+            if not os.path.exists(path) and self.offset:
+                # Removed after another process took two snapshots past it; start over from the snapshot.
+                self._load()
+            return
+
+    def data(self):
+        """The current document. Callers must treat it as read-only and change it through append()."""
+        with self.state_lock:
+            if self.state is None:
+                self._load()
+            else:
+                self._catch_up()
+            return self.state
+
+    def version(self):
+        with self.state_lock:
+            self.data()
+            return self.seq
+
+    def files(self):
+        with self.state_lock:
+            self.data()
+            return (self.snapshot_path, self.segment_path(self.segment_start))
+
+    def append(self, op, **payload):
+        """Logs one change and applies it. The caller must hold self.lock."""
+        with self.state_lock:
+            self.data()
+            record = dict(payload, seq=self.seq + 1, op=op)
+            os.makedirs(STORE_FOLDER, exist_ok=True)
+            line = encode_wal_record(record)
+            with open(self.segment_path(self.segment_start), 'ab') as f:
+                f.write(line)
+                f.flush()
+                if WAL_FSYNC:
+                    os.fsync(f.fileno())
+            self.offset += len(line)
+            self.state = self.apply(self.state, record)
+            self.seq = record['seq']
+            if self.seq - self.snapshot_seq >= WAL_SNAPSHOT_RECORDS:
+                self.snapshot()
+            return self.state
+
+    def snapshot(self):
+        """Writes the current state as the newest snapshot and starts a new log segment. The caller must hold self.lock."""
+        with self.state_lock:
+            data = self.data()
+            os.makedirs(STORE_FOLDER, exist_ok=True)
+            text = json.dumps({'store': self.name, 'seq': self.seq, 'checksum': data_checksum(data),
+                               'written_on': datetime.now().isoformat(timespec='seconds'), 'data': data}, separators=(',', ':'))
+            previous_seq = self.snapshot_seq
+            if os.path.exists(self.snapshot_path):
+                _replace_file(self.snapshot_path, self.previous_snapshot_path)
+            write_durable(self.snapshot_path, text)
+            self.snapshot_seq = self.seq
+            # The new segment is created right away so other processes switch to it when they next catch up.
+            self.segment_start, self.offset = self.seq + 1, 0
+            open(self.segment_path(self.segment_start), 'ab').close()
+            # Segments whose records are all covered by the previous snapshot are no longer needed.
+            starts = self.segment_starts()
+            for start, next_start in zip(starts, starts[1:]):
+                if next_start - 1 <= previous_seq:
+                    try: os.remove(self.segment_path(start))
+                    except OSError: pass  # Open in another process (Windows); removed after the next snapshot.
+
+    def recover(self):
+        """Startup recovery: trims a torn final record, loads snapshot + log tail and snapshots a long tail."""
+        with self.lock, self.state_lock:
+            started = time.perf_counter()
+            starts = self.segment_starts()
+            if starts:
+                last = self.segment_path(starts[-1])
+                good_end = 0
+                for offset, end, record in scan_wal_segment(last):
+                    if end is None or record is None:
+                        break
+                    good_end = end
+                if good_end < os.path.getsize(last):
+                    print(f"Store '{self.name}': discarding a torn write at the end of {last} ({os.path.getsize(last) - good_end} bytes).")
+                    with open(last, 'r+b') as f:
+                        f.truncate(good_end)
+            self.state = None
+            self._load()
+            migrated = self.snapshot_seq == 0 and self.seq == 0 and not os.path.exists(self.snapshot_path)
+            if migrated or self.seq - self.snapshot_seq >= WAL_SNAPSHOT_RECORDS:
+                self.snapshot()
+            if migrated and self.legacy_file and os.path.exists(self.legacy_file):
+                _replace_file(self.legacy_file, f"{self.legacy_file}.migrated")
+                print(f"Store '{self.name}': moved {self.legacy_file} into the write-ahead log store.")
+            print(f"Store '{self.name}': recovered to record {self.seq} in {(time.perf_counter() - started) * 1000:.0f} ms.")
+
+def recover_stores():
+    for store in journaled_stores.values():
+        store.recover()
+
+def _set_aside_damaged(path, from_offset=0):
+    """Moves bytes from `from_offset` to the end of `path` into STORE_DAMAGED_FOLDER and truncates the file."""
+    os.makedirs(STORE_DAMAGED_FOLDER, exist_ok=True)
+    target = os.path.join(STORE_DAMAGED_FOLDER, f"{os.path.basename(path)}.{datetime.now().strftime('%Y%m%d%H%M%S')}")
+    with open(path, 'r+b') as f, open(target, 'wb') as out:
+        f.seek(from_offset)
+        shutil.copyfileobj(f, out)
+        f.truncate(from_offset)
+    if from_offset == 0:
+        os.remove(path)
+    return target
+
+def verify_store(store, repair=False):
+    """Checks a store's snapshots and log records. With repair, keeps everything up to the first damaged
+    record, sets the rest aside in STORE_DAMAGED_FOLDER and writes a fresh snapshot. Returns True if healthy."""
+    problems = []
+    base = None
+    for path in (store.snapshot_path, store.previous_snapshot_path):
+        if os.path.exists(path):
+            loaded = store.read_snapshot(path)
+            if loaded is None:
+                problems.append(f"snapshot {path} is damaged")
+            elif base is None:
+                base = (path, loaded[0])
+    if base is None and (os.path.exists(store.snapshot_path) or os.path.exists(store.previous_snapshot_path)):
+        print(f"[{store.name}] no usable snapshot; restore {STORE_FOLDER}/ from a backup.")
+        return False
+    seq = base[1] if base else 0
+    cut = None  # (segment path, offset) of the first record that cannot be replayed
+    for start in store.segment_starts():
+        path = store.segment_path(start)
+        if cut:
+            problems.append(f"{path} follows a damaged record and cannot be replayed")
+            continue
+        for offset, end, record in scan_wal_segment(path):
+            if end is None:
+                problems.append(f"{path}: torn write at byte {offset}")
+            elif record is None:
+                problems.append(f"{path}: checksum mismatch at byte {offset}")
+            elif record['seq'] > seq + 1:
+                problems.append(f"{path}: records {seq + 1}-{record['seq'] - 1} are missing (byte {offset})")
+            else:
+                seq = max(seq, record['seq'])
+                continue
+            cut = (path, offset)
+            break
+    for problem in problems:
+        print(f"[{store.name}] {problem}")
+    if not problems:
+        print(f"[{store.name}] OK: snapshot at record {base[1] if base else 0}, log replays to record {seq}.")
+        return True
+    if not repair:
+        return False
+    with store.lock, store.state_lock:
+        if base and base[0] == store.previous_snapshot_path and os.path.exists(store.snapshot_path):
+            print(f"[{store.name}] set aside {_set_aside_damaged(store.snapshot_path)}")
+        if cut:
+            damaged_starts = [start for start in store.segment_starts() if store.segment_path(start) >= cut[0]]
+            for start in damaged_starts:
+                path = store.segment_path(start)
+                print(f"[{store.name}] set aside {_set_aside_damaged(path, cut[1] if path == cut[0] else 0)}")
+        store.state = None
+        store.snapshot()
+    print(f"[{store.name}] repaired: recovered to record {store.seq} and wrote a fresh snapshot.")
+    return True
+
+def verify_data(repair=False):
+    """Entry point for `python app.py verify [--repair]`. Returns True if every store is (now) healthy."""
+    healthy = all([verify_store(store, repair) for store in journaled_stores.values()])
+    for file_path in (USERS_FILE, STATUS_FILE, ALERT_RULES_FILE):
+        if os.path.exists(file_path):
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    json.load(f)
+            except ValueError:
+                healthy = False
+                print(f"[files] {file_path} is not valid JSON; fix or restore it from a backup.")
+    return healthy
+
+# --- Student Registry ---
+# Every student has a stable integer id. The registry maps each known spelling of a name (its aliases,
+# normalized like check-in names) to an id; merging a typo'd student into another points the old id at
+# the surviving one. Check-ins and alerts carry the id, and CheckinTable uses registry ids for its
+# student column, so per-student lookups are direct and always follow aliases and merges.
+def normalize_student_name(name):
+    return name.strip().title()
+
+def apply_student_record(registry, record):
+    # In place, like apply_checkin_record: replaying a long log must not copy the registry per record.
+    students, aliases = registry['students'], registry['aliases']
+    if record['op'] == 'register':
+        for student in record['students']:
+            students[str(student['id'])] = student
+            aliases[student['name']] = student['id']
+            registry['next_id'] = max(registry['next_id'], student['id'] + 1)
+    elif record['op'] == 'alias':
+        aliases[record['alias']] = record['id']
+    elif record['op'] == 'rename':
+        students[str(record['id'])] = dict(students[str(record['id'])], name=record['name'])
+        aliases[record['name']] = record['id']
+    elif record['op'] == 'merge':
+        students[str(record['from_id'])] = dict(students[str(record['from_id'])], merged_into=record['into_id'])
+    else:
+        raise StoreCorruptError(f"Unknown student log operation {record['op']!r}")
+    return registry
+
+student_lock = ProcessLock('students')
+student_store = JournaledStore('students', None, {'next_id': 1, 'students': {}, 'aliases': {}}, apply_student_record, student_lock)
+registry_cache = {'version': None, 'index': None}
+
+def student_registry():
+    """Returns {'names': list of canonical names indexed by id, 'aliases': name -> surviving id, 'roots': id -> surviving id}."""
+    # Records are applied to the registry document in place, so index it before another thread can append.
+    with student_store.state_lock:
+        version = student_store.version()
+        if version != registry_cache['version']:
+            data = student_store.data()
+            students = {int(sid): student for sid, student in data['students'].items()}
+
+            def root(sid):
+                while students.get(sid, {}).get('merged_into'):
+                    sid = students[sid]['merged_into']
+                return sid
+
+            roots = {sid: root(sid) for sid in students}
+            names = [None] * data['next_id']
+            for sid in students:
+                names[sid] = students[roots[sid]]['name']
+            aliases = {alias: roots.get(sid, sid) for alias, sid in data['aliases'].items()}
+            registry_cache.update(version=version, index={'names': names, 'aliases': aliases, 'roots': roots})
+        return registry_cache['index']
+
+def registry_extends(names, aliases, registry):
+    """True if `registry` only added students and aliases to the one `names` and `aliases` came from, so rows
+    holding the older ids still resolve to the same students."""
+    return (registry['names'][:len(names)] == names
+            and all(registry['aliases'].get(alias) == sid for alias, sid in aliases.items()))
+
+def student_id_for(name):
+    """The surviving id for a student name or alias, or None if the name is not registered."""
+    return student_registry()['aliases'].get(normalize_student_name(name)) if name else None
+
+def root_student_id(student_id):
+    return student_registry()['roots'].get(student_id, student_id)
+
+def student_name(student_id):
+    names = student_registry()['names']
+    return names[student_id] if student_id is not None and 0 <= student_id < len(names) else None
+
+def register_students(names):
+    """Returns {normalized name: surviving id}, registering unknown names with one log record."""
+    wanted = {normalize_student_name(name) for name in names if name and name.strip()}
+    aliases = student_registry()['aliases']
+    if any(name not in aliases for name in wanted):
+        with student_lock:
+            registry = student_store.data()
+            missing = sorted(name for name in wanted if name not in student_registry()['aliases'])
+            if missing:
+                created_on = datetime.now().isoformat(timespec='seconds')
+                student_store.append('register', students=[{'id': registry['next_id'] + i, 'name': name, 'created_on': created_on}
+                                                           for i, name in enumerate(missing)])
+        aliases = student_registry()['aliases']
+    return {name: aliases[name] for name in wanted}
+
+def sync_student_registry():
+    """Registers every name already present in check-ins, the archive and open alerts, and attaches student
+    ids to open alerts created before the registry existed. Runs once at startup."""
+    names = {c['name'] for c in checkin_store.data() if 'student_id' not in c}
+    manifest = load_data(ARCHIVE_MANIFEST_FILE, None)
+    if manifest:
+        names.update(name for name in manifest['names'] if name)
+    open_alerts = alert_store.data()
+    names.update(alert_student_name(alert) for alert in open_alerts if 'student_id' not in alert)
+    register_students(name for name in names if name)
+    untagged = [dict(alert, student_id=student_id_for(alert_student_name(alert))) for alert in open_alerts
+                if 'student_id' not in alert and alert_student_name(alert)]
+    if untagged:
+        with alert_lock:
+            alert_store.append('put', alerts=untagged)
+
+# --- Compact Check-in Table ---
+# Check-ins are held as parallel columns instead of one dict per record: interned student names
+# referenced by integer id, wall-clock seconds since 1970-01-01 (timestamps are stored naive, so no
+# timezone is applied), the sub-second part of the timestamp and int8 scores. Display strings are only
+# produced by CheckinRow on access.
+EPOCH = datetime(1970, 1, 1)
+SECONDS_PER_DAY = 86400
+CHECKIN_COLUMNS = (('student', np.int32), ('ts', np.int64), ('morale', np.int8), ('understanding', np.int8), ('us', np.int32))
+
+def to_epoch_seconds(timestamp):
+    return int((datetime.fromisoformat(timestamp) - EPOCH).total_seconds())
+
+def to_epoch_parts(timestamp):
+    """(whole seconds since EPOCH, microseconds), so a row written back out keeps its exact timestamp."""
+    moment = datetime.fromisoformat(timestamp)
+    return int((moment.replace(microsecond=0) - EPOCH).total_seconds()), moment.microsecond
+
+def from_epoch_seconds(seconds):
+    return EPOCH + timedelta(seconds=int(seconds))
+
+def date_to_day_number(date_obj):
+    return (date_obj.toordinal() - EPOCH.toordinal())
+
+class CheckinRow:
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    @property
+    def name(self): return self.table.names[self.table.student[self.index]]
+    @property
+    def morale(self): return int(self.table.morale[self.index])
+    @property
+    def understanding(self): return int(self.table.understanding[self.index])
+    @property
+    def datetime(self): return from_epoch_seconds(self.table.ts[self.index]) + timedelta(microseconds=int(self.table.us[self.index]))
+    @property
+    def timestamp(self): return self.datetime.isoformat()
+    @property
+    def time(self): return self.datetime.strftime('%I:%M:%S %p')
+    @property
+    def date_friendly(self): return self.datetime.strftime('%Y-%m-%d')
+
+    def to_dict(self):
+        return {'name': self.name, 'morale': self.morale, 'understanding': self.understanding, 'timestamp': self.timestamp}
+
+class CheckinRows:
+    """A lazy, ordered selection of table rows that templates can iterate and measure."""
+    __slots__ = ('table', 'indices')
+
+    def __init__(self, table, indices):
+        self.table = table
+        self.indices = indices
+
+    def __len__(self): return len(self.indices)
+    def __iter__(self): return (CheckinRow(self.table, i) for i in self.indices)
+    def __getitem__(self, i): return CheckinRow(self.table, self.indices[i])
+
+class CheckinTable:
+    """Check-in columns whose student column holds registry ids: names[id] is the student's current name
+    and name_ids maps every alias to its id."""
+    __slots__ = ('names', 'name_ids', 'student', 'ts', 'morale', 'understanding', 'us', 'by_student', 'buffers')
+
+    def __init__(self, names, student, ts, morale, understanding, us=None, name_ids=None):
+        self.names = names
+        self.name_ids = name_ids if name_ids is not None else {name: i for i, name in enumerate(names) if name is not None}
+        self.student, self.ts, self.morale, self.understanding = student, ts, morale, understanding
+        self.us = us if us is not None else np.zeros(len(ts), dtype=np.int32)  # Archives written before the column existed.
+        self.by_student = None
+        self.buffers = None  # Spare capacity behind the columns, owned by the table that appends next.
+
+    @classmethod
+    def from_records(cls, checkins):
+        registry = student_registry()
+        student, ts, morale, understanding, us = array('i'), array('q'), array('b'), array('b'), array('i')
+        for checkin in checkins:
+            if 'timestamp' not in checkin:
+                continue
+            if 'student_id' in checkin:
+                sid = registry['roots'].get(checkin['student_id'], checkin['student_id'])
+            else:
+                sid = registry['aliases'].get(checkin['name'])
+                if sid is None:  # Stored before the registry knew this name.
+                    sid = register_students([checkin['name']])[normalize_student_name(checkin['name'])]
+                    registry = student_registry()
+            seconds, micros = to_epoch_parts(checkin['timestamp'])
+            student.append(sid)
+            ts.append(seconds)
+            morale.append(int(checkin['morale']))
+            understanding.append(int(checkin['understanding']))
+            us.append(micros)
+        columns = [np.frombuffer(col, dtype=dtype) if len(col) else np.zeros(0, dtype=dtype)
+                   for col, (_, dtype) in zip((student, ts, morale, understanding, us), CHECKIN_COLUMNS)]
+        order = np.argsort(columns[1], kind='stable')
+        if len(order) and (np.diff(columns[1]) < 0).any():
+            columns = [col[order] for col in columns]
+        return cls(registry['names'], *columns, name_ids=registry['aliases'])
+
+    def __len__(self):
+        return len(self.ts)
+
+    def take(self, indices):
+        return CheckinTable(self.names, *(np.asarray(getattr(self, name)[indices]) for name, _ in CHECKIN_COLUMNS), name_ids=self.name_ids)
+
+    def appended(self, other):
+        """This table followed by `other`'s rows (e.g. check-ins saved since it was built). The columns are
+        over-allocated, so a run of appends copies the rows only each time the capacity doubles, and the
+        per-student index is extended instead of re-sorted."""
+        if len(other) == 0:
+            if other.names is self.names:
+                return self
+            table = CheckinTable(other.names, *(getattr(self, name) for name, _ in CHECKIN_COLUMNS), name_ids=other.name_ids)
+            table.by_student, (table.buffers, self.buffers) = self.by_student, (self.buffers, None)
+            return table  # Only the registry moved on, e.g. a student was registered.
+        if len(self) and other.ts[0] < self.ts[-1]:
+            return combine_tables(self, other)  # Backdated rows: re-sort the whole table.
+        n, total = len(self), len(self) + len(other)
+        buffers, self.buffers = self.buffers, None  # Appending to this table again must not reuse them.
+        if buffers is None or len(buffers['ts']) < total:
+            capacity = max(total, 2 * n, 1024)
+            buffers = {name: np.empty(capacity, dtype=dtype) for name, dtype in CHECKIN_COLUMNS}
+            for name, _ in CHECKIN_COLUMNS:
+                buffers[name][:n] = getattr(self, name)
+        for name, _ in CHECKIN_COLUMNS:
+            buffers[name][n:total] = getattr(other, name)
+        table = CheckinTable(other.names, *(buffers[name][:total] for name, _ in CHECKIN_COLUMNS), name_ids=other.name_ids)
+        table.buffers = buffers
+        if self.by_student is not None:
+            table.by_student = dict(self.by_student)
+            for sid, group in other.student_groups().items():
+                table.by_student[sid] = np.concatenate([table.by_student.get(sid, np.zeros(0, dtype=np.int64)), group + n])
+        return table
+
+    @property
+    def day(self):
+        return self.ts // SECONDS_PER_DAY
+
+    def rows(self, indices=None):
+        return CheckinRows(self, np.arange(len(self)) if indices is None else indices)
+
+    def student_groups(self):
+        """Maps each student id to their chronological row indices. Built once per table, on first use."""
+        if self.by_student is None:
+            order = np.argsort(self.student, kind='stable')
+            boundaries = np.flatnonzero(np.diff(self.student[order])) + 1
+            self.by_student = {int(self.student[group[0]]): group for group in np.split(order, boundaries) if len(group)}
+        return self.by_student
+
+    def student_indices(self, student):
+        """Chronological row indices for one student, given their id or any of their names."""
+        sid = student if isinstance(student, int) else self.name_ids.get(student)
+        return self.student_groups().get(sid, np.zeros(0, dtype=np.int64))
+
+    def group_by_student(self):
+        """Maps each student name to their chronological row indices."""
+        return {self.names[sid]: group for sid, group in self.student_groups().items()}
+
+    def range_indices(self, start_ts, end_ts):
+        """Row indices with start_ts <= ts < end_ts (rows are kept sorted by time)."""
+        return np.arange(np.searchsorted(self.ts, start_ts, 'left'), np.searchsorted(self.ts, end_ts, 'left'))
+
+    def prefix_indices(self, prefix):
+        """Row indices whose ISO timestamp starts with a 'YYYY', 'YYYY-MM' or 'YYYY-MM-DD' prefix."""
+        bounds = prefix_range(prefix)
+        return self.range_indices(*bounds) if bounds else np.zeros(0, dtype=np.int64)
+
+def prefix_range(prefix):
+    """(start_ts, end_ts) covered by a 'YYYY', 'YYYY-MM' or 'YYYY-MM-DD' prefix, or None if it is not a date."""
+    try:
+        if len(prefix) == 4:
+            start, end = datetime(int(prefix), 1, 1), datetime(int(prefix) + 1, 1, 1)
+        elif len(prefix) == 7:
+            start = datetime.strptime(prefix, '%Y-%m')
+            end = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            start = datetime.strptime(prefix, '%Y-%m-%d')
+            end = start + timedelta(days=1)
+    except ValueError:
+        return None
+    return int((start - EPOCH).total_seconds()), int((end - EPOCH).total_seconds())
+
+def combine_tables(archive, live):
+    """Appends the live rows to the archived ones. Both tables use registry ids; the live table's name
+    dictionary is the more recent one."""
+    if archive is None or len(archive) == 0:
+        return live
+    if len(live) == 0:
+        return archive
+    columns = [np.concatenate([getattr(archive, name), getattr(live, name)]) for name, _ in CHECKIN_COLUMNS]
+    if live.ts[0] < archive.ts[-1]:
+        order = np.argsort(columns[1], kind='stable')
+        columns = [col[order] for col in columns]
+    return CheckinTable(live.names, *columns, name_ids=live.name_ids)
+
+# --- Sealed Check-in Archive ---
+# Closed periods are moved out of the live check-in store into one .npy file per column plus a name dictionary in
+# the manifest. Columns are opened with mmap, so reading years of history costs no parsing and the
+# pages are shared between worker processes. Each seal writes a new version directory and switches
+# the manifest to it, so readers holding the old maps are never disturbed.
+ARCHIVE_COLUMNS = CHECKIN_COLUMNS
+
+archive_cache = {'signature': None, 'table': None}
+
+def load_archive_table():
+    """The sealed check-ins with their student column mapped, by name, onto current registry ids."""
+    signature = (file_signature(ARCHIVE_MANIFEST_FILE), student_store.version())
+    if signature != archive_cache['signature']:
+        manifest = load_data(ARCHIVE_MANIFEST_FILE, None)
+        table = None
+        if manifest:
+            folder = os.path.join(ARCHIVE_FOLDER, manifest['version'])
+            columns = [np.load(os.path.join(folder, f'{name}.npy'), mmap_mode='r')
+                       if os.path.exists(os.path.join(folder, f'{name}.npy')) else None for name, _ in ARCHIVE_COLUMNS]
+            ids = register_students(name for name in manifest['names'] if name)
+            remap = np.array([ids[normalize_student_name(name)] if name else 0 for name in manifest['names']] or [0], dtype=np.int32)
+            registry = student_registry()
+            table = CheckinTable(registry['names'], remap[columns[0]], *columns[1:], name_ids=registry['aliases'])
+        archive_cache.update(signature=signature, table=table)
+    return archive_cache['table']
+
+def write_archive(table, sealed_ranges, pending_drop=None):
+    """Writes a new archive version. `pending_drop` records that live check-ins dated before it are now
+    archived but not yet dropped from the check-in store (see seal_checkins)."""
+    manifest = load_data(ARCHIVE_MANIFEST_FILE, {})
+    version = f"v{manifest.get('revision', 0) + 1}"
+    folder = os.path.join(ARCHIVE_FOLDER, version)
+    os.makedirs(folder, exist_ok=True)
+    for name, dtype in ARCHIVE_COLUMNS:
+        np.save(os.path.join(folder, f'{name}.npy'), np.ascontiguousarray(getattr(table, name), dtype=dtype))
+    save_data(ARCHIVE_MANIFEST_FILE, {
+        'version': version,
+        'revision': manifest.get('revision', 0) + 1,
+        'names': table.names,
+        'rows': len(table),
+        'sealed_ranges': sealed_ranges,
+        'pending_drop': pending_drop
+    })
+    remove_old_versions(ARCHIVE_FOLDER, version)
+
+def remove_old_versions(folder, current):
+    for entry in os.listdir(folder):
+        if entry.startswith('v') and entry != current:
+            try:
+                for file in os.listdir(os.path.join(folder, entry)):
+                    os.remove(os.path.join(folder, entry, file))
+                os.rmdir(os.path.join(folder, entry))
+            except OSError:
+                pass  # Still mapped by another process (Windows); removed on the next write.
+
+def seal_checkins(before_str):
+    """Moves every live check-in dated before `before_str` (YYYY-MM-DD) into the archive. Returns the number of rows sealed."""
+    with checkin_lock:
+        live = checkin_store.data()
+        to_seal = [c for c in live if 'timestamp' in c and c['timestamp'][:10] < before_str]
+        if not to_seal:
+            return 0
+        archive = load_archive_table()
+        manifest = load_data(ARCHIVE_MANIFEST_FILE, {})
+        sealed_ranges = manifest.get('sealed_ranges', []) + [[min(c['timestamp'][:10] for c in to_seal), max(c['timestamp'][:10] for c in to_seal)]]
+        # The archive is written with a pending_drop marker first, so a crash before the live rows are
+        # dropped is finished at the next start instead of leaving them counted twice.
+        write_archive(combine_tables(archive, CheckinTable.from_records(to_seal)), sealed_ranges, pending_drop=before_str)
+        drop_sealed_checkins(before_str)
+        return len(to_seal)
+
+def drop_sealed_checkins(before_str):
+    """Drops live check-ins the archive now holds and clears its pending_drop marker. The caller must hold checkin_lock."""
+    checkin_store.append('drop_before', before=before_str)
+    checkin_store.snapshot()
+    save_data(ARCHIVE_MANIFEST_FILE, dict(load_data(ARCHIVE_MANIFEST_FILE, {}), pending_drop=None))
+
+def finish_pending_seal():
+    """Completes a seal that stopped after writing the archive. The caller must hold checkin_lock."""
+    manifest = load_data(ARCHIVE_MANIFEST_FILE, None)
+    if manifest and manifest.get('pending_drop'):
+        print(f"Finishing an interrupted seal of check-ins before {manifest['pending_drop']}.")
+        drop_sealed_checkins(manifest['pending_drop'])
+
+@app.route('/archive/seal', methods=['POST'])
+def seal_archive():
+    if not session.get('logged_in') or session.get('user_role') != 'super_admin':
+        return redirect(url_for('login'))
+    before_str = request.form.get('before', '')
+    try:
+        datetime.strptime(before_str, '%Y-%m-%d')
+    except ValueError:
+        return "Invalid date format.", 400
+    sealed = seal_checkins(before_str)
+    flash(f"Sealed {sealed} check-in(s) dated before {before_str} into the archive.", 'archive')
+    return redirect(url_for('admin', tab='staff'))
+
+def apply_checkin_record(checkins, record):
+    if record['op'] == 'append':
+        checkins.append(record['entry'])  # In place: readers iterating the list only ever see it grow.
+        return checkins
+    if record['op'] == 'append_batch':
+        checkins.extend(record['entries'])
+        return checkins
+    if record['op'] == 'drop_before':
+        return [c for c in checkins if not ('timestamp' in c and c['timestamp'][:10] < record['before'])]
+    raise StoreCorruptError(f"Unknown check-in log operation {record['op']!r}")
+
+checkin_lock = ProcessLock('checkins')
+checkin_store = JournaledStore('checkins', DATA_FILE, [], apply_checkin_record, checkin_lock)
+checkin_table_lock = threading.Lock()
+checkin_table_cache = {'signature': None, 'table': None, 'records': None, 'count': 0, 'hidden_before': None}
+
+def load_checkin_table():
+    """Returns the archived plus live check-ins. Check-ins appended to the log since the last call are added to
+    the cached table; it is only rebuilt when rows were dropped, the archive or the rollups changed, or students
+    were renamed or merged."""
+    with checkin_table_lock:
+        signature = (checkin_store.version(), file_signature(ARCHIVE_MANIFEST_FILE), file_signature(ROLLUP_MANIFEST_FILE),
+                     student_store.version())
+        cache = checkin_table_cache
+        if cache['table'] is not None and signature == cache['signature']:
+            return cache['table']
+        records = checkin_store.data()
+        # Appends extend the record list in place; any other change replaces it.
+        cached = cache['table']
+        if (cached is not None and cache['signature'] and signature[1:3] == cache['signature'][1:3]
+                and records is cache['records'] and len(records) >= cache['count']
+                and (signature[3] == cache['signature'][3] or registry_extends(cached.names, cached.name_ids, student_registry()))):
+            added = records[cache['count']:]
+            if cache['hidden_before']:
+                added = [c for c in added if not ('timestamp' in c and c['timestamp'][:10] < cache['hidden_before'])]
+            table = cached.appended(CheckinTable.from_records(added))
+        else:
+            # Rows sealed into the archive, or already in the rollups, but not yet dropped from the live store.
+            pending_drop = (load_data(ARCHIVE_MANIFEST_FILE, None) or {}).get('pending_drop')
+            rolled_up_before = (load_data(ROLLUP_MANIFEST_FILE, None) or {}).get('pending_drop')
+            live_records = records
+            if pending_drop:
+                live_records = [c for c in records if not ('timestamp' in c and c['timestamp'][:10] < pending_drop)]
+            table = combine_tables(load_archive_table(), CheckinTable.from_records(live_records))
+            if rolled_up_before:
+                table = table.take(slice(int(np.searchsorted(table.ts, to_epoch_seconds(rolled_up_before), 'left')), None))
+            cache['hidden_before'] = max(filter(None, (pending_drop, rolled_up_before)), default=None)
+        cache.update(signature=signature, table=table, records=records, count=len(records))
+        return table
+
+# --- Retention and Rollups ---
+# Check-ins older than the retention policy's raw_days are rolled up into per-student daily totals (count
+# and score sums, with weekly totals derived from them), which is all the calendar, averages and trend
+# scores need from old data. The raw rows are written to gzipped JSON lines in cold storage and dropped
+# from the live store and the archive. A compaction writes the cold file under a .pending name and builds
+# the rollups without holding checkin_lock; under the lock it writes the rollups marked with `pending_drop`
+# (and the pending cold file), moves the cold file into place and drops the raw rows. Readers skip raw rows
+# before `pending_drop`, and a run interrupted after the rollups are written is finished by the next one
+# rather than counted twice.
+DEFAULT_RETENTION_POLICY = {'enabled': False, 'raw_days': 365, 'interval_hours': 24}
+RETENTION_MIN_RAW_DAYS = 30     # Alert rules and the notification dedup window need recent raw rows.
+RETENTION_CHECK_SECONDS = 600
+RETENTION_REPORTS_KEPT = 20
+ROLLUP_COLUMNS = (('student', np.int32), ('period', np.int32), ('count', np.int32),
+                  ('morale_sum', np.int32), ('understanding_sum', np.int32))
+
+retention_lock = ProcessLock('retention')
+retention_state = {'started': False}
+rollup_cache = {'signature': None, 'daily': None, 'weekly': None}
+
+class CheckinRollup:
+    """Per-student totals over fixed periods. `period` is a day number for daily rollups and the day number
+    of the Monday for weekly ones. Rows are sorted by (period, student) and unique on that pair."""
+    __slots__ = ('names', 'student', 'period', 'count', 'morale_sum', 'understanding_sum')
+
+    def __init__(self, names, student, period, count, morale_sum, understanding_sum):
+        self.names = names
+        self.student, self.period, self.count = student, period, count
+        self.morale_sum, self.understanding_sum = morale_sum, understanding_sum
+
+    @classmethod
+    def aggregate(cls, names, student, period, count, morale_sum, understanding_sum):
+        """Sums rows sharing a (student, period) pair, e.g. new totals added to stored ones or students merged."""
+        keys, inverse = np.unique(np.asarray(period, dtype=np.int64) * (1 << 32) + np.asarray(student, dtype=np.int64), return_inverse=True)
+        sums = [np.bincount(inverse, weights=column, minlength=len(keys)).astype(np.int32) for column in (count, morale_sum, understanding_sum)]
+        return cls(names, (keys & 0xFFFFFFFF).astype(np.int32), (keys >> 32).astype(np.int32), *sums)
+
+    @classmethod
+    def from_table(cls, table, indices):
+        return cls.aggregate(table.names, table.student[indices], table.day[indices], np.ones(len(indices), dtype=np.int32),
+                             table.morale[indices], table.understanding[indices])
+
+    def __len__(self):
+        return len(self.period)
+
+    def columns(self):
+        return [getattr(self, name) for name, _ in ROLLUP_COLUMNS]
+
+    def weekly(self):
+        return CheckinRollup.aggregate(self.names, self.student, self.period - (self.period + 3) % 7, *self.columns()[2:])
+
+    def range_indices(self, start_period, end_period):
+        return np.arange(np.searchsorted(self.period, start_period, 'left'), np.searchsorted(self.period, end_period, 'left'))
+
+def empty_rollup():
+    return CheckinRollup(student_registry()['names'], *(np.zeros(0, dtype=dtype) for _, dtype in ROLLUP_COLUMNS))
+
+def load_rollups():
+    """Returns (daily, weekly) rollups with the student column mapped, by name, onto current registry ids."""
+    signature = (file_signature(ROLLUP_MANIFEST_FILE), student_store.version())
+    if signature != rollup_cache['signature']:
+        manifest = load_data(ROLLUP_MANIFEST_FILE, None)
+        daily = empty_rollup()
+        if manifest:
+            folder = os.path.join(ROLLUP_FOLDER, manifest['version'])
+            columns = [np.load(os.path.join(folder, f'{name}.npy')) for name, _ in ROLLUP_COLUMNS]
+            ids = register_students(name for name in manifest['names'] if name)
+            remap = np.array([ids[normalize_student_name(name)] if name else 0 for name in manifest['names']] or [0], dtype=np.int32)
+            daily = CheckinRollup.aggregate(student_registry()['names'], remap[columns[0]], *columns[1:])
+        rollup_cache.update(signature=signature, daily=daily, weekly=daily.weekly())
+    return rollup_cache['daily'], rollup_cache['weekly']
+
+def write_rollups(daily, through, pending_drop, pending_cold_file=None):
+    manifest = load_data(ROLLUP_MANIFEST_FILE, {})
+    version = f"v{manifest.get('revision', 0) + 1}"
+    folder = os.path.join(ROLLUP_FOLDER, version)
+    os.makedirs(folder, exist_ok=True)
+    for name, dtype in ROLLUP_COLUMNS:
+        np.save(os.path.join(folder, f'{name}.npy'), np.ascontiguousarray(getattr(daily, name), dtype=dtype))
+    save_data(ROLLUP_MANIFEST_FILE, {
+        'version': version,
+        'revision': manifest.get('revision', 0) + 1,
+        'names': daily.names,
+        'rows': len(daily),
+        'through': through,
+        'pending_drop': pending_drop,
+        'pending_cold_file': pending_cold_file
+    })
+    remove_old_versions(ROLLUP_FOLDER, version)
+
+def cold_storage_files():
+    return sorted(f for f in os.listdir(COLD_STORAGE_FOLDER) if f.endswith('.jsonl.gz')) if os.path.isdir(COLD_STORAGE_FOLDER) else []
+
+def write_cold_storage(table, indices):
+    """Writes the raw rows as gzipped JSON lines (the check-in record format) to `<file name>.pending` and
+    returns the file name; publish_cold_storage moves it into place once the rollups record it."""
+    first, last = from_epoch_seconds(table.ts[indices[0]]), from_epoch_seconds(table.ts[indices[-1]])
+    filename = f"checkins_{first:%Y-%m-%d}_to_{last:%Y-%m-%d}_{datetime.now():%Y%m%d%H%M%S}.jsonl.gz"
+    path = os.path.join(COLD_STORAGE_FOLDER, filename)
+    os.makedirs(COLD_STORAGE_FOLDER, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as f:
+            for row in table.rows(indices):
+                f.write((json.dumps(dict(row.to_dict(), student_id=int(table.student[row.index]))) + '\n').encode('utf-8'))
+        raw.flush()
+        os.fsync(raw.fileno())  # This is the only copy of the rows once they are dropped.
+    _replace_file(temp_path, f"{path}.pending")
+    return filename
+
+def publish_cold_storage(filename):
+    pending_path = os.path.join(COLD_STORAGE_FOLDER, f"{filename}.pending")
+    if os.path.exists(pending_path):
+        _replace_file(pending_path, os.path.join(COLD_STORAGE_FOLDER, filename))
+
+def remove_unrecorded_cold_files():
+    """Removes .pending cold files left by runs that stopped before recording them; their rows are still raw.
+    The caller must hold retention_lock."""
+    recorded = (load_data(ROLLUP_MANIFEST_FILE, None) or {}).get('pending_cold_file')
+    for entry in os.listdir(COLD_STORAGE_FOLDER) if os.path.isdir(COLD_STORAGE_FOLDER) else ():
+        if entry.endswith('.pending') and entry != f"{recorded}.pending":
+            os.remove(os.path.join(COLD_STORAGE_FOLDER, entry))
+
+def iter_cold_checkins():
+    for filename in cold_storage_files():
+        with gzip.open(os.path.join(COLD_STORAGE_FOLDER, filename), 'rt', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+def raw_checkin_bytes():
+    """Bytes on disk held by raw check-ins: the check-in store's snapshots and log segments plus the archive."""
+    paths = [os.path.join(STORE_FOLDER, f) for f in os.listdir(STORE_FOLDER) if f.startswith(f'{checkin_store.name}.')] if os.path.isdir(STORE_FOLDER) else []
+    manifest = load_data(ARCHIVE_MANIFEST_FILE, None)
+    if manifest:
+        folder = os.path.join(ARCHIVE_FOLDER, manifest['version'])
+        paths += [ARCHIVE_MANIFEST_FILE] + [os.path.join(folder, f) for f in os.listdir(folder)]
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+def drop_raw_checkins_before(cutoff):
+    """Removes raw check-ins dated before `cutoff` (YYYY-MM-DD) from the live store and the archive.
+    The caller must hold checkin_lock."""
+    if any('timestamp' in c and c['timestamp'][:10] < cutoff for c in checkin_store.data()):
+        checkin_store.append('drop_before', before=cutoff)
+        # Twice, so that the previous snapshot and the log segments still holding the rows are released too.
+        checkin_store.snapshot()
+        checkin_store.snapshot()
+    archive = load_archive_table()
+    cutoff_ts = to_epoch_seconds(cutoff)
+    if archive is not None and len(archive) and archive.ts[0] < cutoff_ts:
+        keep = slice(int(np.searchsorted(archive.ts, cutoff_ts, 'left')), None)
+        manifest = load_data(ARCHIVE_MANIFEST_FILE, {})
+        sealed_ranges = [[max(start, cutoff), end] for start, end in manifest.get('sealed_ranges', []) if end >= cutoff]
+        write_archive(archive.take(keep), sealed_ranges)
+
+def finish_pending_compaction():
+    """Completes a compaction that stopped after writing its rollups. The caller must hold checkin_lock."""
+    manifest = load_data(ROLLUP_MANIFEST_FILE, None)
+    if manifest and manifest.get('pending_drop'):
+        print(f"Finishing an interrupted compaction of check-ins before {manifest['pending_drop']}.")
+        commit_compaction(manifest['pending_drop'], manifest.get('pending_cold_file'))
+
+def commit_compaction(cutoff, cold_file):
+    """Publishes the cold file and drops the raw rows the rollups now cover. The caller must hold checkin_lock."""
+    if cold_file:
+        publish_cold_storage(cold_file)
+    drop_raw_checkins_before(cutoff)
+    save_data(ROLLUP_MANIFEST_FILE, dict(load_data(ROLLUP_MANIFEST_FILE, {}), pending_drop=None, pending_cold_file=None))
+
+def validate_retention_policy(policy):
+    merged = dict(DEFAULT_RETENTION_POLICY, **{k: v for k, v in policy.items() if k in DEFAULT_RETENTION_POLICY})
+    if not isinstance(merged['enabled'], bool):
+        raise ValueError("'enabled' must be true or false.")
+    for key, minimum in (('raw_days', RETENTION_MIN_RAW_DAYS), ('interval_hours', 1)):
+        if isinstance(merged[key], bool) or not isinstance(merged[key], int) or merged[key] < minimum:
+            raise ValueError(f"'{key}' must be a whole number of at least {minimum}.")
+    return merged
+
+def load_retention_policy():
+    return validate_retention_policy(load_data(RETENTION_POLICY_FILE, DEFAULT_RETENTION_POLICY))
+
+def prepare_compaction(table, old):
+    """Writes the pending cold file for rows `old` and returns (its name, the stored daily rollups plus theirs)."""
+    cold_file = write_cold_storage(table, old)
+    stored, _ = load_rollups()
+    added = CheckinRollup.from_table(table, old)
+    daily = CheckinRollup.aggregate(student_registry()['names'], *(np.concatenate(pair) for pair in zip(stored.columns(), added.columns())))
+    return cold_file, daily
+
+def compact_checkins(dry_run=False, trigger='manual'):
+    """Rolls up and moves to cold storage every check-in older than the policy's raw_days. Returns a report
+    of rows rolled up and bytes reclaimed. Callers must hold retention_lock."""
+    started = time.perf_counter()
+    policy = load_retention_policy()
+    cutoff = (datetime.now() - timedelta(days=policy['raw_days'])).strftime('%Y-%m-%d')
+    report = {'ran_at': datetime.now().isoformat(timespec='seconds'), 'trigger': trigger, 'dry_run': dry_run,
+              'cutoff': cutoff, 'rows_rolled_up': 0, 'students': 0, 'days': 0, 'bytes_before': 0, 'bytes_after': 0,
+              'bytes_reclaimed': 0, 'rollup_rows': 0, 'cold_file': None, 'cold_bytes': 0}
+    if not dry_run:
+        with checkin_lock:
+            finish_pending_compaction()
+        remove_unrecorded_cold_files()
+    # The cold file and the rollups are built from a snapshot of the table without holding checkin_lock, so
+    # check-ins keep being saved meanwhile; retention_lock keeps other compactions out.
+    table = load_checkin_table()
+    old = np.arange(np.searchsorted(table.ts, to_epoch_seconds(cutoff), 'left'))
+    report['bytes_before'] = report['bytes_after'] = raw_checkin_bytes()
+    if len(old) and not dry_run:
+        cold_file, daily = prepare_compaction(table, old)
+        with checkin_lock:
+            current = load_checkin_table()
+            current_old = np.arange(np.searchsorted(current.ts, to_epoch_seconds(cutoff), 'left'))
+            if checkin_data_version(current, current_old) != checkin_data_version(table, old):
+                # Old rows changed meanwhile (an import or a merge); rebuild from the current table.
+                table, old = current, current_old
+                cold_file, daily = prepare_compaction(table, old)
+            manifest = load_data(ROLLUP_MANIFEST_FILE, {})
+            write_rollups(daily, max(manifest.get('through') or cutoff, cutoff), pending_drop=cutoff, pending_cold_file=cold_file)
+            commit_compaction(cutoff, cold_file)
+        remove_unrecorded_cold_files()  # A cold file superseded by a rebuild.
+        report['cold_file'] = cold_file
+        report['cold_bytes'] = os.path.getsize(os.path.join(COLD_STORAGE_FOLDER, cold_file))
+        report['rollup_rows'] = len(daily)
+        report['bytes_after'] = raw_checkin_bytes()
+        report['bytes_reclaimed'] = report['bytes_before'] - report['bytes_after']
+    report.update(rows_rolled_up=len(old), students=len(np.unique(table.student[old])), days=len(np.unique(table.day[old])))
+    report['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    if not dry_run:
+        reports = load_data(RETENTION_REPORTS_FILE, [])
+        save_data(RETENTION_REPORTS_FILE, (reports + [report])[-RETENTION_REPORTS_KEPT:])
+        print(f"Compaction ({trigger}): rolled up {report['rows_rolled_up']} check-in(s) dated before {cutoff}, "
+              f"reclaimed {report['bytes_reclaimed']} bytes ({report['cold_bytes']} bytes written to cold storage).")
+    return report
+
+def compaction_due(policy):
+    reports = load_data(RETENTION_REPORTS_FILE, [])
+    if not reports:
+        return True
+    return datetime.now() - datetime.fromisoformat(reports[-1]['ran_at']) >= timedelta(hours=policy['interval_hours'])
+
+def run_scheduled_compaction():
+    policy = load_retention_policy()
+    if not policy['enabled']:
+        return None
+    # Every worker process runs the schedule; the lock plus the last report make sure only one compacts.
+    with retention_lock:
+        if not compaction_due(policy):
+            return None
+        return compact_checkins(trigger='scheduled')
+
+def _retention_loop():
+    while not serve_state['draining']:
+        time.sleep(RETENTION_CHECK_SECONDS)
+        try:
+            run_scheduled_compaction()
+        except Exception as e:
+            print(f"Scheduled compaction failed: {e}")
+
+def start_retention_scheduler():
+    if retention_state['started']:
+        return
+    retention_state['started'] = True
+    threading.Thread(target=_retention_loop, daemon=True).start()
+
+@app.route('/api/retention', methods=['GET', 'POST'])
+def retention_api():
+    if not session.get('logged_in'): return jsonify({'error': 'Unauthorized'}), 401
+    if request.method == 'POST':
+        if session.get('user_role') != 'super_admin':
+            return jsonify({'error': 'Only the super admin can change the retention policy.'}), 403
+        try:
+            policy = validate_retention_policy(dict(load_retention_policy(), **(request.get_json() or {})))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        save_data(RETENTION_POLICY_FILE, policy)
+    daily, weekly = load_rollups()
+    manifest = load_data(ROLLUP_MANIFEST_FILE, {})
+    return jsonify({
+        'policy': load_retention_policy(),
+        'reports': load_data(RETENTION_REPORTS_FILE, [])[::-1],
+        'rollups': {'through': manifest.get('through'), 'daily_rows': len(daily), 'weekly_rows': len(weekly),
+                    'checkins': int(daily.count.sum())},
+        'cold_storage': [{'file': f, 'bytes': os.path.getsize(os.path.join(COLD_STORAGE_FOLDER, f))} for f in cold_storage_files()],
+    })
+
+@app.route('/api/retention/compact', methods=['POST'])
+def compact_checkins_api():
+    """Previews (dry_run, the default) or runs a compaction now, regardless of the schedule."""
+    if not session.get('logged_in'): return jsonify({'error': 'Unauthorized'}), 401
+    dry_run = (request.get_json() or {}).get('dry_run', True)
+    if not dry_run and session.get('user_role') != 'super_admin':
+        return jsonify({'error': 'Only the super admin can compact check-ins.'}), 403
+    with retention_lock:
+        return jsonify(compact_checkins(dry_run=dry_run))
+
 # --- HTML Templates ---
 BASE_STYLE = """
     <style>
@@ -180,6 +1405,7 @@ USER_TEMPLATE = """
             <div><label for="understanding" class="block text-lg font-semibold mb-2">And 1 to 10, how's your understanding of the lessons?</label><input type="number" id="understanding" min="1" max="10" class="dark-input" placeholder="1 (In the fog) to 10 (Crystal clear)"></div>
             <div id="errorMessage" class="text-red-400 font-semibold text-center h-6"></div>
             <div id="feedbackMessage" class="feedback-message text-center font-semibold p-4 rounded-lg h-24 flex items-center justify-center text-sm"></div>
+            <div id="queueStatus" class="text-amber-300 text-sm text-center"></div>
             <div class="flex flex-col sm:flex-row gap-4 pt-2"><button id="checkInBtn" class="accent-btn w-full font-bold py-3 px-6 rounded-lg text-lg">Check-In</button></div>
         </div>
         {% else %}<div class="p-8 text-center dark-theme-text"><h2 class="text-2xl font-bold">Check-in is Currently Closed</h2><p class="mt-4 text-gray-300">Please wait for the instructor to start the session.</p></div>{% endif %}
@@ -195,21 +1421,35 @@ USER_TEMPLATE = """
 
         function getRandomResponse(category, score) { return responses[category][score][Math.floor(Math.random() * responses[category][score].length)]; }
         
+        function addRosterEntry(entry) {
+            const key = entry.name + '|' + entry.timestamp.slice(0, 19);
+            if (rosterList.querySelector(`[data-key="${CSS.escape(key)}"]`)) return;
+            emptyRoster.style.display = 'none';
+            const playerDiv = document.createElement('div');
+            playerDiv.className = 'roster-item p-3 rounded-lg shadow-sm';
+            playerDiv.dataset.key = key;
+            const nameP = document.createElement('p');
+            nameP.className = 'font-bold text-lg';
+            nameP.textContent = entry.name;
+            playerDiv.appendChild(nameP);
+            rosterList.appendChild(playerDiv);
+        }
+
         function updateRoster(checkins) {
-            rosterList.innerHTML = '';
-            if (checkins.length === 0) { emptyRoster.style.display = 'block'; }
-            else {
-                emptyRoster.style.display = 'none';
-                checkins.forEach(entry => {
-                    const playerDiv = document.createElement('div');
-                    playerDiv.className = 'roster-item p-3 rounded-lg shadow-sm';
-                    playerDiv.innerHTML = `<p class="font-bold text-lg">${entry.name}</p>`;
-                    rosterList.appendChild(playerDiv);
-                });
-            }
+            rosterList.querySelectorAll('.roster-item').forEach(item => item.remove());
+            emptyRoster.style.display = checkins.length === 0 ? 'block' : 'none';
+            checkins.forEach(addRosterEntry);
         }
         
-        document.addEventListener('DOMContentLoaded', () => { fetch('/api/today').then(res => res.json()).then(data => updateRoster(data)); });
+        // The roster is loaded once, then kept current by the server's check-in stream. A full reload
+        // happens on every (re)connect so nothing sent while disconnected is missed.
+        function refreshRoster() { fetch('/api/today').then(res => res.json()).then(data => updateRoster(data)); }
+        document.addEventListener('DOMContentLoaded', () => {
+            if (!window.EventSource) { refreshRoster(); return; }
+            const rosterStream = new EventSource('/api/stream/roster');
+            rosterStream.onopen = refreshRoster;
+            rosterStream.addEventListener('checkin', event => addRosterEntry(JSON.parse(event.data)));
+        });
 
         if (document.getElementById('checkInBtn')) {
             document.getElementById('checkInBtn').addEventListener('click', () => {
@@ -223,22 +1463,75 @@ USER_TEMPLATE = """
                 
                 errorMessage.textContent = '';
                 
-                fetch('/api/checkin', {
-                    method: 'POST',
-                    headers: {'Content-Type': 'application/json'},
-                    body: JSON.stringify({ name, morale, understanding })
-                }).then(res => res.json()).then(data => {
-                    if(data.success) {
-                        displayFeedback(morale, understanding);
-                        fetch('/api/today').then(res => res.json()).then(data => updateRoster(data));
-                        clearInputs();
-                    } else {
-                        errorMessage.textContent = data.error || "An unknown error occurred.";
-                    }
-                });
+                // Every check-in goes through the offline queue; it is sent right away when the network allows.
+                enqueueCheckin({ client_id: newClientId(), name, morale, understanding, submitted_at: Date.now() });
+                displayFeedback(morale, understanding);
+                clearInputs();
             });
         }
 
+        // --- Offline check-in queue ---
+        // Submissions are kept in localStorage until the server acknowledges them, and sent in batches to
+        // /api/checkin/batch. Each carries a client_id, so a batch resent after a dropped response is not stored twice.
+        const QUEUE_KEY = 'pendingCheckins';
+        const QUEUE_BATCH_SIZE = 50;
+        let queueFlushing = false;
+        let queueRetryDelay = 2000;
+        let queueRetryTimer = null;
+
+        function newClientId() {
+            if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+            return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2, 12);
+        }
+        function loadCheckinQueue() {
+            try { return JSON.parse(localStorage.getItem(QUEUE_KEY)) || []; } catch (e) { return []; }
+        }
+        function saveCheckinQueue(queue) {
+            try { localStorage.setItem(QUEUE_KEY, JSON.stringify(queue)); } catch (e) {}
+            const queueStatus = document.getElementById('queueStatus');
+            if (queueStatus) queueStatus.textContent = queue.length
+                ? `${queue.length} check-in${queue.length === 1 ? '' : 's'} waiting for a connection. They'll be sent automatically.` : '';
+        }
+        function enqueueCheckin(item) {
+            const queue = loadCheckinQueue();
+            queue.push(item);
+            saveCheckinQueue(queue);
+            flushCheckinQueue();
+        }
+        function scheduleQueueRetry() {
+            clearTimeout(queueRetryTimer);
+            queueRetryTimer = setTimeout(flushCheckinQueue, queueRetryDelay);
+            queueRetryDelay = Math.min(queueRetryDelay * 2, 60000);
+        }
+        function flushCheckinQueue() {
+            const pending = loadCheckinQueue();
+            saveCheckinQueue(pending);
+            if (queueFlushing || pending.length === 0) return;
+            queueFlushing = true;
+            const batch = pending.slice(0, QUEUE_BATCH_SIZE);
+            fetch('/api/checkin/batch', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({ checkins: batch })
+            }).then(res => res.json().catch(() => ({})).then(data => ({ status: res.status, data }))).then(({ status, data }) => {
+                queueFlushing = false;
+                if (status >= 500 || status === 0) { scheduleQueueRetry(); return; }
+                // Anything the server answered for is done with: saved, duplicate, rejected or refused as a whole.
+                const sent = new Set(batch.map(item => item.client_id));
+                saveCheckinQueue(loadCheckinQueue().filter(item => !sent.has(item.client_id)));
+                const rejected = (data.results || []).filter(result => result.status === 'rejected');
+                if (!data.success || rejected.length) {
+                    document.getElementById('errorMessage').textContent = data.error || rejected[0].error || "A check-in could not be saved.";
+                }
+                if (!window.EventSource) refreshRoster();
+                queueRetryDelay = 2000;
+                flushCheckinQueue();
+            }).catch(() => { queueFlushing = false; scheduleQueueRetry(); });
+        }
+        window.addEventListener('online', () => { queueRetryDelay = 2000; flushCheckinQueue(); });
+        // Anything left from an earlier visit is sent while check-in is open.
+        if (document.getElementById('checkInBtn')) flushCheckinQueue();
+
         function displayFeedback(morale_score, understanding_score) {
             const feedbackMessage = document.getElementById('feedbackMessage');
             feedbackMessage.classList.remove('bg-blue-900/50', 'text-blue-300', 'bg-yellow-900/50', 'text-yellow-300', 'bg-rose-950/60', 'text-rose-300');
@@ -282,6 +1575,7 @@ ADMIN_TEMPLATE = """
         .alert-item { border-left: 4px solid #f59e0b; background-color: rgba(245, 158, 11, 0.1); }
         .alert-item-resolved { border-left: 4px solid #34d399; background-color: rgba(52, 211, 153, 0.1); }
         .alert-item-morale { border-left-color: #EF4444; background-color: rgba(239, 68, 68, 0.1); }
+        .alert-item-trend { border-left: 4px solid #a78bfa; background-color: rgba(167, 139, 250, 0.1); }
         .details-text { color: #d1d5db; }
         .details-text .font-bold { color: #ffffff; }
         .details-text .text-xs { color: #8b949e; }
@@ -323,33 +1617,34 @@ ADMIN_TEMPLATE = """
                 </div>
             </header>
             
-            <div id="summary" class="tab-content">
-                {% if todays_summary_data %}
-                <section class="mb-8 card">
-                    <div class="modern-header p-4 rounded-t-lg"><h2 class="text-2xl font-bold">Summary for {{ todays_summary_data.friendly_date }}</h2></div>
+            <div id="summary" class="tab-content" data-date="{{ today_date }}">
+                <section id="summary-section" class="mb-8 card" {% if not todays_summary_data %}style="display: none;"{% endif %}>
+                    <div class="modern-header p-4 rounded-t-lg"><h2 class="text-2xl font-bold">Summary for {{ today_friendly_date }}</h2></div>
                     <div class="p-6">
                         <h3 class="text-xl font-semibold mb-4">Daily Roster</h3>
-                        <div class="space-y-3 mb-6">
-                            {% for checkin in todays_summary_data.checkins %}
+                        <div id="summary-roster" class="space-y-3 mb-6">
+                            {% if todays_summary_data %}{% for checkin in todays_summary_data.checkins %}
                             <div class="roster-item p-3 rounded-lg flex justify-between items-center">
                                 <p class="font-bold text-lg text-gray-100">{{ checkin.name }} <span class="text-xs text-gray-400 ml-2">{{ checkin.time }}</span></p>
                                 <p class="text-sm">Morale: <span class="font-semibold text-white">{{ checkin.morale }}/10</span> | Understanding: <span class="font-semibold text-white">{{ checkin.understanding }}/10</span></p>
                             </div>
-                            {% endfor %}
+                            {% endfor %}{% endif %}
                         </div>
                         <div class="pt-6 border-t border-gray-700 grid grid-cols-1 sm:grid-cols-3 gap-6 text-center">
-                            <div><h3 class="text-lg font-semibold text-gray-400">Total Check-ins</h3><p class="text-4xl font-bold text-white">{{ todays_summary_data.checkins|length }}</p></div>
-                            <div><h3 class="text-lg font-semibold text-gray-400">Avg. Morale</h3><p class="text-4xl font-bold" style="color: #facc15;">{{ '%.2f'|format(todays_summary_data.avg_morale) }}</p></div>
-                            <div><h3 class="text-lg font-semibold text-gray-400">Avg. Understanding</h3><p class="text-4xl font-bold" style="color: #34d399;">{{ '%.2f'|format(todays_summary_data.avg_understanding) }}</p></div>
+                            <div><h3 class="text-lg font-semibold text-gray-400">Total Check-ins</h3><p id="summary-count" class="text-4xl font-bold text-white">{{ todays_summary_data.checkins|length if todays_summary_data else 0 }}</p></div>
+                            <div><h3 class="text-lg font-semibold text-gray-400">Avg. Morale</h3><p id="summary-avg-morale" class="text-4xl font-bold" style="color: #facc15;">{{ '%.2f'|format(todays_summary_data.avg_morale if todays_summary_data else 0) }}</p></div>
+                            <div><h3 class="text-lg font-semibold text-gray-400">Avg. Understanding</h3><p id="summary-avg-understanding" class="text-4xl font-bold" style="color: #34d399;">{{ '%.2f'|format(todays_summary_data.avg_understanding if todays_summary_data else 0) }}</p></div>
                         </div>
                     </div>
                 </section>
-                {% else %}<div class="card p-8 text-center"><h2 class="text-2xl font-bold">No Check-ins for Today Yet</h2></div>{% endif %}
+                <div id="summary-empty" class="card p-8 text-center" {% if todays_summary_data %}style="display: none;"{% endif %}><h2 class="text-2xl font-bold">No Check-ins for Today Yet</h2></div>
             </div>
             <div id="alerts" class="tab-content">
                  <div class="card p-6">
                     <div class="flex justify-between items-center mb-4">
                         <h2 class="text-2xl font-bold text-white">Student Alert Inbox</h2>
+                        <div class="flex items-center gap-2">
+                        <button id="bulk-guidance-btn" class="modern-btn font-bold py-2 px-4 rounded-lg text-lg" onclick="startBulkGuidance()">Guidance for Flagged Students</button>
                          <div class="dropdown">
                             <button class="modern-btn font-bold py-2 px-4 rounded-lg text-lg">Export Alerts</button>
                             <div class="dropdown-content">
@@ -358,6 +1653,11 @@ ADMIN_TEMPLATE = """
                                 <a href="{{ url_for('export_alerts', format_type='ods') }}">as OpenDocument (.ods)</a>
                             </div>
                         </div>
+                        </div>
+                    </div>
+                    <div id="bulk-guidance-panel" class="mb-4" style="display: none;">
+                        <p id="bulk-guidance-status" class="text-sm text-gray-400 mb-2"></p>
+                        <div id="bulk-guidance-results" class="space-y-2"></div>
                     </div>
                     <div class="flex border-b border-gray-700 mb-4">
                         <button class="alert-sub-tab py-2 px-4 text-gray-400 border-b-2 border-transparent" onclick="openAlertsSubTab(event, 'open-alerts')">Open</button>
@@ -366,7 +1666,7 @@ ADMIN_TEMPLATE = """
 
                     <div id="open-alerts" class="alert-sub-tab-content">
                         {% for alert in open_alerts %}
-                            <div class="p-4 rounded-lg mb-4 {{ 'alert-item-morale' if alert.type == 'morale' else 'alert-item' }}">
+                            <div class="p-4 rounded-lg mb-4 {{ {'morale': 'alert-item-morale', 'trend': 'alert-item-trend'}.get(alert.type, 'alert-item') }}">
                                 <div class="flex justify-between items-start">
                                     <div>
                                         <p class="font-bold text-lg">{{ alert.title }}</p>
@@ -398,26 +1698,9 @@ ADMIN_TEMPLATE = """
                     </div>
 
                     <div id="resolved-alerts" class="alert-sub-tab-content" style="display: none;">
-                        {% for alert in resolved_alerts %}
-                            <details class="alert-item-resolved p-4 rounded-lg mb-4">
-                                <summary class="flex justify-between items-start cursor-pointer">
-                                    <div>
-                                        <p class="font-bold text-lg">{{ alert.title }}</p>
-                                        <p class="text-gray-300">{{ alert.message }}</p>
-                                        <p class="text-xs text-gray-500 mt-2">Originally Generated: {{ alert.date }}</p>
-                                    </div>
-                                    <span class="text-gray-400">&#9662;</span>
-                                </summary>
-                                <div class="mt-4 pt-4 border-t border-gray-600">
-                                    <p><strong>Resolved By:</strong> {{ alert.resolved_by }}</p>
-                                    <p><strong>Resolved On:</strong> {{ alert.resolved_on }}</p>
-                                    <p><strong>Comments:</strong></p>
-                                    <p class="whitespace-pre-wrap pl-4">{{ alert.resolution_comments }}</p>
-                                </div>
-                            </details>
-                        {% else %}
-                            <p>No alerts have been resolved yet.</p>
-                        {% endfor %}
+                        <div id="resolved-alerts-list"></div>
+                        <p id="resolved-alerts-empty" style="display: none;">No alerts have been resolved yet.</p>
+                        <button id="resolved-alerts-more" class="modern-btn font-bold py-2 px-4 rounded-lg text-sm" style="display: none;" onclick="loadResolvedAlerts()">Load More</button>
                     </div>
                 </div>
             </div>
@@ -465,6 +1748,16 @@ ADMIN_TEMPLATE = """
                 <div class="card p-6">
                     <div class="flex justify-between items-center mb-6">
                         <h2 class="text-2xl font-bold">Per-Student History</h2>
+                        <div class="flex items-center gap-2">
+                        <span id="bundle-status" class="text-sm text-gray-400"></span>
+                        <button id="bundle-export-btn" class="modern-btn font-bold py-2 px-4 rounded-lg text-lg" onclick="startExportBundle()">Export Everything (.zip)</button>
+                        <div class="dropdown">
+                            <button class="modern-btn font-bold py-2 px-4 rounded-lg text-lg">Student Reports</button>
+                            <div class="dropdown-content">
+                                <a href="{{ url_for('student_reports', format_type='zip') }}">one PDF per student (.zip)</a>
+                                <a href="{{ url_for('student_reports', format_type='pdf') }}">combined PDF (.pdf)</a>
+                            </div>
+                        </div>
                         <div class="dropdown">
                             <button class="modern-btn font-bold py-2 px-4 rounded-lg text-lg">Export All Data</button>
                             <div class="dropdown-content">
@@ -473,10 +1766,14 @@ ADMIN_TEMPLATE = """
                                 <a href="{{ url_for('export_data', source='all', format_type='ods') }}">as OpenDocument (.ods)</a>
                             </div>
                         </div>
+                        </div>
                     </div>
                     <div class="space-y-4">
                          {% for name, data in student_data.items() %}
-                            <details class="bg-gray-800 rounded-lg" style="background-color: #161b22;"><summary class="p-4 text-lg font-semibold flex justify-between items-center"><span>{{ name }} ({{ data.checkins|length }} check-ins)</span><span>&#9662;</span></summary>
+                            <details class="bg-gray-800 rounded-lg" style="background-color: #161b22;"><summary class="p-4 text-lg font-semibold flex justify-between items-center"><span>{{ name }} ({{ data.total }} check-ins)</span>
+                                {% set trend = trend_scores.get(name) %}
+                                {% if trend %}<span class="font-normal ml-auto mr-4 day-stats"><span class="morale">M: {{ '%.1f'|format(trend.ewma_morale) }} ({{ '%+.1f'|format(trend.slope_morale) }})</span> &middot; <span class="understanding">U: {{ '%.1f'|format(trend.ewma_understanding) }} ({{ '%+.1f'|format(trend.slope_understanding) }})</span></span>{% endif %}
+                                <span>&#9662;</span></summary>
                                  <div class="p-6 border-t border-gray-600 space-y-3">
                                     {% for checkin in data.checkins %}
                                     <div class="roster-item p-3 rounded-lg flex justify-between items-center details-text">
@@ -484,6 +1781,12 @@ ADMIN_TEMPLATE = """
                                         <p class="text-sm">Morale: <span class="font-semibold">{{ checkin.morale }}/10</span> | Understanding: <span class="font-semibold">{{ checkin.understanding }}/10</span></p>
                                     </div>
                                     {% endfor %}
+                                    {% for week in data.weeks %}
+                                    <div class="roster-item p-3 rounded-lg flex justify-between items-center details-text">
+                                        <p class="font-bold">Week of {{ week.week_of }} <span class="text-xs">{{ week.count }} check-ins, rolled up</span></p>
+                                        <p class="text-sm">Avg. Morale: <span class="font-semibold">{{ '%.1f'|format(week.avg_morale) }}/10</span> | Avg. Understanding: <span class="font-semibold">{{ '%.1f'|format(week.avg_understanding) }}/10</span></p>
+                                    </div>
+                                    {% endfor %}
                                 </div></details>
                         {% endfor %}
                     </div>
@@ -521,6 +1824,58 @@ ADMIN_TEMPLATE = """
                         </div>
                     </div>
                 </div>
+                <div class="card p-6 mt-8">
+                    <h2 class="text-2xl font-bold text-white mb-6">Data Management</h2>
+                    <div class="grid grid-cols-1 md:grid-cols-2 gap-8">
+                        <div>
+                            <h3 class="text-xl font-semibold mb-2">Seal Past Terms</h3>
+                            <p class="text-sm text-gray-400 mb-4">Moves check-ins dated before the chosen day into the read-only archive. They stay visible everywhere but no longer slow down the live data file.</p>
+                            <form action="/archive/seal" method="post" class="flex items-center gap-4" onsubmit="return confirm('Seal all check-ins before this date?');">
+                                <input type="date" name="before" class="dark-input flex-1" required>
+                                <button type="submit" class="accent-btn font-bold py-2 px-4 rounded-lg">Seal</button>
+                            </form>
+                            {% for message in get_flashed_messages(category_filter=['archive']) %}
+                            <p class="text-sm text-gray-300 mt-3">{{ message }}</p>
+                            {% endfor %}
+                        </div>
+                        <div>
+                            <h3 class="text-xl font-semibold mb-2">Import Historical Check-ins</h3>
+                            <p class="text-sm text-gray-400 mb-4">Upload a .csv or .xlsx with Name, Morale, Understanding and Date (plus an optional Time) columns, such as an earlier export. Check the file first; rows already stored are skipped.</p>
+                            <input type="file" id="import-file" accept=".csv,.xlsx" class="dark-input w-full mb-3">
+                            <div class="flex gap-4">
+                                <button type="button" onclick="runCheckinImport(true)" class="modern-btn font-bold py-2 px-4 rounded-lg">Check File</button>
+                                <button type="button" id="import-btn" onclick="runCheckinImport(false)" class="accent-btn font-bold py-2 px-4 rounded-lg">Import</button>
+                            </div>
+                            <div id="import-status" class="text-sm text-gray-300 mt-3"></div>
+                        </div>
+                        <div>
+                            <h3 class="text-xl font-semibold mb-2">Merge Duplicate Students</h3>
+                            <p class="text-sm text-gray-400 mb-4">Folds a misspelled name into the right student. Its check-ins and alerts move over, and the old spelling is kept as an alias for future check-ins.</p>
+                            <div class="flex items-center gap-4">
+                                <select id="merge-from" class="dark-input flex-1"></select>
+                                <span class="text-gray-400">into</span>
+                                <select id="merge-into" class="dark-input flex-1"></select>
+                                <button type="button" onclick="mergeStudents()" class="accent-btn font-bold py-2 px-4 rounded-lg">Merge</button>
+                            </div>
+                            <div id="merge-status" class="text-sm text-gray-300 mt-3"></div>
+                        </div>
+                        <div>
+                            <h3 class="text-xl font-semibold mb-2">Retention</h3>
+                            <p class="text-sm text-gray-400 mb-4">Check-ins older than the chosen number of days are rolled up into daily and weekly totals per student, which keep the calendar, averages and trends intact. The individual rows move to compressed files in cold storage.</p>
+                            <div class="flex items-center gap-4 mb-3">
+                                <label class="flex items-center gap-2"><input type="checkbox" id="retention-enabled"> Run automatically</label>
+                                <input type="number" id="retention-days" min="30" class="dark-input w-24">
+                                <span class="text-gray-400">days kept raw</span>
+                                <button type="button" onclick="saveRetentionPolicy()" class="modern-btn font-bold py-2 px-4 rounded-lg">Save</button>
+                            </div>
+                            <div class="flex gap-4">
+                                <button type="button" onclick="runCompaction(true)" class="modern-btn font-bold py-2 px-4 rounded-lg">Preview</button>
+                                <button type="button" id="compact-btn" onclick="runCompaction(false)" class="accent-btn font-bold py-2 px-4 rounded-lg">Compact Now</button>
+                            </div>
+                            <div id="retention-status" class="text-sm text-gray-300 mt-3"></div>
+                        </div>
+                    </div>
+                </div>
             </div>
             {% endif %}
             <div id="planner" class="tab-content">
@@ -542,6 +1897,16 @@ ADMIN_TEMPLATE = """
                                     <label for="planner-lesson-context" class="block mb-1">Provide Context or Ask a Question:</label>
                                     <textarea id="planner-lesson-context" rows="4" class="dark-textarea" placeholder="For a student, describe the lesson. For a general question, ask anything."></textarea>
                                 </div>
+                                <div>
+                                    <label for="lesson-context-select" class="block mb-1">Shared Lesson (Optional):</label>
+                                    <div class="flex gap-2">
+                                        <select id="lesson-context-select" class="dark-select">
+                                            <option value="">None - use the context and file below</option>
+                                            {% for lesson in lesson_contexts %}<option value="{{ lesson.id }}">{{ lesson.title }}</option>{% endfor %}
+                                        </select>
+                                        <button id="save-lesson-btn" class="modern-btn font-bold py-2 px-4 rounded-lg text-sm whitespace-nowrap">Save Lesson</button>
+                                    </div>
+                                </div>
                                 <div>
                                     <label for="lesson-file-upload" class="block mb-1">Attach Lesson File (Optional):</label>
                                     <input type="file" id="lesson-file-upload" accept="{{ accepted_file_types }}" class="dark-input">
@@ -625,6 +1990,257 @@ ADMIN_TEMPLATE = """
             document.querySelectorAll('.alert-sub-tab').forEach(st => st.classList.remove('active'));
             document.getElementById(subTabName).style.display = 'block';
             evt.currentTarget.classList.add('active');
+            if (subTabName === 'resolved-alerts' && resolvedAlertsPage === 0) { loadResolvedAlerts(); }
+        }
+
+        function escapeHtml(value) {
+            const div = document.createElement('div');
+            div.textContent = value == null ? '' : String(value);
+            return div.innerHTML;
+        }
+
+        // Bulk guidance runs as a background job; poll it and show each student's plan as it completes.
+        async function startBulkGuidance() {
+            const lessonContext = prompt('Lesson context for the guidance plans (optional):', '');
+            if (lessonContext === null) return;
+            const panel = document.getElementById('bulk-guidance-panel');
+            const status = document.getElementById('bulk-guidance-status');
+            const button = document.getElementById('bulk-guidance-btn');
+            panel.style.display = 'block';
+            button.disabled = true;
+            const response = await fetch('/api/guidance/bulk', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ lessonContext }) });
+            const started = await response.json();
+            if (!response.ok) {
+                status.textContent = started.error;
+                button.disabled = false;
+                return;
+            }
+            const poll = async () => {
+                const job = await (await fetch(`/api/guidance/bulk/${started.job_id}`)).json();
+                const plans = await (await fetch('/api/guidance/plans')).json();
+                status.textContent = `Generated ${job.done}/${job.total} guidance plans` + (job.status === 'done' ? '.' : '...');
+                document.getElementById('bulk-guidance-results').innerHTML = Object.entries(job.students).map(([name, s]) => `
+                    <details class="roster-item p-3 rounded-lg"><summary class="font-semibold">${escapeHtml(name)} &middot; ${escapeHtml(s.status)}</summary>
+                        <div class="mt-2 whitespace-pre-wrap text-sm">${escapeHtml(s.status === 'failed' ? s.error : (s.status === 'done' && plans[name] ? plans[name].plan : ''))}</div>
+                    </details>`).join('');
+                if (job.status === 'done') button.disabled = false;
+                else setTimeout(poll, 2000);
+            };
+            poll();
+        }
+
+        // Today's summary is updated in place from the server's check-in stream, and reloaded on every
+        // (re)connect so nothing sent while disconnected is missed.
+        function summaryItem(c) {
+            const item = document.createElement('div');
+            item.className = 'roster-item p-3 rounded-lg flex justify-between items-center';
+            item.innerHTML = `<p class="font-bold text-lg text-gray-100">${escapeHtml(c.name)} <span class="text-xs text-gray-400 ml-2">${escapeHtml(c.time)}</span></p>
+                <p class="text-sm">Morale: <span class="font-semibold text-white">${c.morale}/10</span> | Understanding: <span class="font-semibold text-white">${c.understanding}/10</span></p>`;
+            return item;
+        }
+
+        function showSummaryTotals(count, avgMorale, avgUnderstanding) {
+            document.getElementById('summary-count').textContent = count;
+            document.getElementById('summary-avg-morale').textContent = avgMorale.toFixed(2);
+            document.getElementById('summary-avg-understanding').textContent = avgUnderstanding.toFixed(2);
+            document.getElementById('summary-section').style.display = count ? 'block' : 'none';
+            document.getElementById('summary-empty').style.display = count ? 'none' : 'block';
+        }
+
+        function clockTime(timestamp) {
+            const [h, m, s] = timestamp.slice(11, 19).split(':').map(Number);
+            const pad = n => String(n).padStart(2, '0');
+            return `${pad(h % 12 || 12)}:${pad(m)}:${pad(s)} ${h < 12 ? 'AM' : 'PM'}`;
+        }
+
+        function refreshSummary() {
+            fetch('/api/today').then(res => res.json()).then(entries => {
+                // Check-ins are never removed, so an empty answer has nothing new; a page left open overnight keeps its day.
+                if (!entries.length || entries[0].timestamp.slice(0, 10) !== document.getElementById('summary').dataset.date) return;
+                const roster = document.getElementById('summary-roster');
+                roster.innerHTML = '';
+                entries.forEach(c => roster.appendChild(summaryItem({ ...c, time: clockTime(c.timestamp) })));
+                const total = key => entries.reduce((sum, c) => sum + c[key], 0);
+                showSummaryTotals(entries.length, total('morale') / entries.length, total('understanding') / entries.length);
+            });
+        }
+
+        if (window.EventSource && document.getElementById('summary')) {
+            const dashboardStream = new EventSource('/api/stream/dashboard');
+            dashboardStream.onopen = refreshSummary;
+            dashboardStream.addEventListener('checkin', event => {
+                const update = JSON.parse(event.data);
+                if (update.date !== document.getElementById('summary').dataset.date) return;
+                document.getElementById('summary-roster').appendChild(summaryItem(update.checkin));
+                showSummaryTotals(update.count, update.avg_morale, update.avg_understanding);
+            });
+        }
+
+        // Full exports run as a background job; poll its progress until the zip is ready.
+        async function startExportBundle() {
+            const status = document.getElementById('bundle-status');
+            const button = document.getElementById('bundle-export-btn');
+            button.disabled = true;
+            status.textContent = 'Starting export...';
+            try {
+                const { job_id } = await (await fetch('/export_bundle', { method: 'POST' })).json();
+                const poll = async () => {
+                    const job = await (await fetch(`/export_bundle/${job_id}`)).json();
+                    if (job.status === 'done') {
+                        const skipped = job.errors ? ` (${job.errors} file(s) could not be rendered; see manifest.json)` : '';
+                        status.innerHTML = `<a class="underline" href="${job.download_url}">Download export bundle</a>${skipped}`;
+                        button.disabled = false;
+                    } else if (job.status === 'failed') {
+                        status.textContent = 'Export failed: ' + (job.error || 'unknown error');
+                        button.disabled = false;
+                    } else {
+                        status.textContent = job.total ? `Exporting... ${job.done}/${job.total} files` : 'Preparing export...';
+                        setTimeout(poll, 1000);
+                    }
+                };
+                poll();
+            } catch (error) {
+                status.textContent = 'Could not start the export.';
+                button.disabled = false;
+            }
+        }
+
+        async function loadStudentOptions() {
+            const students = await (await fetch('/api/students')).json();
+            ['merge-from', 'merge-into'].forEach(id => {
+                const select = document.getElementById(id);
+                select.innerHTML = '';
+                students.forEach(student => {
+                    const option = document.createElement('option');
+                    option.value = student.id;
+                    option.textContent = `${student.name} (${student.checkins})`;
+                    select.appendChild(option);
+                });
+            });
+        }
+
+        async function mergeStudents() {
+            const from = document.getElementById('merge-from');
+            const into = document.getElementById('merge-into');
+            const status = document.getElementById('merge-status');
+            if (from.value === into.value) { status.textContent = 'Choose two different students.'; return; }
+            const fromName = from.selectedOptions[0].textContent, intoName = into.selectedOptions[0].textContent;
+            if (!confirm(`Merge ${fromName} into ${intoName}? This cannot be undone.`)) return;
+            try {
+                const response = await fetch('/api/students/merge', {
+                    method: 'POST', headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ from_id: Number(from.value), into_id: Number(into.value) })
+                });
+                const result = await response.json();
+                status.textContent = result.error || `Merged into ${result.name}.`;
+                if (response.ok) loadStudentOptions();
+            } catch (error) {
+                status.textContent = 'The merge request failed.';
+            }
+        }
+
+        function describeCompaction(report) {
+            const verb = report.dry_run ? 'would be rolled up' : 'rolled up';
+            const reclaimed = report.dry_run ? '' : `, ${(report.bytes_reclaimed / 1024).toFixed(0)} KB reclaimed`;
+            return `${report.rows_rolled_up} check-ins dated before ${report.cutoff} ${verb} (${report.students} students, ${report.days} days)${reclaimed}.`;
+        }
+
+        async function loadRetention() {
+            const retention = await (await fetch('/api/retention')).json();
+            document.getElementById('retention-enabled').checked = retention.policy.enabled;
+            document.getElementById('retention-days').value = retention.policy.raw_days;
+            const last = retention.reports[0];
+            document.getElementById('retention-status').textContent = last ? `Last run ${last.ran_at}: ${describeCompaction(last)}` : 'No compaction has run yet.';
+        }
+
+        async function saveRetentionPolicy() {
+            const status = document.getElementById('retention-status');
+            const response = await fetch('/api/retention', {
+                method: 'POST', headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ enabled: document.getElementById('retention-enabled').checked, raw_days: Number(document.getElementById('retention-days').value) })
+            });
+            const result = await response.json();
+            status.textContent = result.error || 'Retention policy saved.';
+        }
+
+        async function runCompaction(dryRun) {
+            const status = document.getElementById('retention-status');
+            if (!dryRun && !confirm('Roll up old check-ins now? Individual rows will only be kept in cold storage.')) return;
+            status.textContent = dryRun ? 'Checking...' : 'Compacting...';
+            document.getElementById('compact-btn').disabled = true;
+            try {
+                const result = await (await fetch('/api/retention/compact', {
+                    method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ dry_run: dryRun })
+                })).json();
+                status.textContent = result.error || describeCompaction(result);
+            } catch (error) {
+                status.textContent = 'The compaction request failed.';
+            } finally {
+                document.getElementById('compact-btn').disabled = false;
+            }
+        }
+
+        async function runCheckinImport(dryRun) {
+            const file = document.getElementById('import-file').files[0];
+            const status = document.getElementById('import-status');
+            if (!file) { status.textContent = 'Choose a file first.'; return; }
+            if (!dryRun && !confirm(`Import check-ins from ${file.name}?`)) return;
+            const form = new FormData();
+            form.append('file', file);
+            form.append('dry_run', dryRun ? 'true' : 'false');
+            status.textContent = dryRun ? 'Checking file...' : 'Importing...';
+            document.getElementById('import-btn').disabled = true;
+            try {
+                const result = await (await fetch('/api/import/checkins', { method: 'POST', body: form })).json();
+                if (result.error) { status.textContent = result.error; return; }
+                const verb = result.dry_run ? 'would be imported' : 'imported';
+                const range = result.first_date ? ` (${result.first_date} to ${result.last_date}, ${result.students} students)` : '';
+                status.textContent = `${result.imported} of ${result.rows} rows ${verb}${range}; ${result.duplicates} already stored, ${result.errors} with errors.`;
+                if (result.error_report.length) {
+                    const list = document.createElement('ul');
+                    list.className = 'mt-2 max-h-48 overflow-y-auto text-red-300';
+                    result.error_report.forEach(item => {
+                        const li = document.createElement('li');
+                        li.textContent = `Row ${item.row}: ${item.error}`;
+                        list.appendChild(li);
+                    });
+                    status.appendChild(list);
+                }
+            } catch (error) {
+                status.textContent = 'The import request failed.';
+            } finally {
+                document.getElementById('import-btn').disabled = false;
+            }
+        }
+
+        // Resolved alerts live in a separate archive and are only fetched, a page at a time, when viewed.
+        let resolvedAlertsPage = 0;
+        async function loadResolvedAlerts() {
+            const response = await fetch(`/api/alerts/resolved?page=${resolvedAlertsPage + 1}`);
+            const result = await response.json();
+            resolvedAlertsPage = result.page;
+            const list = document.getElementById('resolved-alerts-list');
+            result.alerts.forEach(alert => {
+                list.insertAdjacentHTML('beforeend', `
+                    <details class="alert-item-resolved p-4 rounded-lg mb-4">
+                        <summary class="flex justify-between items-start cursor-pointer">
+                            <div>
+                                <p class="font-bold text-lg">${escapeHtml(alert.title)}</p>
+                                <p class="text-gray-300">${escapeHtml(alert.message)}</p>
+                                <p class="text-xs text-gray-500 mt-2">Originally Generated: ${escapeHtml(alert.date)}</p>
+                            </div>
+                            <span class="text-gray-400">&#9662;</span>
+                        </summary>
+                        <div class="mt-4 pt-4 border-t border-gray-600">
+                            <p><strong>Resolved By:</strong> ${escapeHtml(alert.resolved_by)}</p>
+                            <p><strong>Resolved On:</strong> ${escapeHtml(alert.resolved_on)}</p>
+                            <p><strong>Comments:</strong></p>
+                            <p class="whitespace-pre-wrap pl-4">${escapeHtml(alert.resolution_comments)}</p>
+                        </div>
+                    </details>`);
+            });
+            document.getElementById('resolved-alerts-empty').style.display = result.total === 0 ? 'block' : 'none';
+            document.getElementById('resolved-alerts-more').style.display = result.has_more ? 'inline-block' : 'none';
         }
         
         function toggleResolveForm(alertId) {
@@ -638,6 +2254,8 @@ ADMIN_TEMPLATE = """
             const params = new URLSearchParams(window.location.search);
             const tab = params.get('tab') || 'summary';
             openTab(null, tab);
+            if (document.getElementById('merge-from')) loadStudentOptions();
+            if (document.getElementById('retention-days')) loadRetention();
 
             const alertTab = document.querySelector('.alert-sub-tab');
             if (alertTab) {
@@ -691,15 +2309,40 @@ ADMIN_TEMPLATE = """
         };
 
 
+        // Saves the current lesson text and file once so later analyses can reference it by id.
+        const saveLessonBtn = document.getElementById('save-lesson-btn');
+        if(saveLessonBtn) {
+            saveLessonBtn.addEventListener('click', async () => {
+                const text = document.getElementById('planner-lesson-context').value;
+                const lessonFileInput = document.getElementById('lesson-file-upload');
+                if (!text && lessonFileInput.files.length === 0) { alert('Enter lesson context or attach a lesson file to save.'); return; }
+                const title = prompt('Name this lesson:', '');
+                if (!title) return;
+                const { fileData, mimeType } = await getFileData(lessonFileInput);
+                const response = await fetch('/api/lesson_contexts', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({ title, text, fileData, mimeType })
+                });
+                const result = await response.json();
+                if (!response.ok) { alert(result.error); return; }
+                const select = document.getElementById('lesson-context-select');
+                select.add(new Option(result.title, result.id));
+                select.value = result.id;
+                lessonFileInput.value = '';
+            });
+        }
+
         if(generateBtn) {
              generateBtn.addEventListener('click', async () => {
                 const studentName = document.getElementById('planner-student-input').value;
                 const lessonContext = document.getElementById('planner-lesson-context').value;
+                const lessonContextId = document.getElementById('lesson-context-select').value;
                 const lessonFileInput = document.getElementById('lesson-file-upload');
                 const studentWorkFileInput = document.getElementById('student-work-file-upload');
                 
                 if (!studentName) { alert('Please select a student or "Teacher".'); return; }
-                if (!lessonContext && lessonFileInput.files.length === 0 && studentWorkFileInput.files.length === 0) { 
+                if (!lessonContext && !lessonContextId && lessonFileInput.files.length === 0 && studentWorkFileInput.files.length === 0) { 
                     alert('Please provide some context, ask a question, or upload a file.'); 
                     return; 
                 }
@@ -714,10 +2357,12 @@ ADMIN_TEMPLATE = """
                 let payload = {
                     studentName: studentName,
                     lessonContext: lessonContext,
+                    lessonContextId: lessonContextId || null,
                     lessonFileData: lessonFileData.fileData,
                     lessonMimeType: lessonFileData.mimeType,
                     studentWorkFileData: studentWorkFileData.fileData,
                     studentWorkMimeType: studentWorkFileData.mimeType,
+                    async: true,
                 };
                 
                 try {
@@ -727,11 +2372,11 @@ ADMIN_TEMPLATE = """
                         body: JSON.stringify(payload)
                     });
                     const result = await response.json();
-                    if(result.plan) {
-                        outputDiv.innerHTML = result.plan.replace(/\\n/g, '<br>').replace(/\\*\\*/g, '<strong>').replace(/\\*/g, '</strong>');
-                        planActions.style.display = 'flex';
+                    if (result.job_id) {
+                        localStorage.setItem('pendingPlanJob', result.job_id);
+                        pollPlanJob(result.job_id);
                     } else {
-                        outputDiv.innerHTML = '<p class="text-red-400">Error: ' + (result.error || 'Could not generate a response.') + '</p>';
+                        renderPlanResult(result);
                     }
                 } catch (error) {
                     outputDiv.innerHTML = '<p class="text-red-400">An error occurred while contacting the AI assistant.</p>';
@@ -739,6 +2384,39 @@ ADMIN_TEMPLATE = """
                 }
             });
         }
+
+        function renderPlanResult(result) {
+            const outputDiv = document.getElementById('ai-plan-output');
+            if(result.plan) {
+                outputDiv.innerHTML = result.plan.replace(/\\n/g, '<br>').replace(/\\*\\*/g, '<strong>').replace(/\\*/g, '</strong>');
+                planActions.style.display = 'flex';
+            } else {
+                outputDiv.innerHTML = '<p class="text-red-400">Error: ' + (result.error || 'Could not generate a response.') + '</p>';
+            }
+        }
+
+        // Plans run as server-side jobs; the job id is kept so a reload or dropped connection can resume polling.
+        async function pollPlanJob(jobId) {
+            try {
+                const response = await fetch(`/api/ai_jobs/${jobId}`);
+                if (response.status === 404) { localStorage.removeItem('pendingPlanJob'); return; }
+                const job = await response.json();
+                if (job.status === 'done' || job.status === 'failed') {
+                    localStorage.removeItem('pendingPlanJob');
+                    renderPlanResult(job.result);
+                    return;
+                }
+            } catch (error) {
+                console.error('Error polling plan job:', error);
+            }
+            setTimeout(() => pollPlanJob(jobId), 2000);
+        }
+
+        const pendingPlanJob = localStorage.getItem('pendingPlanJob');
+        if (pendingPlanJob && document.getElementById('ai-plan-output')) {
+            document.getElementById('ai-plan-output').innerHTML = '<p class="text-yellow-400">Resuming your last request... Please wait.</p>';
+            pollPlanJob(pendingPlanJob);
+        }
         
         // --- AI Plan Actions ---
         const printPlanBtn = document.getElementById('print-plan-btn');
@@ -903,7 +2581,7 @@ DAY_DETAIL_TEMPLATE = """
         </header>
         <section class="mb-8 card">
             <div class="p-6 grid grid-cols-1 sm:grid-cols-3 gap-6 text-center">
-                <div><h3 class="text-lg font-semibold text-gray-400">Total Check-ins</h3><p class="text-4xl font-bold text-white">{{ checkins|length }}</p></div>
+                <div><h3 class="text-lg font-semibold text-gray-400">Total Check-ins</h3><p class="text-4xl font-bold text-white">{{ total_count }}</p></div>
                 <div><h3 class="text-lg font-semibold text-gray-400">Avg. Morale</h3><p class="text-4xl font-bold" style="color: #facc15;">{{ '%.2f'|format(avg_morale) }}</p></div>
                 <div><h3 class="text-lg font-semibold text-gray-400">Avg. Understanding</h3><p class="text-4xl font-bold" style="color: #34d399;">{{ '%.2f'|format(avg_understanding) }}</p></div>
             </div>
@@ -911,6 +2589,7 @@ DAY_DETAIL_TEMPLATE = """
         
         <section class="mb-8 card p-6">
             <h2 class="text-2xl font-bold text-white mb-4">Individual Check-ins</h2>
+            {% if rolled_up_count %}<p class="text-gray-400 mb-4">{{ rolled_up_count }} check-in(s) from this day were rolled up into daily totals by the retention policy; the individual rows are kept in cold storage.</p>{% endif %}
             <div class="space-y-3">
                 {% for checkin in checkins %}
                 <div class="roster-item p-3 rounded-lg flex justify-between items-center">
@@ -918,7 +2597,7 @@ DAY_DETAIL_TEMPLATE = """
                     <p class="text-sm">Morale: <span class="font-semibold text-white">{{ checkin.morale }}/10</span> | Understanding: <span class="font-semibold text-white">{{ checkin.understanding }}/10</span></p>
                 </div>
                 {% else %}
-                <p class="text-gray-400">No check-ins were recorded on this day.</p>
+                {% if not rolled_up_count %}<p class="text-gray-400">No check-ins were recorded on this day.</p>{% endif %}
                 {% endfor %}
             </div>
         </section>
@@ -952,6 +2631,102 @@ DAY_DETAIL_TEMPLATE = """
 </body></html>
 """
 
+# --- HTTP Caching and Compression ---
+# Dashboard views carry a weak ETag built from the signatures of the files they render, so a reload with
+# nothing changed gets a 304 instead of the full page. Text responses above COMPRESS_MIN_BYTES are sent
+# brotli- or gzip-encoded. Bytes saved by both are counted per route.
+COMPRESS_MIN_BYTES = 1024
+COMPRESSIBLE_MIMETYPES = {'text/html', 'application/json', 'text/csv', 'text/plain', 'text/markdown'}
+APP_VERSION = file_signature(os.path.abspath(__file__))
+
+http_stats_lock = threading.Lock()
+http_stats = defaultdict(lambda: {'responses': 0, 'not_modified': 0, 'compressed': 0, 'bytes_sent': 0,
+                                  'bytes_saved_compression': 0, 'bytes_saved_not_modified': 0, 'last_body_bytes': 0})
+
+def view_etag(*files):
+    """ETag for a view rendered from `files` for the current user, URL and day."""
+    # Pending flash messages (kept by Flask under '_flashes') are part of the page, so they change its version too.
+    parts = [APP_VERSION, request.full_path, session.get('user_email'), datetime.now().strftime('%Y-%m-%d'), session.get('_flashes')]
+    parts.extend(file_signature(f) for f in files)
+    return hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+
+def not_modified(etag):
+    """Returns a 304 response when the client already holds this version, otherwise None."""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    with http_stats_lock:
+        stats = http_stats[request.endpoint]
+        stats['not_modified'] += 1
+        stats['bytes_saved_not_modified'] += stats['last_body_bytes']
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def with_etag(body, etag, files):
+    response = make_response(body)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    mtimes = [os.path.getmtime(f) for f in files if os.path.exists(f)]
+    if mtimes:
+        response.last_modified = datetime.fromtimestamp(max(mtimes), timezone.utc)
+    return response
+
+def preferred_encoding():
+    if brotli is not None and request.accept_encodings['br']:
+        return 'br'
+    if request.accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+@app.after_request
+def compress_response(response):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    data = response.get_data()
+    encoding = preferred_encoding() if len(data) >= COMPRESS_MIN_BYTES else None
+    if len(data) >= COMPRESS_MIN_BYTES:
+        response.vary.add('Accept-Encoding')
+    if encoding:
+        response.set_data(brotli.compress(data, quality=5) if encoding == 'br' else gzip.compress(data, compresslevel=6))
+        response.headers['Content-Encoding'] = encoding
+    sent = response.content_length
+    with http_stats_lock:
+        stats = http_stats[request.endpoint]
+        stats['responses'] += 1
+        stats['bytes_sent'] += sent
+        stats['last_body_bytes'] = sent
+        if encoding:
+            stats['compressed'] += 1
+            stats['bytes_saved_compression'] += len(data) - sent
+    return response
+
+def send_export(path, filename, format_type):
+    """Sends a cached export, using a gzip copy for CSV when the client accepts it."""
+    if format_type == 'csv' and request.accept_encodings['gzip']:
+        gz_path = f"{path}.gz"
+        if not os.path.exists(gz_path):
+            temp_path = f"{gz_path}.{uuid.uuid4().hex}.tmp"
+            with open(path, 'rb') as source, gzip.open(temp_path, 'wb', compresslevel=6) as target:
+                shutil.copyfileobj(source, target)
+            os.replace(temp_path, gz_path)
+        response = send_file(gz_path, as_attachment=True, download_name=filename, mimetype=EXPORT_MIMETYPES[format_type])
+        response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        with http_stats_lock:
+            stats = http_stats[request.endpoint]
+            stats['compressed'] += 1
+            stats['bytes_saved_compression'] += os.path.getsize(path) - os.path.getsize(gz_path)
+        return response
+    return send_file(path, as_attachment=True, download_name=filename, mimetype=EXPORT_MIMETYPES[format_type])
+
+@app.route('/api/metrics/http')
+def http_metrics_api():
+    if not session.get('logged_in'): return jsonify({'error': 'Unauthorized'}), 401
+    with http_stats_lock:
+        return jsonify({endpoint: {k: v for k, v in stats.items() if k != 'last_body_bytes'} for endpoint, stats in http_stats.items()})
+
 # --- Flask Routes and Logic ---
 
 # Helper to convert HTML to clean text for exports
@@ -989,13 +2764,12 @@ def export_plan():
             headers={'Content-Disposition': f'attachment;filename={filename}'}
         )
     elif format_type == 'pdf':
-        pdf = FPDF()
+        pdf, family, encode = new_report_pdf()
         pdf.add_page()
-        pdf.set_font("Arial", size=12)
+        pdf.set_font(family, size=12)
         cleaned_text = clean_html_for_export(html_content, 'txt')
-        cleaned_text_encoded = cleaned_text.encode('latin-1', 'replace').decode('latin-1')
-        pdf.multi_cell(0, 10, txt=cleaned_text_encoded)
-        pdf_output = pdf.output(dest='S').encode('latin-1')
+        pdf.multi_cell(0, 10, text=encode(cleaned_text))
+        pdf_output = bytes(pdf.output())
         mimetype = 'application/pdf'
         return Response(
             pdf_output,
@@ -1051,6 +2825,12 @@ def admin_view(year, month):
     if not session.get('logged_in'):
         return redirect(url_for('login'))
 
+    view_files = (*checkin_store.files(), ARCHIVE_MANIFEST_FILE, ROLLUP_MANIFEST_FILE, *student_store.files(), *alert_store.files(), USERS_FILE, STATUS_FILE, *upload_store.files(), LESSON_CONTEXTS_FILE)
+    etag = view_etag(*view_files)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
     active_tab = request.args.get('tab', 'summary')
     current_date = datetime(year, month, 1)
 
@@ -1060,21 +2840,19 @@ def admin_view(year, month):
     next_month_date = (current_date.replace(day=28) + timedelta(days=4)).replace(day=1)
     next_month_url = url_for('admin_view', year=next_month_date.year, month=next_month_date.month, tab='calendar')
     
-    all_checkins = load_data(DATA_FILE, [])
+    table = load_checkin_table()
     status = load_data(STATUS_FILE, {'is_open': False})
-    valid_checkins = [c for c in all_checkins if 'timestamp' in c]
 
-    daily_data, student_data, calendar_data, todays_summary_data = process_checkin_data(valid_checkins, year, month)
+    daily_data, student_data, calendar_data, todays_summary_data = process_checkin_data(table, load_rollups(), year, month)
     
     current_user = find_user_by_email(session['user_email'])
-    all_alerts = load_data(ALERTS_FILE, [])
-    open_alerts = sorted([a for a in all_alerts if a['status'] == 'open'], key=lambda x: x['date'], reverse=True)
-    resolved_alerts = sorted([a for a in all_alerts if a['status'] == 'resolved'], key=lambda x: x.get('resolved_on', ''), reverse=True)
+    open_alerts = get_open_alerts()
     
     all_users = load_data(USERS_FILE, [])
     student_names = sorted(list(student_data.keys()))
+    trend_scores = get_trend_scores()
 
-    return render_template_string(
+    return with_etag(render_template_string(
         ADMIN_TEMPLATE,
         style=BASE_STYLE,
         todays_summary_data=todays_summary_data,
@@ -1089,38 +2867,42 @@ def admin_view(year, month):
         next_month_url=next_month_url,
         current_user=current_user,
         open_alerts=open_alerts,
-        resolved_alerts=resolved_alerts,
         open_alerts_count=len(open_alerts),
         all_users=all_users,
         student_names=student_names,
+        trend_scores=trend_scores,
+        today_date=datetime.now().strftime('%Y-%m-%d'),
+        today_friendly_date=datetime.now().strftime('%A, %B %d, %Y'),
+        lesson_contexts=sorted(load_data(LESSON_CONTEXTS_FILE, {}).values(), key=lambda x: x['created_on'], reverse=True),
         accepted_file_types=ACCEPTED_FILE_TYPES,
         active_tab=active_tab
-    )
-
-def process_checkin_data(checkins, cal_year, cal_month):
-    daily_summary = defaultdict(lambda: {'checkins': [], 'total_morale': 0, 'total_understanding': 0})
-    student_summary = defaultdict(lambda: {'checkins': []})
-    
-    for checkin in checkins:
-        dt_obj = datetime.fromisoformat(checkin['timestamp'])
-        date_key = dt_obj.strftime('%Y-%m-%d')
-        
-        checkin['time'] = dt_obj.strftime('%I:%M:%S %p')
-        daily_summary[date_key]['checkins'].append(checkin)
-        daily_summary[date_key]['total_morale'] += checkin['morale']
-        daily_summary[date_key]['total_understanding'] += checkin['understanding']
-        
-        checkin['date_friendly'] = dt_obj.strftime('%Y-%m-%d')
-        student_summary[checkin['name']]['checkins'].append(checkin)
+    ), etag, view_files)
+
+def process_checkin_data(table, rollups, cal_year, cal_month):
+    days, day_of_row, day_counts = np.unique(table.day, return_inverse=True, return_counts=True)
+    day_rows = np.split(np.argsort(day_of_row, kind='stable'), np.cumsum(day_counts)[:-1]) if len(days) else []
+    rows_by_day = dict(zip(days.tolist(), day_rows))
+
+    # Days past the retention cutoff only have rolled-up totals; totals are summed over both kinds.
+    daily, weekly = rollups
+    all_days, day_of_total = np.unique(np.concatenate([table.day, daily.period]), return_inverse=True)
+    def day_totals(raw, rolled):
+        return np.bincount(day_of_total, weights=np.concatenate([raw, rolled]), minlength=len(all_days))
+    counts = day_totals(np.ones(len(table)), daily.count)
+    morale_totals = day_totals(table.morale, daily.morale_sum)
+    understanding_totals = day_totals(table.understanding, daily.understanding_sum)
 
     processed_daily_data = {}
-    for date_key, data in sorted(daily_summary.items(), reverse=True):
-        count = len(data['checkins'])
-        processed_daily_data[date_key] = {
-            'checkins': data['checkins'],
-            'avg_morale': data['total_morale'] / count if count > 0 else 0,
-            'avg_understanding': data['total_understanding'] / count if count > 0 else 0,
-            'friendly_date': datetime.strptime(date_key, '%Y-%m-%d').strftime('%A, %B %d, %Y')
+    no_rows = np.zeros(0, dtype=np.int64)
+    for i in range(len(all_days) - 1, -1, -1):
+        day_date = from_epoch_seconds(int(all_days[i]) * SECONDS_PER_DAY)
+        count = int(counts[i])
+        processed_daily_data[day_date.strftime('%Y-%m-%d')] = {
+            'checkins': table.rows(rows_by_day.get(int(all_days[i]), no_rows)),
+            'count': count,
+            'avg_morale': morale_totals[i] / count,
+            'avg_understanding': understanding_totals[i] / count,
+            'friendly_date': day_date.strftime('%A, %B %d, %Y')
         }
 
     today_key = datetime.now().strftime('%Y-%m-%d')
@@ -1137,11 +2919,18 @@ def process_checkin_data(checkins, cal_year, cal_month):
                 date_str = f"{cal_year:04d}-{cal_month:02d}-{day:02d}"
                 day_data['date_str'] = date_str
                 if date_str in month_checkins:
-                    day_data['data'] = { 'count': len(month_checkins[date_str]['checkins']), 'avg_morale': month_checkins[date_str]['avg_morale'], 'avg_understanding': month_checkins[date_str]['avg_understanding'] }
+                    day_data['data'] = { 'count': month_checkins[date_str]['count'], 'avg_morale': month_checkins[date_str]['avg_morale'], 'avg_understanding': month_checkins[date_str]['avg_understanding'] }
             week_data.append(day_data)
         calendar_data.append(week_data)
 
-    sorted_student_data = dict(sorted(student_summary.items()))
+    student_data = {name: {'checkins': table.rows(indices), 'total': len(indices), 'weeks': []} for name, indices in table.group_by_student().items()}
+    for i in range(len(weekly) - 1, -1, -1):
+        count = int(weekly.count[i])
+        data = student_data.setdefault(weekly.names[weekly.student[i]], {'checkins': table.rows(no_rows), 'total': 0, 'weeks': []})
+        data['total'] += count
+        data['weeks'].append({'week_of': from_epoch_seconds(int(weekly.period[i]) * SECONDS_PER_DAY).strftime('%Y-%m-%d'), 'count': count,
+                              'avg_morale': weekly.morale_sum[i] / count, 'avg_understanding': weekly.understanding_sum[i] / count})
+    sorted_student_data = dict(sorted(student_data.items()))
     return processed_daily_data, sorted_student_data, calendar_data, todays_summary_data
 
 @app.route('/day/<string:date_str>')
@@ -1151,31 +2940,54 @@ def day_detail_view(date_str):
     try: date_obj = datetime.strptime(date_str, '%Y-%m-%d')
     except ValueError: return "Invalid date format.", 404
 
-    all_checkins = load_data(DATA_FILE, [])
-    day_checkins = [c for c in all_checkins if 'timestamp' in c and c['timestamp'].startswith(date_str)]
-    
-    total_morale = sum(c['morale'] for c in day_checkins)
-    total_understanding = sum(c['understanding'] for c in day_checkins)
-    count = len(day_checkins)
-    avg_morale = total_morale / count if count > 0 else 0
-    avg_understanding = total_understanding / count if count > 0 else 0
+    view_files = (*checkin_store.files(), ARCHIVE_MANIFEST_FILE, ROLLUP_MANIFEST_FILE, *student_store.files(), *upload_store.files())
+    etag = view_etag(*view_files)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    table = load_checkin_table()
+    day_indices = table.prefix_indices(date_str)
+    day_checkins = table.rows(day_indices)
 
-    for checkin in day_checkins: checkin['time'] = datetime.fromisoformat(checkin['timestamp']).strftime('%I:%M:%S %p')
+    daily, _ = load_rollups()
+    day_number = date_to_day_number(date_obj)
+    rolled = daily.range_indices(day_number, day_number + 1)
+    rolled_up_count = int(daily.count[rolled].sum())
+    count = len(day_indices) + rolled_up_count
+    avg_morale = (int(table.morale[day_indices].sum()) + int(daily.morale_sum[rolled].sum())) / count if count > 0 else 0
+    avg_understanding = (int(table.understanding[day_indices].sum()) + int(daily.understanding_sum[rolled].sum())) / count if count > 0 else 0
 
-    all_uploads = load_data(CALENDAR_UPLOADS_FILE, {})
-    daily_files = all_uploads.get(date_str, [])
+    daily_files = upload_store.data().get(date_str, [])
 
-    return render_template_string(
+    return with_etag(render_template_string(
         DAY_DETAIL_TEMPLATE, 
         style=BASE_STYLE, 
         checkins=day_checkins, 
+        total_count=count,
+        rolled_up_count=rolled_up_count,
         date_str=date_str, 
         date_obj=date_obj, 
         avg_morale=avg_morale, 
         avg_understanding=avg_understanding,
         daily_files=daily_files,
         accepted_file_types=ACCEPTED_FILE_TYPES
-    )
+    ), etag, view_files)
+
+def apply_upload_record(uploads, record):
+    updated = dict(uploads)
+    if record['op'] == 'add':
+        updated[record['date']] = updated.get(record['date'], []) + [record['file']]
+    elif record['op'] == 'remove':
+        for date_str, day_files in uploads.items():
+            if any(f['id'] == record['id'] for f in day_files):
+                updated[date_str] = [f for f in day_files if f['id'] != record['id']]
+    else:
+        raise StoreCorruptError(f"Unknown upload log operation {record['op']!r}")
+    return updated
+
+upload_lock = ProcessLock('uploads')
+upload_store = JournaledStore('uploads', CALENDAR_UPLOADS_FILE, {}, apply_upload_record, upload_lock)
 
 @app.route('/upload_calendar_file/<string:date_str>', methods=['POST'])
 def upload_calendar_file(date_str):
@@ -1192,16 +3004,12 @@ def upload_calendar_file(date_str):
         file_id = str(uuid.uuid4())
         file.save(os.path.join(app.config['UPLOAD_FOLDER'], file_id))
         
-        all_uploads = load_data(CALENDAR_UPLOADS_FILE, {})
-        if date_str not in all_uploads:
-            all_uploads[date_str] = []
-            
-        all_uploads[date_str].append({
-            'id': file_id,
-            'filename': filename,
-            'upload_time': datetime.now().isoformat()
-        })
-        save_data(CALENDAR_UPLOADS_FILE, all_uploads)
+        with upload_lock:
+            upload_store.append('add', date=date_str, file={
+                'id': file_id,
+                'filename': filename,
+                'upload_time': datetime.now().isoformat()
+            })
 
     return redirect(url_for('day_detail_view', date_str=date_str))
 
@@ -1209,7 +3017,7 @@ def upload_calendar_file(date_str):
 def download_calendar_file(file_id):
     if not session.get('logged_in'): return redirect(url_for('login'))
     
-    all_uploads = load_data(CALENDAR_UPLOADS_FILE, {})
+    all_uploads = upload_store.data()
     original_filename = None
     for day_files in all_uploads.values():
         for file_info in day_files:
@@ -1228,19 +3036,16 @@ def download_calendar_file(file_id):
 def delete_calendar_file(file_id):
     if not session.get('logged_in'): return redirect(url_for('login'))
     
-    all_uploads = load_data(CALENDAR_UPLOADS_FILE, {})
     date_str_to_redirect = None
     
-    # Find which date this file belongs to so we can redirect back
-    for date_str, day_files in all_uploads.items():
-        file_to_remove = next((f for f in day_files if f['id'] == file_id), None)
-        if file_to_remove:
-            day_files.remove(file_to_remove)
-            all_uploads[date_str] = day_files
-            date_str_to_redirect = date_str
-            break
-
-    save_data(CALENDAR_UPLOADS_FILE, all_uploads)
+    with upload_lock:
+        # Find which date this file belongs to so we can redirect back
+        for date_str, day_files in upload_store.data().items():
+            if any(f['id'] == file_id for f in day_files):
+                date_str_to_redirect = date_str
+                break
+        if date_str_to_redirect:
+            upload_store.append('remove', id=file_id)
     
     try:
         os.remove(os.path.join(app.config['UPLOAD_FOLDER'], file_id))
@@ -1265,71 +3070,751 @@ def end_session():
     save_data(STATUS_FILE, {'is_open': False})
     return redirect(url_for('admin'))
 
-@app.route('/export/<string:source>/<string:format_type>')
-def export_data(source, format_type):
-    if not session.get('logged_in'): return redirect(url_for('login'))
-    
-    all_checkins = load_data(DATA_FILE, [])
-    
-    if source == 'all':
-        checkins_to_export = all_checkins
-        filename_source = 'all_data'
-    else: 
-        checkins_to_export = [c for c in all_checkins if 'timestamp' in c and c['timestamp'].startswith(source)]
-        filename_source = source.replace('-', '_')
-        
-    if not checkins_to_export:
-        return "No data to export for this period.", 404
-
-    df = pd.DataFrame(checkins_to_export)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df['Date'] = df['timestamp'].dt.strftime('%Y-%m-%d')
-    df['Time'] = df['timestamp'].dt.strftime('%I:%M:%S %p')
-    df_export = df[['name', 'Date', 'Time', 'morale', 'understanding']]
-    df_export.columns = ['Name', 'Date', 'Time', 'Morale', 'Understanding']
-    
-    output = BytesIO()
-    filename = f"checkin_export_{filename_source}.{format_type}"
-
+# --- Spreadsheet Exports ---
+# Rendered exports are cached in EXPORT_CACHE_FOLDER under a checksum of the rows they contain, so
+# a period whose check-ins have not changed is served straight from disk. All three writers consume
+# rows from an iterator and write them out one at a time, so memory stays flat however large the export.
+EXPORT_MIMETYPES = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+    'ods': 'application/vnd.oasis.opendocument.spreadsheet',
+}
+EXPORT_CHUNK_ROWS = 10000
+
+ODS_MANIFEST = """<?xml version="1.0" encoding="UTF-8"?>
+<manifest:manifest xmlns:manifest="urn:oasis:names:tc:opendocument:xmlns:manifest:1.0" manifest:version="1.2">
+ <manifest:file-entry manifest:full-path="/" manifest:version="1.2" manifest:media-type="application/vnd.oasis.opendocument.spreadsheet"/>
+ <manifest:file-entry manifest:full-path="content.xml" manifest:media-type="text/xml"/>
+</manifest:manifest>"""
+ODS_CONTENT_HEAD = ('<?xml version="1.0" encoding="UTF-8"?>'
+                    '<office:document-content xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+                    'xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0" '
+                    'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" office:version="1.2">'
+                    '<office:body><office:spreadsheet><table:table table:name="{sheet_name}">')
+ODS_CONTENT_TAIL = '</table:table></office:spreadsheet></office:body></office:document-content>'
+
+def _ods_cell(value):
+    if value is None or value == '':
+        return '<table:table-cell/>'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<table:table-cell office:value-type="float" office:value="{value}"><text:p>{value}</text:p></table:table-cell>'
+    text = deferred_import('xml.sax.saxutils').escape(str(value))
+    return f'<table:table-cell office:value-type="string"><text:p>{text}</text:p></table:table-cell>'
+
+def write_ods(header, rows, sheet_name, output):
+    """Streams an OpenDocument spreadsheet: the zip's content.xml is written a batch of rows at a time."""
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        # The mimetype entry must come first and be stored uncompressed.
+        archive.writestr(zipfile.ZipInfo('mimetype'), EXPORT_MIMETYPES['ods'], compress_type=zipfile.ZIP_STORED)
+        archive.writestr('META-INF/manifest.xml', ODS_MANIFEST)
+        with archive.open('content.xml', 'w') as content:
+            content.write(ODS_CONTENT_HEAD.format(sheet_name=deferred_import('xml.sax.saxutils').escape(sheet_name, {'"': '&quot;'})).encode('utf-8'))
+            batch = []
+            for row in chain([header], rows):
+                batch.append('<table:table-row>' + ''.join(_ods_cell(v) for v in row) + '</table:table-row>')
+                if len(batch) >= 1000:
+                    content.write(''.join(batch).encode('utf-8'))
+                    batch = []
+            content.write((''.join(batch) + ODS_CONTENT_TAIL).encode('utf-8'))
+
+def write_export(header, rows, format_type, sheet_name, output):
     if format_type == 'xlsx':
-        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        df_export.to_excel(output, index=False, sheet_name='Checkins')
+        workbook = deferred_import('openpyxl').Workbook(write_only=True)
+        sheet = workbook.create_sheet(sheet_name)
+        sheet.append(header)
+        for row in rows:
+            sheet.append(row)
+        workbook.save(output)
     elif format_type == 'csv':
-        mimetype = 'text/csv'
-        df_export.to_csv(output, index=False)
+        text = io.TextIOWrapper(output, encoding='utf-8', newline='')
+        writer = csv.writer(text, lineterminator='\n')
+        writer.writerow(header)
+        writer.writerows(rows)
+        text.flush()
+        text.detach()
     elif format_type == 'ods':
-        mimetype = 'application/vnd.oasis.opendocument.spreadsheet'
-        with pd.ExcelWriter(output, engine='odf') as writer:
-            df_export.to_excel(writer, index=False, sheet_name='Checkins')
+        write_ods(header, rows, sheet_name, output)
+
+def cached_export(kind, source, format_type, version, build_rows, sheet_name):
+    """Returns the path of the rendered export for this data version, rendering it on a cache miss."""
+    # Keyed on a hash of the source: different names (e.g. any two non-ASCII ones) can sanitize to the same string.
+    source_key = hashlib.blake2b(source.encode('utf-8'), digest_size=8).hexdigest()
+    prefix = f"{kind}__{source_key}__{format_type}__"
+    filename = f"{prefix}{version}.{format_type}"
+    path = os.path.abspath(os.path.join(EXPORT_CACHE_FOLDER, filename))
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(EXPORT_CACHE_FOLDER, exist_ok=True)
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, 'wb') as f:
+        header, rows = build_rows()
+        write_export(header, rows, format_type, sheet_name, f)
+    os.replace(temp_path, path)
+
+    # Older renders of the same export can never be served again.
+    for entry in os.listdir(EXPORT_CACHE_FOLDER):
+        if entry.startswith(prefix) and entry != filename and not entry.endswith('.tmp'):
+            try: os.remove(os.path.join(EXPORT_CACHE_FOLDER, entry))
+            except OSError: pass
+    return path
+
+def checkin_data_version(table, indices, daily=None, rolled=()):
+    digest = hashlib.blake2b(digest_size=12)
+    for column in (table.student, table.ts, table.morale, table.understanding, table.us):
+        digest.update(np.ascontiguousarray(column[indices]).tobytes())
+    students = table.student[indices]
+    if len(rolled):
+        for column in daily.columns():
+            digest.update(np.ascontiguousarray(column[rolled]).tobytes())
+        students = np.concatenate([students, daily.student[rolled]])
+    digest.update(json.dumps([table.names[i] for i in np.unique(students)]).encode('utf-8'))
+    return digest.hexdigest()
+
+def checkin_export_rows(table, indices, daily=None, rolled=()):
+    names = table.names
+    # Days past the retention cutoff only have daily totals: one row per student and day, with average scores.
+    if len(rolled):
+        for sid, period, count, morale_sum, understanding_sum in zip(*(column[rolled].tolist() for column in daily.columns())):
+            yield (names[sid], from_epoch_seconds(period * SECONDS_PER_DAY).strftime('%Y-%m-%d'), f"Daily total of {count} check-in(s)",
+                   round(morale_sum / count, 2), round(understanding_sum / count, 2))
+    for start in range(0, len(indices), EXPORT_CHUNK_ROWS):
+        chunk = indices[start:start + EXPORT_CHUNK_ROWS]
+        for sid, ts, morale, understanding in zip(table.student[chunk].tolist(), table.ts[chunk].tolist(),
+                                                  table.morale[chunk].tolist(), table.understanding[chunk].tolist()):
+            dt_obj = from_epoch_seconds(ts)
+            yield (names[sid], dt_obj.strftime('%Y-%m-%d'), dt_obj.strftime('%I:%M:%S %p'), morale, understanding)
+
+CHECKIN_EXPORT_HEADER = ['Name', 'Date', 'Time', 'Morale', 'Understanding']
+
+def render_export(kind, source, format_type):
+    """Renders one export, or fetches it from the cache. `kind` is 'checkins' (source is 'all' or a date
+    prefix), 'student' (source is a student name) or 'alerts'. Returns (path, download name), or None when empty."""
+    if kind == 'alerts':
+        if not get_open_alerts() and not os.path.exists(RESOLVED_ALERTS_FILE):
+            return None
+        # The alert log and the resolved file only change when an alert is raised or resolved.
+        version = hashlib.blake2b(repr((alert_store.version(), file_signature(RESOLVED_ALERTS_FILE))).encode(), digest_size=12).hexdigest()
+        return cached_export('alerts', 'all', format_type, version, alert_export_rows, 'Alerts'), f"student_alerts_export.{format_type}"
+
+    table = load_checkin_table()
+    daily, _ = load_rollups()
+    if kind == 'student':
+        indices = table.student_indices(source)
+        sid = table.name_ids.get(source)
+        rolled = np.flatnonzero(daily.student == sid) if sid is not None else np.zeros(0, dtype=np.int64)
+        filename_source = '_'.join(filter(None, (str(table.name_ids.get(source, '')), secure_filename(source))))
+    elif source == 'all':
+        indices, rolled = np.arange(len(table)), np.arange(len(daily))
+        filename_source = 'all_data'
     else:
+        indices = table.prefix_indices(source)
+        bounds = prefix_range(source)
+        rolled = daily.range_indices(bounds[0] // SECONDS_PER_DAY, bounds[1] // SECONDS_PER_DAY) if bounds else np.zeros(0, dtype=np.int64)
+        filename_source = source.replace('-', '_')
+    if len(indices) == 0 and len(rolled) == 0:
+        return None
+
+    path = cached_export(kind, source, format_type, checkin_data_version(table, indices, daily, rolled),
+                         lambda: (CHECKIN_EXPORT_HEADER, checkin_export_rows(table, indices, daily, rolled)), 'Checkins')
+    return path, f"checkin_export_{filename_source}.{format_type}"
+
+@app.route('/export/<string:source>/<string:format_type>')
+def export_data(source, format_type):
+    if not session.get('logged_in'): return redirect(url_for('login'))
+    if format_type not in EXPORT_MIMETYPES:
         return "Invalid format type", 400
-        
-    output.seek(0)
-    
-    return send_file(output, as_attachment=True, download_name=filename, mimetype=mimetype)
 
+    rendered = render_export('checkins', source, format_type)
+    if rendered is None:
+        return "No data to export for this period.", 404
+
+    path, filename = rendered
+    return send_export(path, filename, format_type)
+
+
+# --- Check-in Ingestion ---
+# Check-ins may carry a client-generated 'client_id'. A resubmitted id is acknowledged as a duplicate
+# instead of being stored twice, so the student page can safely retry and replay its offline queue.
+CHECKIN_BATCH_MAX = 100
+CHECKIN_CLIENT_TIME_MAX_AGE = timedelta(hours=12)
+CHECKIN_CLIENT_TIME_MAX_SKEW = timedelta(minutes=2)
+
+checkin_id_index = {'checkins': None, 'scanned': 0, 'ids': set()}
+
+def known_client_ids():
+    """Client ids of live check-ins, indexed incrementally as the store's list grows. Caller holds checkin_lock."""
+    checkins = checkin_store.data()
+    if checkin_id_index['checkins'] is not checkins or checkin_id_index['scanned'] > len(checkins):
+        checkin_id_index.update(checkins=checkins, scanned=0, ids=set())
+    ids = checkin_id_index['ids']
+    for entry in checkins[checkin_id_index['scanned']:]:
+        if 'client_id' in entry:
+            ids.add(entry['client_id'])
+    checkin_id_index['scanned'] = len(checkins)
+    return ids
+
+def parse_checkin(data, received):
+    """Validates one submitted check-in. Returns (entry, error)."""
+    if not isinstance(data, dict) or not isinstance(data.get('name'), str) or not data['name'].strip():
+        return None, 'Invalid data'
+    if any(isinstance(data.get(key), bool) for key in ('morale', 'understanding')):
+        return None, 'Invalid data'  # int(True) would otherwise be stored as a score of 1.
+    try:
+        morale, understanding = int(data.get('morale')), int(data.get('understanding'))
+    except (TypeError, ValueError, OverflowError):
+        return None, 'Invalid data'
+    if not (1 <= morale <= 10 and 1 <= understanding <= 10):
+        return None, 'Scores must be between 1 and 10.'
+    entry = {'name': normalize_student_name(data['name']), 'morale': morale, 'understanding': understanding, 'timestamp': received.isoformat()}
+    client_id = data.get('client_id')
+    if client_id is not None:
+        if not isinstance(client_id, str) or not 0 < len(client_id) <= 64:
+            return None, 'Invalid client_id'
+        entry['client_id'] = client_id
+    # Queued check-ins keep the time they were made, within limits, rather than the time they arrived.
+    submitted_at = data.get('submitted_at')
+    if isinstance(submitted_at, (int, float)) and not isinstance(submitted_at, bool):
+        try:
+            submitted = datetime.fromtimestamp(submitted_at / 1000)
+        except (ValueError, OverflowError, OSError):  # NaN, or far outside the platform's time range
+            return None, 'Invalid submitted_at'
+        if received - CHECKIN_CLIENT_TIME_MAX_AGE <= submitted <= received + CHECKIN_CLIENT_TIME_MAX_SKEW:
+            entry['timestamp'] = min(submitted, received).isoformat()
+    return entry, None
+
+def ingest_checkins(items):
+    """Stores valid, not yet seen check-ins with one log write, then runs one alert pass. Returns a result per item."""
+    received = datetime.now()
+    results, accepted = [], []
+    with checkin_lock:
+        seen = known_client_ids()
+        batch_ids = set()
+        for item in items:
+            entry, error = parse_checkin(item, received)
+            client_id = item.get('client_id') if isinstance(item, dict) else None
+            if error:
+                results.append({'client_id': client_id, 'status': 'rejected', 'error': error})
+            elif client_id is not None and (client_id in seen or client_id in batch_ids):
+                results.append({'client_id': client_id, 'status': 'duplicate'})
+            else:
+                if client_id is not None:
+                    batch_ids.add(client_id)
+                accepted.append(entry)
+                results.append({'client_id': client_id, 'status': 'saved'})
+        if accepted:
+            ids = register_students(entry['name'] for entry in accepted)
+            for entry in accepted:
+                entry['student_id'] = ids[entry['name']]
+            checkin_store.append('append_batch', entries=accepted)
+            for entry in accepted:
+                publish_checkin(entry)
+    if accepted:
+        # The check-ins are already saved; a failing alert pass must not make the client retry them.
+        try:
+            run_alert_pass(accepted)
+        except Exception as e:
+            print(f"Alert pass failed for {len(accepted)} check-in(s): {e}")
+    return results
+
+def checkins_closed():
+    return not load_data(STATUS_FILE, {'is_open': False}).get('is_open')
 
 @app.route('/api/checkin', methods=['POST'])
 def handle_checkin():
-    status = load_data(STATUS_FILE, {'is_open': False})
-    if not status.get('is_open'): return jsonify({'success': False, 'error': 'Check-in is currently closed.'}), 403
+    if checkins_closed(): return jsonify({'success': False, 'error': 'Check-in is currently closed.'}), 403
 
     data = request.json
     if not data or 'name' not in data or 'morale' not in data or 'understanding' not in data: return jsonify({'success': False, 'error': 'Invalid data'}), 400
-        
-    all_checkins = load_data(DATA_FILE, [])
-    new_entry = { 'name': data['name'].strip().title(), 'morale': data['morale'], 'understanding': data['understanding'], 'timestamp': datetime.now().isoformat() }
-    all_checkins.append(new_entry)
-    save_data(DATA_FILE, all_checkins)
-    check_for_alerts(new_entry)
-    return jsonify({'success': True})
+    result = ingest_checkins([data])[0]
+    if result['status'] == 'rejected':
+        return jsonify({'success': False, 'error': result['error']}), 400
+    return jsonify({'success': True, 'duplicate': result['status'] == 'duplicate'})
+
+@app.route('/api/checkin/batch', methods=['POST'])
+def handle_checkin_batch():
+    """Accepts {"checkins": [...]} and answers with one {client_id, status[, error]} per item, in order."""
+    if checkins_closed(): return jsonify({'success': False, 'error': 'Check-in is currently closed.'}), 403
+
+    data = request.get_json(silent=True) or {}
+    items = data.get('checkins')
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'error': 'Expected a non-empty "checkins" list.'}), 400
+    if len(items) > CHECKIN_BATCH_MAX:
+        return jsonify({'success': False, 'error': f'At most {CHECKIN_BATCH_MAX} check-ins per batch.'}), 413
+    return jsonify({'success': True, 'results': ingest_checkins(items)})
+
+# --- Bulk Check-in Import ---
+# Historical check-ins are read from an uploaded CSV or XLSX one row at a time and written to the
+# check-in log in chunks of IMPORT_CHUNK_ROWS, one append_batch record per chunk. Rows already stored
+# (same student and timestamp) are skipped, so re-running an import is harmless. No alerts are raised
+# for imported history; trend scores are rebuilt once at the end instead of being updated per row.
+IMPORT_CHUNK_ROWS = 5000
+IMPORT_ERROR_REPORT_LIMIT = 200
+IMPORT_COLUMN_ALIASES = {
+    'name': ('name', 'student', 'student name'),
+    'morale': ('morale',),
+    'understanding': ('understanding',),
+    'timestamp': ('timestamp', 'datetime', 'date time', 'checked in'),
+    'date': ('date', 'day'),
+    'time': ('time',),
+}
+IMPORT_DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%d.%m.%Y')
+IMPORT_TIME_FORMATS = ('%I:%M:%S %p', '%I:%M %p', '%H:%M:%S', '%H:%M')
+# Raised while reading a damaged .xlsx or a CSV that is not UTF-8 (e.g. saved by Excel as cp1252).
+# SyntaxError covers ElementTree.ParseError without importing the XML parser at startup.
+IMPORT_READ_ERRORS = (UnicodeDecodeError, csv.Error, zipfile.BadZipFile, KeyError, SyntaxError, OSError)
+
+def iter_import_rows(file, filename):
+    """Yields the rows of an uploaded .csv or .xlsx file as tuples of cell values, header row first."""
+    if filename.lower().endswith('.xlsx'):
+        workbook = deferred_import('openpyxl').load_workbook(file, read_only=True, data_only=True)
+        try:
+            yield from workbook.worksheets[0].iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    else:
+        yield from csv.reader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+
+def import_columns(header):
+    """Maps each known field to its column index. Raises ValueError when required columns are missing."""
+    labels = [str(cell).strip().lower() if cell is not None else '' for cell in header]
+    columns = {}
+    for field, aliases in IMPORT_COLUMN_ALIASES.items():
+        index = next((i for i, label in enumerate(labels) if label in aliases), None)
+        if index is not None:
+            columns[field] = index
+    missing = [field for field in ('name', 'morale', 'understanding') if field not in columns]
+    if 'timestamp' not in columns and 'date' not in columns:
+        missing.append('timestamp or date')
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}.")
+    return columns
+
+def _parse_import_time(date_value, time_value):
+    if isinstance(date_value, datetime):
+        moment = date_value
+    else:
+        text = str(date_value).strip()
+        try:
+            moment = datetime.fromisoformat(text.replace('Z', ''))
+        except ValueError:
+            for fmt in IMPORT_DATE_FORMATS:
+                try:
+                    moment = datetime.strptime(text, fmt)
+                    break
+                except ValueError:
+                    continue
+            else:
+                raise ValueError(f"Unrecognised date '{text}'.")
+    if time_value not in (None, ''):
+        if hasattr(time_value, 'hour'):
+            clock = time_value
+        else:
+            for fmt in IMPORT_TIME_FORMATS:
+                try:
+                    clock = datetime.strptime(str(time_value).strip(), fmt)
+                    break
+                except ValueError:
+                    continue
+            else:
+                raise ValueError(f"Unrecognised time '{time_value}'.")
+        moment = moment.replace(hour=clock.hour, minute=clock.minute, second=clock.second)
+    return moment.replace(microsecond=0, tzinfo=None)
+
+def parse_import_row(row, columns, now):
+    """Validates and normalizes one spreadsheet row. Returns (entry, error)."""
+    def cell(field):
+        index = columns.get(field)
+        return row[index] if index is not None and index < len(row) else None
+    name = cell('name')
+    if name is None or not str(name).strip():
+        return None, 'Missing student name.'
+    scores = {}
+    for field in ('morale', 'understanding'):
+        value = cell(field)
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return None, f"{field.title()} '{value}' is not a number."
+        if not math.isfinite(number):
+            return None, f"{field.title()} '{value}' is not a number."
+        if number != int(number) or not 1 <= number <= 10:
+            return None, f"{field.title()} {value} must be a whole number from 1 to 10."
+        scores[field] = int(number)
+    date_value = cell('timestamp') if 'timestamp' in columns else cell('date')
+    if date_value in (None, ''):
+        return None, 'Missing date.'
+    try:
+        moment = _parse_import_time(date_value, cell('time') if 'timestamp' not in columns else None)
+    except ValueError as e:
+        return None, str(e)
+    if moment > now:
+        return None, f"Date {moment.isoformat()} is in the future."
+    return {'name': normalize_student_name(str(name)), 'morale': scores['morale'], 'understanding': scores['understanding'],
+            'timestamp': moment.isoformat()}, None
+
+def import_checkins(file, filename, dry_run=True):
+    """Streams an uploaded spreadsheet into the check-in log. Returns a summary with a row error report."""
+    rows = iter_import_rows(file, filename)
+    try:
+        columns = import_columns(next(rows, None) or [])
+    except ValueError as e:
+        return {'error': str(e)}
+    except IMPORT_READ_ERRORS as e:
+        return {'error': f"The file could not be read as a {'.xlsx workbook' if filename.lower().endswith('.xlsx') else 'UTF-8 .csv file'} ({e})."}
+    live = {'checked': len(checkin_store.data())}  # Live records write_chunk has already checked against.
+    table = load_checkin_table()
+    # (student id, epoch seconds) of every stored check-in, so repeated imports skip rows already present.
+    existing = set(zip(table.student.tolist(), table.ts.tolist()))
+    # Rows already rolled up by the retention policy are only in cold storage.
+    existing.update((root_student_id(c['student_id']), to_epoch_seconds(c['timestamp'])) for c in iter_cold_checkins())
+    now = datetime.now()
+    summary = {'dry_run': dry_run, 'rows': 0, 'imported': 0, 'duplicates': 0, 'errors': 0, 'error_report': [],
+               'students': set(), 'first_date': None, 'last_date': None}
+    chunk = []
+
+    def write_chunk():
+        if not chunk or dry_run:
+            summary['imported'] += len(chunk)
+            chunk.clear()
+            return
+        ids = register_students(entry['name'] for entry in chunk)
+        with checkin_lock:
+            # Check-ins saved since the import started (live ones, or another import) are checked under the lock too.
+            records = checkin_store.data()
+            saved_since = {(root_student_id(c['student_id']) if 'student_id' in c else student_id_for(c['name']), to_epoch_seconds(c['timestamp']))
+                           for c in records[live['checked'] if live['checked'] <= len(records) else 0:] if 'timestamp' in c}
+            fresh = []
+            for entry in chunk:
+                entry['student_id'] = ids[entry['name']]
+                key = (entry['student_id'], to_epoch_seconds(entry['timestamp']))
+                # Later rows for this student are keyed by id now that the name is registered.
+                existing.add(key)
+                if key in saved_since:
+                    summary['duplicates'] += 1
+                else:
+                    fresh.append(entry)
+            if fresh:
+                checkin_store.append('append_batch', entries=fresh)
+            live['checked'] = len(checkin_store.data())
+        summary['imported'] += len(fresh)
+        chunk.clear()
+
+    row_number = 1
+    try:
+        for row_number, row in enumerate(rows, start=2):
+            if not row or all(value in (None, '') for value in row):
+                continue
+            summary['rows'] += 1
+            entry, error = parse_import_row(row, columns, now)
+            if error:
+                summary['errors'] += 1
+                if len(summary['error_report']) < IMPORT_ERROR_REPORT_LIMIT:
+                    summary['error_report'].append({'row': row_number, 'error': error})
+                continue
+            # Names not registered yet cannot match a stored check-in, so they are keyed by name until written.
+            key = (student_id_for(entry['name']) or entry['name'], to_epoch_seconds(entry['timestamp']))
+            if key in existing:
+                summary['duplicates'] += 1
+                continue
+            existing.add(key)
+            chunk.append(entry)
+            summary['students'].add(entry['name'])
+            day = entry['timestamp'][:10]
+            summary['first_date'] = min(summary['first_date'] or day, day)
+            summary['last_date'] = max(summary['last_date'] or day, day)
+            if len(chunk) >= IMPORT_CHUNK_ROWS:
+                write_chunk()
+    except IMPORT_READ_ERRORS as e:
+        # CSV text is decoded in blocks, so the damaged byte is at or shortly after this row.
+        summary['error'] = f"The file could not be read at or after row {row_number + 1}: {e}. Rows before it were {'checked' if dry_run else 'imported'}."
+    write_chunk()
+
+    if summary['imported'] and not dry_run:
+        with checkin_lock:
+            checkin_store.snapshot()  # So the next start does not replay the imported chunks.
+        load_checkin_table()
+        rebuild_trend_scores()
+    summary['students'] = len(summary['students'])
+    return summary
+
+@app.route('/api/import/checkins', methods=['POST'])
+def import_checkins_api():
+    """Imports historical check-ins from a CSV/XLSX upload. dry_run defaults to true and only validates."""
+    if not session.get('logged_in'): return jsonify({'error': 'Unauthorized'}), 401
+    if session.get('user_role') != 'super_admin':
+        return jsonify({'error': 'Only the super admin can import check-ins.'}), 403
+    file = request.files.get('file')
+    if not file or not file.filename.lower().endswith(('.csv', '.xlsx')):
+        return jsonify({'error': 'Upload a .csv or .xlsx file.'}), 400
+    dry_run = request.form.get('dry_run', 'true').lower() not in ('false', '0', 'no')
+    summary = import_checkins(file.stream, file.filename, dry_run)
+    if 'error' in summary:
+        return jsonify(summary), 400
+    print(f"Check-in import of {file.filename} by {session.get('user_email')}: {summary['imported']} row(s) "
+          f"{'would be imported' if dry_run else 'imported'}, {summary['duplicates']} duplicate(s), {summary['errors']} error(s).")
+    return jsonify(summary)
 
 @app.route('/api/today')
 def get_todays_checkins():
-    all_checkins = load_data(DATA_FILE, [])
+    view_files = (*checkin_store.files(), ARCHIVE_MANIFEST_FILE, *student_store.files())
+    etag = view_etag(*view_files)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    table = load_checkin_table()
     today_str = datetime.now().strftime('%Y-%m-%d')
-    todays_entries = [c for c in all_checkins if 'timestamp' in c and c['timestamp'].startswith(today_str)]
-    return jsonify(todays_entries)
+    todays_entries = [row.to_dict() for row in table.rows(table.prefix_indices(today_str))]
+    return with_etag(jsonify(todays_entries), etag, view_files)
+
+# --- Student Registry API ---
+def registry_change_error():
+    if not session.get('logged_in'): return jsonify({'error': 'Unauthorized'}), 401
+    if session.get('user_role') != 'super_admin':
+        return jsonify({'error': 'Only the super admin can change the student registry.'}), 403
+    return None
+
+def surviving_student(student_id):
+    """The registry entry for an id that has not been merged away, or None."""
+    student = student_store.data()['students'].get(str(student_id))
+    return student if student and not student.get('merged_into') else None
+
+@app.route('/api/students')
+def list_students():
+    if not session.get('logged_in'): return jsonify({'error': 'Unauthorized'}), 401
+    registry = student_registry()
+    groups = load_checkin_table().student_groups()
+    aliases = defaultdict(list)
+    for alias, sid in registry['aliases'].items():
+        if alias != registry['names'][sid]:
+            aliases[sid].append(alias)
+    students = [{'id': sid, 'name': registry['names'][sid], 'aliases': sorted(aliases[sid]),
+                 'checkins': len(groups.get(sid, ()))}
+                for sid, root in sorted(registry['roots'].items()) if sid == root]
+    return jsonify(sorted(students, key=lambda s: s['name']))
+
+@app.route('/api/students/<int:student_id>/aliases', methods=['POST'])
+def add_student_alias(student_id):
+    """Records another spelling of a student's name, so future check-ins under it land on the same student."""
+    denied = registry_change_error()
+    if denied: return denied
+    alias = normalize_student_name((request.get_json() or {}).get('alias') or '')
+    if not alias:
+        return jsonify({'error': 'Alias is required.'}), 400
+    with student_lock:
+        if not surviving_student(student_id):
+            return jsonify({'error': 'Student not found.'}), 404
+        owner = student_id_for(alias)
+        if owner is not None and owner != student_id:
+            return jsonify({'error': f"'{alias}' already belongs to {student_name(owner)}. Merge the students instead."}), 409
+        if owner is None:
+            student_store.append('alias', alias=alias, id=student_id)
+    return jsonify({'id': student_id, 'alias': alias})
+
+@app.route('/api/students/<int:student_id>/rename', methods=['POST'])
+def rename_student(student_id):
+    """Changes a student's display name. The old name stays as an alias."""
+    denied = registry_change_error()
+    if denied: return denied
+    name = normalize_student_name((request.get_json() or {}).get('name') or '')
+    if not name:
+        return jsonify({'error': 'Name is required.'}), 400
+    with student_lock:
+        if not surviving_student(student_id):
+            return jsonify({'error': 'Student not found.'}), 404
+        owner = student_id_for(name)
+        if owner is not None and owner != student_id:
+            return jsonify({'error': f"'{name}' already belongs to another student. Merge the students instead."}), 409
+        student_store.append('rename', id=student_id, name=name)
+    rebuild_trend_scores()
+    return jsonify({'id': student_id, 'name': name})
+
+@app.route('/api/students/merge', methods=['POST'])
+def merge_students():
+    """Folds a duplicate student (e.g. a typo'd name) into another. Its check-ins, alerts and aliases follow."""
+    denied = registry_change_error()
+    if denied: return denied
+    data = request.get_json() or {}
+    try:
+        from_id, into_id = int(data.get('from_id')), int(data.get('into_id'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'from_id and into_id must be student ids.'}), 400
+    if from_id == into_id:
+        return jsonify({'error': 'A student cannot be merged into themselves.'}), 400
+    with student_lock:
+        if not surviving_student(from_id) or not surviving_student(into_id):
+            return jsonify({'error': 'Both students must exist and not already be merged.'}), 409
+        student_store.append('merge', from_id=from_id, into_id=into_id)
+    rebuild_trend_scores()
+    print(f"Merged student {from_id} into {into_id} ({student_name(into_id)}) by {session.get('user_email')}.")
+    return jsonify({'id': into_id, 'name': student_name(into_id)})
+
+# --- Live Updates ---
+# Check-ins are pushed to open pages over Server-Sent Events. The student page gets names only (the same
+# data as /api/today); the dashboard gets scores and today's running averages. Each connected client has
+# a bounded queue; a client that stops reading is dropped rather than holding up check-ins.
+# Under `serve`, each open stream occupies a worker thread. Streams therefore end after
+# LIVE_STREAM_MAX_SECONDS (EventSource reconnects and the page refreshes its data), and each process
+# serves at most serve_state['stream_slots'] at once, keeping the rest of its threads for ordinary
+# requests. A client arriving while every slot is taken is told to retry after LIVE_BUSY_RETRY_MS.
+LIVE_QUEUE_SIZE = 100
+LIVE_KEEPALIVE_SECONDS = 15
+LIVE_STREAM_MAX_SECONDS = int(os.getenv('LIVE_STREAM_MAX_SECONDS', 300))
+LIVE_BUSY_RETRY_MS = 30000
+
+live_streams_lock = threading.Lock()
+live_streams = {'open': 0}
+
+def acquire_stream_slot():
+    with live_streams_lock:
+        if serve_state['stream_slots'] and live_streams['open'] >= serve_state['stream_slots']:
+            return False
+        live_streams['open'] += 1
+        return True
+
+def release_stream_slot():
+    with live_streams_lock:
+        live_streams['open'] -= 1
+
+class LiveBroadcaster:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+
+    def subscribe(self):
+        start_live_relay()
+        subscriber = queue.Queue(maxsize=LIVE_QUEUE_SIZE)
+        subscriber.dropped = False
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def publish(self, event, data):
+        message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        with self.lock:
+            for subscriber in list(self.subscribers):
+                try:
+                    subscriber.put_nowait(message)
+                except queue.Full:
+                    # Its stream ends at the next read, so EventSource reconnects and the page reloads what it missed.
+                    subscriber.dropped = True
+                    self.subscribers.discard(subscriber)
+
+    def stream(self):
+        def generate():
+            # Slots are taken inside the generator: a response closed before it is iterated never ran its finally.
+            if not acquire_stream_slot():
+                yield f"retry: {LIVE_BUSY_RETRY_MS}\n\n"
+                return
+            subscriber = self.subscribe()
+            deadline = time.monotonic() + LIVE_STREAM_MAX_SECONDS
+            try:
+                yield "retry: 3000\n\n"
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return
+                    try:
+                        message = subscriber.get(timeout=min(LIVE_KEEPALIVE_SECONDS, remaining))
+                    except queue.Empty:
+                        message = ": keep-alive\n\n"
+                    if subscriber.dropped:
+                        return
+                    yield message
+            finally:
+                self.unsubscribe(subscriber)
+                release_stream_slot()
+        return Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+roster_broadcaster = LiveBroadcaster()
+dashboard_broadcaster = LiveBroadcaster()
+
+# With several worker processes, a check-in handled by one process is also appended to a per-day event
+# log that a relay thread in every other process tails, so all connected clients see it.
+LIVE_EVENTS_FOLDER = 'live_events'
+LIVE_RELAY_POLL_SECONDS = 0.5
+live_relay_lock = threading.Lock()
+live_relay_started = False
+
+def live_events_path(date_str):
+    return os.path.join(LIVE_EVENTS_FOLDER, f"{date_str}.jsonl")
+
+def _broadcast_live(events):
+    roster_broadcaster.publish('checkin', events['roster'])
+    dashboard_broadcaster.publish('checkin', events['dashboard'])
+
+def publish_checkin(entry):
+    """Pushes a saved check-in to live clients. Called under checkin_lock, so events go out in save order."""
+    timestamp = entry['timestamp'][:19]
+    date_str = timestamp[:10]
+    table = load_checkin_table()
+    indices = table.prefix_indices(date_str)
+    count = len(indices)
+    name = student_name(entry.get('student_id')) or entry['name']
+    events = {
+        'roster': {'name': name, 'timestamp': timestamp},
+        'dashboard': {
+            'checkin': {'name': name, 'morale': int(entry['morale']), 'understanding': int(entry['understanding']),
+                        'timestamp': timestamp, 'time': datetime.fromisoformat(timestamp).strftime('%I:%M:%S %p')},
+            'date': date_str, 'count': count,
+            'avg_morale': float(table.morale[indices].mean()), 'avg_understanding': float(table.understanding[indices].mean())
+        }
+    }
+    _broadcast_live(events)
+    if serve_state['workers'] > 1:
+        os.makedirs(LIVE_EVENTS_FOLDER, exist_ok=True)
+        with open(live_events_path(date_str), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(dict(events, origin=os.getpid())) + '\n')
+
+def _relay_live_events():
+    date_str, offset = None, 0
+    while True:
+        today = datetime.now().strftime('%Y-%m-%d')
+        if today != date_str:
+            path = live_events_path(today)
+            # Start at the end of today's log on first run; a new day's log is read from the top.
+            offset = os.path.getsize(path) if date_str is None and os.path.exists(path) else 0
+            date_str = today
+            for old_log in os.listdir(LIVE_EVENTS_FOLDER):
+                if old_log < f"{today}.jsonl":
+                    try: os.remove(os.path.join(LIVE_EVENTS_FOLDER, old_log))
+                    except OSError: pass
+        path = live_events_path(date_str)
+        if os.path.exists(path) and os.path.getsize(path) > offset:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # Partially written; read it on the next pass.
+                    offset += len(line)
+                    events = json.loads(line)
+                    if events.pop('origin') != os.getpid():
+                        _broadcast_live(events)
+        time.sleep(LIVE_RELAY_POLL_SECONDS)
+
+def start_live_relay():
+    global live_relay_started
+    with live_relay_lock:
+        if live_relay_started or serve_state['workers'] <= 1:
+            return
+        live_relay_started = True
+        os.makedirs(LIVE_EVENTS_FOLDER, exist_ok=True)
+        threading.Thread(target=_relay_live_events, daemon=True).start()
+
+@app.route('/api/stream/roster')
+def stream_roster():
+    return roster_broadcaster.stream()
+
+@app.route('/api/stream/dashboard')
+def stream_dashboard():
+    if not session.get('logged_in'): return jsonify({'error': 'Unauthorized'}), 401
+    return dashboard_broadcaster.stream()
 
 @app.route('/add_staff', methods=['POST'])
 def add_staff():
@@ -1364,6 +3849,190 @@ def remove_staff():
     save_data(USERS_FILE, updated_users)
     return redirect(url_for('admin', tab='staff'))
 
+# --- Alert Store ---
+# alert_store holds only open alerts and is indexed in memory by id and by student. Resolved
+# alerts are appended, one JSON object per line, to RESOLVED_ALERTS_FILE and only read back for
+# the resolved history and exports.
+RESOLVED_ALERTS_PAGE_SIZE = 25
+
+alert_index = {'signature': None, 'by_id': {}, 'by_student': {}}
+
+def alert_student_name(alert):
+    """The name stored on an alert. Only alerts from before the 'student' field existed need their title parsed."""
+    if alert.get('student'):
+        return alert['student']
+    match = re.search(r' for (.+)$', alert.get('title', ''))
+    return match.group(1) if match else None
+
+def alert_student_id(alert):
+    if alert.get('student_id') is not None:
+        return root_student_id(alert['student_id'])
+    return student_id_for(alert_student_name(alert))
+
+def alert_student(alert):
+    """The current name of the student an alert belongs to, following aliases and merges."""
+    return student_name(alert_student_id(alert)) or alert_student_name(alert)
+
+def _archive_resolved(resolved):
+    with open(RESOLVED_ALERTS_FILE, 'a', encoding='utf-8') as f:
+        for alert in resolved:
+            f.write(json.dumps(alert) + '\n')
+
+def migrate_legacy_alerts(alerts):
+    resolved = [a for a in alerts if a.get('status') == 'resolved']
+    if resolved:
+        # One-time migration of a combined alerts.json into the hot/cold layout.
+        _archive_resolved(sorted(resolved, key=lambda x: x.get('resolved_on', '')))
+    return [a for a in alerts if a.get('status') != 'resolved']
+
+def apply_alert_record(alerts, record):
+    if record['op'] == 'put':
+        by_id = {a['id']: a for a in alerts}
+        by_id.update((a['id'], a) for a in record['alerts'])
+        return list(by_id.values())
+    if record['op'] == 'remove':
+        return [a for a in alerts if a['id'] != record['id']]
+    raise StoreCorruptError(f"Unknown alert log operation {record['op']!r}")
+
+alert_lock = ProcessLock('alerts')
+alert_store = JournaledStore('alerts', ALERTS_FILE, [], apply_alert_record, alert_lock, migrate=migrate_legacy_alerts)
+
+def _open_alert_index():
+    """Returns the id/student-id index of open alerts, rebuilding only when the alert log or registry has new records."""
+    signature = (alert_store.version(), student_store.version())
+    if signature == alert_index['signature']:
+        return alert_index
+    by_id = {a['id']: a for a in alert_store.data()}
+    by_student = defaultdict(list)
+    for alert in by_id.values():
+        by_student[alert_student_id(alert)].append(alert['id'])
+    alert_index.update(signature=signature, by_id=by_id, by_student=dict(by_student))
+    return alert_index
+
+def get_open_alerts():
+    with alert_lock:
+        alerts = list(_open_alert_index()['by_id'].values())
+    return sorted(alerts, key=lambda x: x['date'], reverse=True)
+
+def get_open_alerts_for_student(student_name):
+    student_id = student_id_for(student_name)
+    with alert_lock:
+        index = _open_alert_index()
+        return [index['by_id'][alert_id] for alert_id in index['by_student'].get(student_id, [])]
+
+def add_open_alerts(new_alerts):
+    if not new_alerts:
+        return
+    with alert_lock:
+        alert_store.append('put', alerts=new_alerts)
+
+def resolve_open_alert(alert_id, resolved_by, comments):
+    """Moves an open alert to the resolved archive. Returns the resolved alert, or None if it was not open."""
+    with alert_lock:
+        alert = _open_alert_index()['by_id'].get(alert_id)
+        if alert is None:
+            return None
+        alert = dict(alert, status='resolved', resolved_by=resolved_by, resolution_comments=comments,
+                     resolved_on=datetime.now().strftime('%Y-%m-%d %H:%M'))
+        _archive_resolved([alert])
+        alert_store.append('remove', id=alert_id)
+    return alert
+
+def _read_lines_reversed(file_path, block_size=65536):
+    with open(file_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        remainder = b''
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            lines = (f.read(read_size) + remainder).split(b'\n')
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip(): yield line
+        if remainder.strip(): yield remainder
+
+def get_resolved_alerts_page(page=1, per_page=RESOLVED_ALERTS_PAGE_SIZE):
+    """Reads one page of resolved alerts, most recently resolved first, parsing only the lines on that page."""
+    if not os.path.exists(RESOLVED_ALERTS_FILE):
+        return [], 0
+    with open(RESOLVED_ALERTS_FILE, 'rb') as f:
+        total = sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(65536), b''))
+    start = (page - 1) * per_page
+    alerts = []
+    for i, line in enumerate(_read_lines_reversed(RESOLVED_ALERTS_FILE)):
+        if i >= start + per_page: break
+        if i >= start: alerts.append(json.loads(line))
+    return alerts, total
+
+def iter_resolved_alerts():
+    if not os.path.exists(RESOLVED_ALERTS_FILE):
+        return
+    with open(RESOLVED_ALERTS_FILE, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip(): yield json.loads(line)
+
+@app.route('/api/alerts/resolved')
+def get_resolved_alerts_api():
+    if not session.get('logged_in'): return jsonify({'error': 'Unauthorized'}), 401
+    page = max(request.args.get('page', 1, type=int), 1)
+    alerts, total = get_resolved_alerts_page(page)
+    return jsonify({'alerts': alerts, 'page': page, 'total': total, 'has_more': page * RESOLVED_ALERTS_PAGE_SIZE < total})
+
+# --- Notification Dedup Store ---
+# notification_store maps a day to the dedup keys fired on that day. Buckets older than the horizon
+# are expired whenever new keys are recorded, so snapshots only ever hold recent keys.
+NOTIFICATION_DEDUP_DAYS = 14
+
+def migrate_legacy_notifications(saved):
+    buckets = defaultdict(set)
+    for key, value in saved.items():
+        if isinstance(value, list):
+            buckets[key].update(value)
+        else:
+            # Legacy flat layout: {dedup_key: date_str}
+            buckets[value].add(key)
+    return {day: sorted(keys) for day, keys in sorted(buckets.items())}
+
+def apply_notification_record(buckets, record):
+    if record['op'] == 'add':
+        updated = dict(buckets)
+        for alert_id, date_str in record['entries']:
+            updated[date_str] = sorted(set(updated.get(date_str, ())) | {alert_id})
+        return updated
+    if record['op'] == 'expire':
+        return {day: keys for day, keys in buckets.items() if day >= record['before']}
+    raise StoreCorruptError(f"Unknown notification log operation {record['op']!r}")
+
+notification_lock = ProcessLock('notifications')
+notification_store = JournaledStore('notifications', SENT_NOTIFICATIONS_FILE, {}, apply_notification_record,
+                                    notification_lock, migrate=migrate_legacy_notifications)
+notification_cache = {'signature': None, 'buckets': {}}
+
+def _notification_buckets():
+    signature = notification_store.version()
+    if signature != notification_cache['signature']:
+        buckets = {day: set(keys) for day, keys in notification_store.data().items()}
+        notification_cache.update(signature=signature, buckets=buckets)
+    return notification_cache['buckets']
+
+def notification_sent(alert_id, date_str):
+    with notification_lock:
+        return alert_id in _notification_buckets().get(date_str, ())
+
+def record_notifications(entries):
+    """Adds (dedup key, date) pairs and writes the store back with expired buckets compacted away."""
+    if not entries:
+        return
+    horizon = (datetime.now() - timedelta(days=NOTIFICATION_DEDUP_DAYS)).strftime('%Y-%m-%d')
+    with notification_lock:
+        if any(day < horizon for day in _notification_buckets()):
+            notification_store.append('expire', before=horizon)
+        recent = [[alert_id, date_str] for alert_id, date_str in entries if date_str >= horizon]
+        if recent:
+            notification_store.append('add', entries=recent)
+
 # --- Alerting and Email Logic ---
 
 def send_alert_email(subject, html_body):
@@ -1383,16 +4052,16 @@ def send_alert_email(subject, html_body):
         print("No users found to send email to.")
         return
 
-    msg = MIMEMultipart('alternative')
+    msg = deferred_import('email.mime.multipart').MIMEMultipart('alternative')
     msg['Subject'] = subject
     msg['From'] = user
     msg['To'] = ", ".join(recipients)
 
-    part_html = MIMEText(html_body, 'html')
+    part_html = deferred_import('email.mime.text').MIMEText(html_body, 'html')
     msg.attach(part_html)
 
     try:
-        with smtplib.SMTP(host, int(port)) as server:
+        with deferred_import('smtplib').SMTP(host, int(port)) as server:
             server.starttls()
             server.login(user, password)
             server.sendmail(user, recipients, msg.as_string())
@@ -1401,104 +4070,371 @@ def send_alert_email(subject, html_body):
         print(f"Failed to send email: {e}")
 
 
-def check_for_alerts(latest_checkin):
-    """Analyzes student data to generate alerts and send emails based on defined rules."""
-    student_name = latest_checkin['name']
-    all_checkins = load_data(DATA_FILE, [])
-    student_history = sorted(
-        [c for c in all_checkins if c.get('name') == student_name],
-        key=lambda x: x['timestamp'],
-        reverse=True
-    )
-
-    if len(student_history) < 3:
-        return 
-
-    alerts = load_data(ALERTS_FILE, [])
-    sent_notifications = load_data(SENT_NOTIFICATIONS_FILE, {})
-    today_str = datetime.now().strftime('%Y-%m-%d')
-    
-    last_3_days = student_history[:3]
-    if len(last_3_days) == 3:
-        if all(c['morale'] <= 5 for c in last_3_days):
-            alert_id = f"{student_name}-morale-3-consecutive-{today_str}"
-            if not sent_notifications.get(alert_id):
-                title = f"Consecutive Low Morale Alert for {student_name}"
-                message = f"{student_name} has reported a morale score of 5 or below for 3 consecutive days."
-                alerts.append({'id': str(uuid.uuid4()), 'title': title, 'message': message, 'date': today_str, 'type': 'morale', 'status': 'open'})
-                email_subject = f"Student Morale Alert: {student_name}"
-                email_body = f"""
-                <html><body>
-                <p>Hi Team,</p>
-                <p>This is an automated alert regarding student morale. <b>{student_name}</b> has reported a morale score of 5 or below for the last three consecutive check-ins.</p>
-                <p>Please make time to check in with them personally to see if there is anything we can do to help.</p>
-                <p>After you've spoken with them, you can use the AI Teaching Assistant on the dashboard to brainstorm ways to improve their morale based on your conversation.</p>
-                <p>Thank you,</p><p>The Teacher & Student AI Analysis Tool</p>
-                </body></html>"""
-                send_alert_email(email_subject, email_body)
-                sent_notifications[alert_id] = today_str
-
-        if all(c['understanding'] <= 5 for c in last_3_days):
-            alert_id = f"{student_name}-understanding-3-consecutive-{today_str}"
-            if not sent_notifications.get(alert_id):
-                title = f"Consecutive Low Understanding Alert for {student_name}"
-                days_str = ", ".join([datetime.fromisoformat(c['timestamp']).strftime('%b %d') for c in last_3_days])
-                message = f"{student_name} has reported an understanding score of 5 or below on {days_str}."
-                alerts.append({'id': str(uuid.uuid4()), 'title': title, 'message': message, 'date': today_str, 'type': 'understanding', 'status': 'open'})
-                email_subject = f"Student Understanding Alert: {student_name}"
-                email_body = f"""
-                <html><body>
-                <p>Hi Team,</p>
-                <p>This is an automated alert regarding student understanding. <b>{student_name}</b> has reported an understanding score of 5 or below on the following recent days: {days_str}.</p>
-                <p>This may indicate a foundational gap in their learning. To get a clearer picture and an actionable plan, you can use the <b>AI Lesson Planner</b> on the dashboard.</p>
-                <p>Try submitting images of their work, code files, or documents from those days along with the lesson context. The AI can provide a proper analysis and a guide to help them get caught up to speed.</p>
-                <p>Thank you,</p><p>The Teacher & Student AI Analysis Tool</p>
-                </body></html>"""
-                send_alert_email(email_subject, email_body)
-                sent_notifications[alert_id] = today_str
-
-    last_5_days = student_history[:5]
-    if len(last_5_days) == 5:
-        avg_morale = sum(c['morale'] for c in last_5_days) / 5
-        if avg_morale <= 5:
-            alert_id = f"{student_name}-morale-5-day-avg-{today_str}"
-            if not sent_notifications.get(alert_id):
-                title = f"Low 5-Day Morale Average for {student_name}"
-                message = f"{student_name}'s average morale over the last 5 days is {avg_morale:.1f}/10."
-                alerts.append({'id': str(uuid.uuid4()), 'title': title, 'message': message, 'date': today_str, 'type': 'morale', 'status': 'open'})
-                email_subject = f"Student Morale Alert: {student_name}"
-                email_body = f"""
+# Each rule aggregates the student's last `window` scores for `metric` and fires when the
+# aggregated value is at or below `threshold`. 'max' means every score in the window is low.
+DEFAULT_ALERT_RULES = [
+    {
+        'key': 'morale-3-consecutive', 'metric': 'morale', 'window': 3, 'aggregation': 'max', 'threshold': 5,
+        'title': "Consecutive Low Morale Alert for {name}",
+        'message': "{name} has reported a morale score of {threshold} or below for {window} consecutive days.",
+        'email_detail': "<b>{name}</b> has reported a morale score of {threshold} or below for the last {window} consecutive check-ins."
+    },
+    {
+        'key': 'understanding-3-consecutive', 'metric': 'understanding', 'window': 3, 'aggregation': 'max', 'threshold': 5,
+        'title': "Consecutive Low Understanding Alert for {name}",
+        'message': "{name} has reported an understanding score of {threshold} or below on {days}.",
+        'email_detail': "<b>{name}</b> has reported an understanding score of {threshold} or below on the following recent days: {days}."
+    },
+    {
+        'key': 'morale-5-day-avg', 'metric': 'morale', 'window': 5, 'aggregation': 'mean', 'threshold': 5,
+        'title': "Low 5-Day Morale Average for {name}",
+        'message': "{name}'s average morale over the last {window} days is {value:.1f}/10.",
+        'email_detail': "<b>{name}</b> has maintained a low morale average of {value:.1f}/10 over the last {window} days."
+    },
+    {
+        'key': 'understanding-5-day-avg', 'metric': 'understanding', 'window': 5, 'aggregation': 'mean', 'threshold': 5,
+        'title': "Low 5-Day Understanding Average for {name}",
+        'message': "{name}'s average understanding over the last {window} days is {value:.1f}/10.",
+        'email_detail': "<b>{name}</b> has maintained a low understanding average of {value:.1f}/10 over the last {window} days."
+    },
+]
+ALERT_METRICS = ('morale', 'understanding')
+ALERT_AGGREGATIONS = {'max': np.max, 'min': np.min, 'mean': np.mean, 'median': np.median}
+
+ALERT_EMAIL_GUIDANCE = {
+    'morale': """<p>Please make time to check in with them personally to see if there is anything we can do to help.</p>
+                <p>After you've spoken with them, you can use the AI Teaching Assistant on the dashboard to brainstorm ways to improve their morale based on your conversation.</p>""",
+    'understanding': """<p>This may indicate a foundational gap in their learning. To get a clearer picture and an actionable plan, you can use the <b>AI Lesson Planner</b> on the dashboard.</p>
+                <p>Try submitting images of their work, code files, or documents from those days along with the lesson context. The AI can provide a proper analysis and a guide to help them get caught up to speed.</p>""",
+}
+
+def validate_alert_rule(rule):
+    """Normalizes a rule dict, raising ValueError if it cannot be evaluated."""
+    missing = [f for f in ('key', 'metric', 'window', 'aggregation', 'threshold', 'title', 'message', 'email_detail') if f not in rule]
+    if missing:
+        raise ValueError(f"Rule is missing fields: {', '.join(missing)}")
+    if rule['metric'] not in ALERT_METRICS:
+        raise ValueError(f"Unknown metric '{rule['metric']}' in rule {rule['key']}")
+    if rule['aggregation'] not in ALERT_AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation '{rule['aggregation']}' in rule {rule['key']}")
+    rule = dict(rule)
+    try:
+        rule['window'] = int(rule['window'])
+        rule['threshold'] = float(rule['threshold'])
+    except (TypeError, ValueError):
+        raise ValueError(f"Window and threshold must be numeric in rule {rule['key']}")
+    if rule['window'] < 1:
+        raise ValueError(f"Window must be at least 1 in rule {rule['key']}")
+    if not math.isfinite(rule['threshold']):
+        raise ValueError(f"Threshold must be a finite number in rule {rule['key']}")
+    if rule['threshold'].is_integer():
+        rule['threshold'] = int(rule['threshold'])
+    # Render each template once now; a bad placeholder would otherwise fail every check-in that fires the rule.
+    sample = {'name': 'Student', 'value': 0.0, 'days': 'Jan 01', 'window': rule['window'], 'threshold': rule['threshold']}
+    for field in ('title', 'message', 'email_detail'):
+        try:
+            if not isinstance(rule[field], str):
+                raise TypeError
+            rule[field].format(**sample)
+        except (KeyError, IndexError, ValueError, TypeError, AttributeError):
+            raise ValueError(f"The {field} of rule {rule['key']} must be text using only the placeholders "
+                             "{name}, {value}, {days}, {window} and {threshold}.")
+    return rule
+
+def load_alert_rules():
+    return [validate_alert_rule(r) for r in load_data(ALERT_RULES_FILE, DEFAULT_ALERT_RULES)]
+
+def merge_alert_rules(rules, overrides):
+    """Applies partial rule dicts (matched by 'key') on top of a rule set; unknown keys are added as new rules."""
+    merged = {r['key']: dict(r) for r in rules}
+    for override in overrides or []:
+        if 'key' not in override:
+            raise ValueError("Every rule override needs a 'key'.")
+        merged.setdefault(override['key'], {}).update(override)
+    return [validate_alert_rule(r) for r in merged.values()]
+
+def evaluate_rule_windows(rule, values):
+    """Aggregates every `window`-sized run of `values` at once. Returns (hit mask, aggregated values) per window end."""
+    values = np.asarray(values, dtype=float)
+    if len(values) < rule['window']:
+        return np.zeros(0, dtype=bool), np.zeros(0)
+    windows = np.lib.stride_tricks.sliding_window_view(values, rule['window'])
+    aggregated = ALERT_AGGREGATIONS[rule['aggregation']](windows, axis=1)
+    return aggregated <= rule['threshold'], aggregated
+
+def build_alert(rule, student_name, window_checkins, value, date_str):
+    """Renders the alert record and email for a rule that fired on `window_checkins` (table rows, oldest first)."""
+    days_str = ", ".join(c.datetime.strftime('%b %d') for c in reversed(window_checkins))
+    context = {'name': student_name, 'value': float(value), 'days': days_str, 'window': rule['window'], 'threshold': rule['threshold']}
+    alert = {
+        'id': str(uuid.uuid4()),
+        'title': rule['title'].format(**context),
+        'message': rule['message'].format(**context),
+        'date': date_str,
+        'type': rule['metric'],
+        'rule': rule['key'],
+        'student': student_name,
+        'student_id': student_id_for(student_name),
+        'status': 'open'
+    }
+    email_subject = f"Student {rule['metric'].title()} Alert: {student_name}"
+    email_body = f"""
                 <html><body>
                 <p>Hi Team,</p>
-                <p>This is an automated alert regarding student morale. <b>{student_name}</b> has maintained a low morale average of {avg_morale:.1f}/10 over the last 5 days.</p>
-                <p>Please make time to check in with them personally to see if there is anything we can do to help.</p>
-                <p>After you've spoken with them, you can use the AI Teaching Assistant on the dashboard to brainstorm ways to improve their morale based on your conversation.</p>
+                <p>This is an automated alert regarding student {rule['metric']}. {rule['email_detail'].format(**context)}</p>
+                {ALERT_EMAIL_GUIDANCE[rule['metric']]}
                 <p>Thank you,</p><p>The Teacher & Student AI Analysis Tool</p>
                 </body></html>"""
-                send_alert_email(email_subject, email_body)
-                sent_notifications[alert_id] = today_str
-
-        avg_understanding = sum(c['understanding'] for c in last_5_days) / 5
-        if avg_understanding <= 5:
-            alert_id = f"{student_name}-understanding-5-day-avg-{today_str}"
-            if not sent_notifications.get(alert_id):
-                title = f"Low 5-Day Understanding Average for {student_name}"
-                message = f"{student_name}'s average understanding over the last 5 days is {avg_understanding:.1f}/10."
-                alerts.append({'id': str(uuid.uuid4()), 'title': title, 'message': message, 'date': today_str, 'type': 'understanding', 'status': 'open'})
-                email_subject = f"Student Understanding Alert: {student_name}"
-                email_body = f"""
+    return alert, email_subject, email_body
+
+def check_for_alerts(student_name):
+    """Evaluates every alert rule against the newest window of the student's history and sends emails for
+    new alerts. Returns (new alerts, notification keys) for the caller to record."""
+    table = load_checkin_table()
+    student_history = table.student_indices(student_name)
+
+    rules = load_alert_rules()
+    if not rules or len(student_history) < min(r['window'] for r in rules):
+        return [], []
+
+    new_alerts = []
+    notified = []
+    today_str = datetime.now().strftime('%Y-%m-%d')
+
+    for rule in rules:
+        window = student_history[-rule['window']:]
+        hits, aggregated = evaluate_rule_windows(rule, getattr(table, rule['metric'])[window])
+        if not hits.any():
+            continue
+        alert_id = f"{student_name}-{rule['key']}-{today_str}"
+        if notification_sent(alert_id, today_str):
+            continue
+        alert, email_subject, email_body = build_alert(rule, student_name, table.rows(window), aggregated[-1], today_str)
+        new_alerts.append(alert)
+        send_alert_email(email_subject, email_body)
+        notified.append((alert_id, today_str))
+    return new_alerts, notified
+
+def run_alert_pass(checkins):
+    """Folds new check-ins into the trend scores, evaluates alerts once per student and records them in one write."""
+    new_alerts, notified = [], []
+    for student_name, scores in update_trend_scores(checkins).items():
+        for alerts, keys in (check_for_alerts(student_name), check_for_trend_alert(student_name, scores)):
+            new_alerts += alerts
+            notified += keys
+    if new_alerts:
+        add_open_alerts(new_alerts)
+        record_notifications(notified)
+
+def backfill_alerts(rules, table, already_raised):
+    """Re-runs rules over the full history with sliding windows. Returns (alert, dedup key) pairs not yet raised."""
+    results = []
+    seen = set()
+    for student_name, history in sorted(table.group_by_student().items()):
+        for rule in rules:
+            hits, aggregated = evaluate_rule_windows(rule, getattr(table, rule['metric'])[history])
+            for start in np.flatnonzero(hits):
+                window = history[start:start + rule['window']]
+                date_str = from_epoch_seconds(table.ts[window[-1]]).strftime('%Y-%m-%d')
+                alert_id = f"{student_name}-{rule['key']}-{date_str}"
+                if alert_id in seen or already_raised(alert_id, date_str):
+                    continue
+                seen.add(alert_id)
+                alert, _, _ = build_alert(rule, student_name, table.rows(window), aggregated[start], date_str)
+                results.append((alert, alert_id))
+    return results
+
+@app.route('/api/alert_rules', methods=['GET', 'POST'])
+def alert_rules_api():
+    if not session.get('logged_in'): return jsonify({'error': 'Unauthorized'}), 401
+    if request.method == 'GET':
+        return jsonify(load_alert_rules())
+    if session.get('user_role') != 'super_admin':
+        return jsonify({'error': 'Only the super admin can change alert rules.'}), 403
+
+    data = request.get_json() or {}
+    try:
+        rules = merge_alert_rules(load_alert_rules(), data.get('rules', []))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    save_data(ALERT_RULES_FILE, rules)
+    return jsonify(rules)
+
+@app.route('/api/alerts/backfill', methods=['POST'])
+def backfill_alerts_api():
+    """Previews (dry_run, the default) or records the alerts a rule set would have raised over all history."""
+    if not session.get('logged_in'): return jsonify({'error': 'Unauthorized'}), 401
+
+    data = request.get_json() or {}
+    dry_run = data.get('dry_run', True)
+    if not dry_run and session.get('user_role') != 'super_admin':
+        return jsonify({'error': 'Only the super admin can record backfilled alerts.'}), 403
+    try:
+        rules = merge_alert_rules(load_alert_rules(), data.get('rules', []))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if data.get('only'):
+        rules = [r for r in rules if r['key'] in data['only']]
+
+    # The dedup store only covers recent days, so older history is checked against the alerts themselves.
+    raised = {f"{alert_student(a)}-{a['rule']}-{a['date']}" for a in get_open_alerts() + list(iter_resolved_alerts()) if a.get('rule')}
+    results = backfill_alerts(rules, load_checkin_table(), lambda alert_id, date_str: alert_id in raised or notification_sent(alert_id, date_str))
+    new_alerts = [alert for alert, _ in results]
+
+    if not dry_run and results:
+        # Historical alerts are recorded without emailing the team about past events.
+        add_open_alerts(new_alerts)
+        record_notifications([(alert_id, alert['date']) for alert, alert_id in results])
+
+    return jsonify({'dry_run': dry_run, 'count': len(new_alerts), 'alerts': new_alerts})
+
+# --- Early-Warning Trend Scores ---
+# One fixed-size row of running sums per student, updated in O(1) per check-in. The row holds an
+# EWMA of each score plus exponentially-weighted least-squares sums over (check-in number, score),
+# so the recent slope can be read back without touching the check-in history. The rows live in a
+# journaled store, so each check-in logs only the rows it changed and other workers replay them.
+TREND_ALPHA = 0.3               # EWMA smoothing factor for the current level
+TREND_DECAY = 0.85              # forgetting factor for the slope's least-squares sums
+TREND_SLOPE_THRESHOLD = -0.5    # points per check-in at or below which a decline is flagged
+TREND_MIN_CHECKINS = 4
+TREND_FIELDS = ('count', 'ewma_morale', 'ewma_understanding', 'sw', 'sx', 'sxx',
+                'sy_morale', 'sxy_morale', 'sy_understanding', 'sxy_understanding')
+T_COUNT, T_EWMA_M, T_EWMA_U, T_SW, T_SX, T_SXX, T_SY_M, T_SXY_M, T_SY_U, T_SXY_U = range(len(TREND_FIELDS))
+
+def apply_trend_record(scores, record):
+    if record['op'] == 'update':
+        scores['rows'].update(record['rows'])  # In place, like apply_checkin_record.
+        return scores
+    if record['op'] == 'replace':
+        return {'fields': record['fields'], 'rows': record['rows']}
+    raise StoreCorruptError(f"Unknown trend log operation {record['op']!r}")
+
+trend_lock = ProcessLock('trend_scores')
+# Until the first rows are built from the check-in history, 'fields' is None.
+trend_store = JournaledStore('trend_scores', TREND_SCORES_FILE, {'fields': None, 'rows': {}}, apply_trend_record, trend_lock)
+
+def _apply_trend_update(row, morale, understanding):
+    n = row[T_COUNT] + 1
+    row[T_COUNT] = n
+    if n == 1:
+        row[T_EWMA_M], row[T_EWMA_U] = float(morale), float(understanding)
+    else:
+        row[T_EWMA_M] += TREND_ALPHA * (morale - row[T_EWMA_M])
+        row[T_EWMA_U] += TREND_ALPHA * (understanding - row[T_EWMA_U])
+    d = TREND_DECAY
+    row[T_SW] = d * row[T_SW] + 1
+    row[T_SX] = d * row[T_SX] + n
+    row[T_SXX] = d * row[T_SXX] + n * n
+    row[T_SY_M] = d * row[T_SY_M] + morale
+    row[T_SXY_M] = d * row[T_SXY_M] + n * morale
+    row[T_SY_U] = d * row[T_SY_U] + understanding
+    row[T_SXY_U] = d * row[T_SXY_U] + n * understanding
+
+def _trend_slope(row, sy_index, sxy_index):
+    denominator = row[T_SW] * row[T_SXX] - row[T_SX] ** 2
+    if denominator <= 1e-9:
+        return 0.0
+    return (row[T_SW] * row[sxy_index] - row[T_SX] * row[sy_index]) / denominator
+
+def _trend_scores(row):
+    return {
+        'count': int(row[T_COUNT]),
+        'ewma_morale': round(row[T_EWMA_M], 2),
+        'ewma_understanding': round(row[T_EWMA_U], 2),
+        'slope_morale': round(_trend_slope(row, T_SY_M, T_SXY_M), 3),
+        'slope_understanding': round(_trend_slope(row, T_SY_U, T_SXY_U), 3),
+    }
+
+def _load_trend_rows():
+    """Returns (rows, rebuilt), building the rows from the check-in history first if none were saved yet, or
+    if they were saved with other fields. The caller must hold trend_lock and treat the rows as read-only."""
+    scores = trend_store.data()
+    if scores.get('fields') == list(TREND_FIELDS):
+        return scores['rows'], False
+    return trend_store.append('replace', fields=list(TREND_FIELDS), rows=_trend_rows_from_history())['rows'], True
+
+def _trend_rows_from_history():
+    rows = {}
+    daily, _ = load_rollups()
+    # A rolled-up day counts as that many check-ins at the day's average scores.
+    for sid, count, morale_sum, understanding_sum in zip(*(column.tolist() for column in (daily.student, daily.count, daily.morale_sum, daily.understanding_sum))):
+        row = rows.setdefault(daily.names[sid], [0.0] * len(TREND_FIELDS))
+        for _ in range(count):
+            _apply_trend_update(row, morale_sum / count, understanding_sum / count)
+    table = load_checkin_table()
+    for i in range(len(table)):
+        row = rows.setdefault(table.names[table.student[i]], [0.0] * len(TREND_FIELDS))
+        _apply_trend_update(row, int(table.morale[i]), int(table.understanding[i]))
+    return rows
+
+def rebuild_trend_scores():
+    """Recomputes every student's row from the full, time-ordered history (e.g. after importing older check-ins)."""
+    with trend_lock:
+        trend_store.append('replace', fields=list(TREND_FIELDS), rows=_trend_rows_from_history())
+        trend_store.snapshot()  # The replaced rows' log records are no longer needed.
+
+def update_trend_scores(checkins):
+    """Folds already-saved check-ins into their students' rows and returns {student: current scores}."""
+    with trend_lock:
+        rows, rebuilt = _load_trend_rows()
+        names = [student_name(checkin['student_id']) if 'student_id' in checkin else checkin['name'] for checkin in checkins]
+        changed = {}
+        for name, checkin in zip(names, checkins):
+            if name not in changed:
+                changed[name] = list(rows.get(name) or [0.0] * len(TREND_FIELDS))
+            # A rebuild from the saved history has already counted these check-ins.
+            if not rebuilt:
+                _apply_trend_update(changed[name], checkin['morale'], checkin['understanding'])
+        if changed and not rebuilt:
+            trend_store.append('update', rows=changed)
+        return {name: _trend_scores(row) for name, row in changed.items()}
+
+def get_trend_scores():
+    with trend_lock:
+        return {name: _trend_scores(row) for name, row in _load_trend_rows()[0].items()}
+
+def check_for_trend_alert(student_name, scores):
+    """Raises a 'trend' alert when a student's recent slope points steadily downward. Returns (new alerts, notification keys)."""
+    if scores['count'] < TREND_MIN_CHECKINS:
+        return [], []
+    today_str = datetime.now().strftime('%Y-%m-%d')
+    new_alerts = []
+    notified = []
+
+    for metric in ALERT_METRICS:
+        slope = scores[f'slope_{metric}']
+        if slope > TREND_SLOPE_THRESHOLD:
+            continue
+        alert_id = f"{student_name}-declining-{metric}-{today_str}"
+        if notification_sent(alert_id, today_str):
+            continue
+        level = scores[f'ewma_{metric}']
+        new_alerts.append({
+            'id': str(uuid.uuid4()),
+            'title': f"Declining {metric.title()} Trend for {student_name}",
+            'message': f"{student_name}'s {metric} has been trending down by about {abs(slope):.1f} points per check-in (recent level {level:.1f}/10).",
+            'date': today_str,
+            'type': 'trend',
+            'metric': metric,
+            'student': student_name,
+            'student_id': student_id_for(student_name),
+            'status': 'open'
+        })
+        email_body = f"""
                 <html><body>
                 <p>Hi Team,</p>
-                <p>This is an automated alert regarding student understanding. <b>{student_name}</b> has maintained a low understanding average of {avg_understanding:.1f}/10 over the last 5 days.</p>
-                <p>This may indicate a foundational gap in their learning. To get a clearer picture and an actionable plan, you can use the <b>AI Lesson Planner</b> on the dashboard.</p>
-                <p>Try submitting images of their work, code files, or documents from those days along with the lesson context. The AI can provide a proper analysis and a guide to help them get caught up to speed.</p>
+                <p>This is an early-warning alert regarding student {metric}. <b>{student_name}</b>'s {metric} scores have been sliding downward by about {abs(slope):.1f} points per check-in, with a recent level of {level:.1f}/10.</p>
+                {ALERT_EMAIL_GUIDANCE[metric]}
                 <p>Thank you,</p><p>The Teacher & Student AI Analysis Tool</p>
                 </body></html>"""
-                send_alert_email(email_subject, email_body)
-                sent_notifications[alert_id] = today_str
-    
-    save_data(ALERTS_FILE, alerts)
-    save_data(SENT_NOTIFICATIONS_FILE, sent_notifications)
+        send_alert_email(f"Student {metric.title()} Trend Alert: {student_name}", email_body)
+        notified.append((alert_id, today_str))
+    return new_alerts, notified
+
+@app.route('/api/trends')
+def get_trend_scores_api():
+    if not session.get('logged_in'): return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(get_trend_scores())
 
 @app.route('/resolve_alert', methods=['POST'])
 def resolve_alert():
@@ -1508,83 +4444,799 @@ def resolve_alert():
     resolved_by = request.form.get('resolved_by')
     comments = request.form.get('resolution_comments')
     
-    all_alerts = load_data(ALERTS_FILE, [])
-    for alert in all_alerts:
-        if alert['id'] == alert_id:
-            alert['status'] = 'resolved'
-            alert['resolved_by'] = resolved_by
-            alert['resolution_comments'] = comments
-            alert['resolved_on'] = datetime.now().strftime('%Y-%m-%d %H:%M')
-            break
-            
-    save_data(ALERTS_FILE, all_alerts)
+    resolve_open_alert(alert_id, resolved_by, comments)
     return redirect(url_for('admin', tab='alerts'))
 
+ALERT_EXPORT_COLUMNS = [('date', 'Date Generated'), ('title', 'Title'), ('message', 'Details'), ('status', 'Status'),
+                        ('resolved_on', 'Date Resolved'), ('resolved_by', 'Resolved By'), ('resolution_comments', 'Resolution Comments')]
+
+def alert_export_rows():
+    header = [label for _, label in ALERT_EXPORT_COLUMNS]
+    rows = ([alert.get(field) for field, _ in ALERT_EXPORT_COLUMNS] for alert in chain(get_open_alerts(), iter_resolved_alerts()))
+    return header, rows
+
 @app.route('/export_alerts/<string:format_type>')
 def export_alerts(format_type):
     if not session.get('logged_in'): return redirect(url_for('login'))
-    
-    all_alerts = load_data(ALERTS_FILE, [])
-    if not all_alerts:
-        return "No alerts to export.", 404
-
-    df = pd.DataFrame(all_alerts)
-    df_export = df[['date', 'title', 'message', 'status', 'resolved_on', 'resolved_by', 'resolution_comments']]
-    df_export.columns = ['Date Generated', 'Title', 'Details', 'Status', 'Date Resolved', 'Resolved By', 'Resolution Comments']
-    
-    output = BytesIO()
-    filename = f"student_alerts_export.{format_type}"
-
-    if format_type == 'xlsx':
-        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        df_export.to_excel(output, index=False, sheet_name='Alerts')
-    elif format_type == 'csv':
-        mimetype = 'text/csv'
-        df_export.to_csv(output, index=False)
-    elif format_type == 'ods':
-        mimetype = 'application/vnd.oasis.opendocument.spreadsheet'
-        with pd.ExcelWriter(output, engine='odf') as writer:
-            df_export.to_excel(writer, index=False, sheet_name='Alerts')
-    else:
+    if format_type not in EXPORT_MIMETYPES:
         return "Invalid format type", 400
-        
-    output.seek(0)
-    
-    return send_file(output, as_attachment=True, download_name=filename, mimetype=mimetype)
 
+    rendered = render_export('alerts', 'all', format_type)
+    if rendered is None:
+        return "No alerts to export.", 404
 
-@app.route('/api/generate_plan', methods=['POST'])
-def generate_guidance_plan():
-    if not session.get('logged_in'):
-        return jsonify({'error': 'Unauthorized'}), 401
+    path, filename = rendered
+    return send_export(path, filename, format_type)
+
+# --- Bundled Export Jobs ---
+# A bundle renders every month, every student and the alert history in every format on a process
+# pool, then zips the results with a manifest. The request only starts the job; a coordinator thread
+# drives the pool and records progress in a small JSON file that the dashboard polls. A file that fails
+# to render is listed under 'errors' in the manifest instead of failing the bundle. Only the newest
+# BUNDLES_KEPT finished bundles are kept, for at most BUNDLE_RETENTION_DAYS.
+BUNDLE_FOLDER = os.path.join(EXPORT_CACHE_FOLDER, 'bundles')
+BUNDLES_KEPT = 5
+BUNDLE_RETENTION_DAYS = 7
+EXPORT_POOL_WORKERS = min(4, os.cpu_count() or 1)
+
+export_pool = None
+export_pool_lock = threading.Lock()
+
+def get_export_pool():
+    global export_pool
+    with export_pool_lock:
+        if export_pool is None:
+            # 'spawn' keeps workers from inheriting locks held by the web server's threads at fork time.
+            spawn = deferred_import('multiprocessing').get_context('spawn')
+            export_pool = deferred_import('concurrent.futures').ProcessPoolExecutor(max_workers=EXPORT_POOL_WORKERS, mp_context=spawn)
+        return export_pool
+
+def bundle_job_path(job_id):
+    return os.path.join(BUNDLE_FOLDER, f"{job_id}.json")
+
+def bundle_tasks():
+    table = load_checkin_table()
+    months = sorted({from_epoch_seconds(int(day) * SECONDS_PER_DAY).strftime('%Y-%m') for day in np.unique(table.day)})
+    students = sorted(table.group_by_student())
+    tasks = []
+    for format_type in EXPORT_MIMETYPES:
+        tasks.append(('alerts', 'all', format_type, 'alerts'))
+        tasks.extend(('checkins', month, format_type, 'months') for month in months)
+        tasks.extend(('student', name, format_type, 'students') for name in students)
+    return tasks
+
+def run_export_bundle(job_id):
+    job = load_data(bundle_job_path(job_id), {})
+    try:
+        tasks = bundle_tasks()
+        job.update(status='running', total=len(tasks), done=0)
+        save_data(bundle_job_path(job_id), job)
+
+        pool = get_export_pool()
+        futures = {pool.submit(render_export, kind, source, format_type): (kind, source, format_type, folder)
+                   for kind, source, format_type, folder in tasks}
+        files, errors = [], []
+        try:
+            for future in deferred_import('concurrent.futures').as_completed(futures):
+                kind, source, format_type, folder = futures[future]
+                try:
+                    rendered = future.result()
+                except Exception as e:
+                    print(f"Export bundle {job_id}: rendering {kind} {source} as {format_type} failed: {e}")
+                    errors.append({'kind': kind, 'source': source, 'format': format_type, 'error': str(e) or type(e).__name__})
+                    rendered = None
+                if rendered is not None:
+                    path, filename = rendered
+                    files.append({'path': path, 'name': f"{folder}/{filename}", 'kind': kind, 'source': source, 'format': format_type})
+                job['done'] += 1
+                job['errors'] = len(errors)
+                save_data(bundle_job_path(job_id), job)
+        finally:
+            for future in futures:
+                future.cancel()  # Renders not yet started when the job itself broke.
+
+        zip_path = os.path.abspath(os.path.join(BUNDLE_FOLDER, f"{job_id}.zip"))
+        with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as bundle:
+            for entry in sorted(files, key=lambda x: x['name']):
+                bundle.write(entry['path'], entry['name'])
+            manifest = {
+                'generated_on': datetime.now().isoformat(timespec='seconds'),
+                'files': [{'name': e['name'], 'kind': e['kind'], 'source': e['source'], 'format': e['format'],
+                           'bytes': os.path.getsize(e['path'])} for e in sorted(files, key=lambda x: x['name'])],
+                'errors': sorted(errors, key=lambda x: (x['kind'], x['source'], x['format']))
+            }
+            bundle.writestr('manifest.json', json.dumps(manifest, indent=4))
+        job.update(status='done', zip_path=zip_path, finished_on=manifest['generated_on'])
+    except Exception as e:
+        print(f"Export bundle {job_id} failed: {e}")
+        job.update(status='failed', error=str(e))
+    save_data(bundle_job_path(job_id), job)
+
+def fail_orphaned_bundle_job(job):
+    """Marks an unfinished job failed if the process running it is gone. Returns True if it did."""
+    if job.get('status') not in ('queued', 'running') or not job_owner_is_gone(job.get('owner')):
+        return False
+    job.update(status='failed', error='Interrupted when the server restarted; start the export again.')
+    save_data(bundle_job_path(job['id']), job)
+    return True
+
+def prune_bundles():
+    """Fails bundle jobs whose process is gone and removes old finished bundles. Runs at startup and
+    whenever a bundle is started."""
+    if not os.path.isdir(BUNDLE_FOLDER):
+        return
+    finished, known = [], set()
+    for filename in os.listdir(BUNDLE_FOLDER):
+        job = load_data(os.path.join(BUNDLE_FOLDER, filename), None) if filename.endswith('.json') else None
+        if not job:
+            continue
+        known.add(job['id'])
+        fail_orphaned_bundle_job(job)
+        if job['status'] in ('done', 'failed'):
+            finished.append((job.get('finished_on') or job.get('requested_on') or '', job['id']))
+    cutoff = (datetime.now() - timedelta(days=BUNDLE_RETENTION_DAYS)).isoformat(timespec='seconds')
+    expired = {job_id for i, (when, job_id) in enumerate(sorted(finished, reverse=True)) if i >= BUNDLES_KEPT or when < cutoff}
+    for filename in os.listdir(BUNDLE_FOLDER):
+        job_id = filename.split('.', 1)[0]
+        # A zip without its job file is left by a crash; a running job's zip has its job file.
+        if job_id in expired or (filename.endswith('.zip') and job_id not in known):
+            try: os.remove(os.path.join(BUNDLE_FOLDER, filename))
+            except OSError: pass
+
+@app.route('/export_bundle', methods=['POST'])
+def start_export_bundle():
+    if not session.get('logged_in'): return jsonify({'error': 'Unauthorized'}), 401
+    os.makedirs(BUNDLE_FOLDER, exist_ok=True)
+    prune_bundles()
+    job_id = str(uuid.uuid4())
+    save_data(bundle_job_path(job_id), {'id': job_id, 'status': 'queued', 'owner': job_owner(), 'done': 0, 'total': 0,
+                                        'requested_by': session.get('user_email'), 'requested_on': datetime.now().isoformat(timespec='seconds')})
+    threading.Thread(target=run_export_bundle, args=(job_id,), daemon=True).start()
+    return jsonify({'job_id': job_id}), 202
+
+@app.route('/export_bundle/<string:job_id>')
+def export_bundle_status(job_id):
+    if not session.get('logged_in'): return jsonify({'error': 'Unauthorized'}), 401
+    job = load_data(bundle_job_path(secure_filename(job_id)), None)
+    if job is None:
+        return jsonify({'error': 'Unknown export job.'}), 404
+    fail_orphaned_bundle_job(job)  # Its worker process died while this server kept running.
+    status = {k: v for k, v in job.items() if k != 'zip_path'}
+    if job['status'] == 'done':
+        status['download_url'] = url_for('download_export_bundle', job_id=job['id'])
+    return jsonify(status)
+
+@app.route('/export_bundle/<string:job_id>/download')
+def download_export_bundle(job_id):
+    if not session.get('logged_in'): return redirect(url_for('login'))
+    job = load_data(bundle_job_path(secure_filename(job_id)), None)
+    if job is None or job.get('status') != 'done':
+        return "Export bundle not found.", 404
+    filename = f"full_export_{job['finished_on'][:10].replace('-', '_')}.zip"
+    return send_file(job['zip_path'], as_attachment=True, download_name=filename, mimetype='application/zip')
+
+
+# --- Student PDF Reports ---
+# Progress reports are rendered one student per pool task and streamed into a zip as each finishes.
+# Reports use a Unicode TrueType font so names and comments are not mangled into latin-1.
+REPORT_FONT_CANDIDATES = [
+    os.getenv('REPORT_FONT_PATH'),
+    os.path.join('assets', 'fonts', 'DejaVuSans.ttf'),
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/Library/Fonts/Arial Unicode.ttf',
+    'C:\\Windows\\Fonts\\arial.ttf',
+]
+
+def find_report_font():
+    return next((path for path in REPORT_FONT_CANDIDATES if path and os.path.exists(path)), None)
+
+def new_report_pdf():
+    """Returns (pdf, font family, encode) where encode() makes text safe for the chosen font."""
+    pdf = deferred_import('fpdf').FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    font_path = find_report_font()
+    if font_path:
+        pdf.add_font('Report', '', font_path)
+        return pdf, 'Report', lambda text: str(text)
+    print("No Unicode font found for PDF reports; set REPORT_FONT_PATH. Falling back to latin-1.")
+    return pdf, 'Helvetica', lambda text: str(text).encode('latin-1', 'replace').decode('latin-1')
+
+def student_report_payloads(names=None):
+    """Collects everything a report needs per student, so pool workers only have to render."""
+    table = load_checkin_table()
+    groups = table.group_by_student()
+    daily, _ = load_rollups()
+    rolled_up = defaultdict(lambda: [0, 0, 0])  # name -> [check-ins, morale sum, understanding sum] past the retention cutoff
+    for sid, count, morale_sum, understanding_sum in zip(*(column.tolist() for column in (daily.student, daily.count, daily.morale_sum, daily.understanding_sum))):
+        totals = rolled_up[daily.names[sid]]
+        totals[0] += count; totals[1] += morale_sum; totals[2] += understanding_sum
+    known = set(groups) | set(rolled_up)
+    names = sorted(known) if names is None else [n for n in names if n in known]
+
+    alerts_by_student = defaultdict(list)
+    for alert in chain(get_open_alerts(), iter_resolved_alerts()):
+        alerts_by_student[alert_student(alert)].append(alert)
+
+    payloads = []
+    for name in names:
+        indices = groups.get(name, np.zeros(0, dtype=np.int64))
+        rolled_count, rolled_morale, rolled_understanding = rolled_up.get(name, (0, 0, 0))
+        count = len(indices) + rolled_count
+        payloads.append({
+            'name': name,
+            'checkins': [(c.date_friendly, c.time, c.morale, c.understanding) for c in table.rows(indices)],
+            'rolled_up': rolled_count,
+            'avg_morale': round((int(table.morale[indices].sum()) + rolled_morale) / count, 1),
+            'avg_understanding': round((int(table.understanding[indices].sum()) + rolled_understanding) / count, 1),
+            'alerts': sorted(alerts_by_student.get(name, []), key=lambda x: x.get('date', ''), reverse=True),
+        })
+    return payloads
+
+def add_student_report(pdf, family, encode, payload):
+    pdf.add_page()
+    pdf.set_font(family, size=18)
+    pdf.cell(0, 10, encode(f"Progress Report: {payload['name']}"), new_x='LMARGIN', new_y='NEXT')
+    pdf.set_font(family, size=10)
+    pdf.cell(0, 6, encode(f"Generated {datetime.now().strftime('%Y-%m-%d %H:%M')}"), new_x='LMARGIN', new_y='NEXT')
+    pdf.ln(4)
+
+    pdf.set_font(family, size=12)
+    checkins_line = f"Check-ins: {len(payload['checkins']) + payload['rolled_up']}"
+    if payload['rolled_up']:
+        checkins_line += f" ({payload['rolled_up']} older ones are only kept as daily totals)"
+    pdf.cell(0, 7, encode(checkins_line), new_x='LMARGIN', new_y='NEXT')
+    pdf.cell(0, 7, encode(f"Average morale: {payload['avg_morale']}/10    Average understanding: {payload['avg_understanding']}/10"), new_x='LMARGIN', new_y='NEXT')
+    pdf.ln(4)
+
+    pdf.set_font(family, size=14)
+    pdf.cell(0, 8, encode("Alerts"), new_x='LMARGIN', new_y='NEXT')
+    pdf.set_font(family, size=10)
+    if not payload['alerts']:
+        pdf.cell(0, 6, encode("No alerts raised."), new_x='LMARGIN', new_y='NEXT')
+    for alert in payload['alerts']:
+        line = f"{alert.get('date', '')}  [{alert.get('status', 'open')}]  {alert.get('title', '')}"
+        if alert.get('status') == 'resolved':
+            line += f"\nResolved by {alert.get('resolved_by', '')} on {alert.get('resolved_on', '')}: {alert.get('resolution_comments', '')}"
+        pdf.multi_cell(0, 6, encode(line), new_x='LMARGIN', new_y='NEXT')
+        pdf.ln(1)
+    pdf.ln(4)
+
+    pdf.set_font(family, size=14)
+    pdf.cell(0, 8, encode("Check-in History"), new_x='LMARGIN', new_y='NEXT')
+    pdf.set_font(family, size=10)
+    for label, width in (('Date', 40), ('Time', 40), ('Morale', 30), ('Understanding', 40)):
+        pdf.cell(width, 7, label, border=1)
+    pdf.ln()
+    for date_friendly, time_str, morale, understanding in payload['checkins']:
+        for value, width in ((date_friendly, 40), (time_str, 40), (f"{morale}/10", 30), (f"{understanding}/10", 40)):
+            pdf.cell(width, 6, encode(value), border=1)
+        pdf.ln()
+
+def render_student_reports(payloads):
+    """Renders one PDF containing a report per payload. Runs inside export pool workers."""
+    pdf, family, encode = new_report_pdf()
+    for payload in payloads:
+        add_student_report(pdf, family, encode, payload)
+    return bytes(pdf.output())
+
+class _ZipStream:
+    """Write-only file object that lets zipfile produce output incrementally for a streamed response."""
+    def __init__(self):
+        self.chunks = []
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+    def flush(self):
+        pass
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+def stream_student_reports_zip(payloads):
+    pool = get_export_pool()
+    futures = {pool.submit(render_student_reports, [payload]): payload['name'] for payload in payloads}
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for future in deferred_import('concurrent.futures').as_completed(futures):
+            # The registry id keeps entries unique when names sanitize alike (e.g. non-ASCII names).
+            name = futures[future]
+            entry_name = '_'.join(filter(None, (str(student_id_for(name) or ''), secure_filename(name), 'report.pdf')))
+            archive.writestr(entry_name, future.result())
+            yield stream.drain()
+    yield stream.drain()
+
+@app.route('/reports/students/<string:format_type>')
+def student_reports(format_type):
+    """Per-student progress reports. 'zip' streams one PDF per student; 'pdf' returns one combined document.
+    An optional repeated `student` query parameter limits the reports to those students."""
+    if not session.get('logged_in'): return redirect(url_for('login'))
+    if format_type not in ('zip', 'pdf'):
+        return "Invalid format type", 400
 
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        return jsonify({'error': 'API key is not configured on the server.'}), 500
+    payloads = student_report_payloads(request.args.getlist('student') or None)
+    if not payloads:
+        return "No check-ins to report on.", 404
+
+    filename = f"student_reports_{datetime.now().strftime('%Y_%m_%d')}.{format_type}"
+    if format_type == 'pdf':
+        pdf_output = get_export_pool().submit(render_student_reports, payloads).result()
+        return Response(pdf_output, mimetype='application/pdf', headers={'Content-Disposition': f'attachment;filename={filename}'})
+    return Response(stream_student_reports_zip(payloads), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment;filename={filename}'})
+
+# --- AI Image Preprocessing ---
+# Phone photos of student notes are often several megabytes. Before an image goes to the model it is
+# downscaled to AI_IMAGE_MAX_DIMENSION and re-encoded as JPEG; results are cached by content hash so the
+# same attachment in later chat turns or analyses is not decoded again. The cache is kept under
+# IMAGE_CACHE_MAX_MB by removing the least recently used files.
+AI_IMAGE_MAX_DIMENSION = int(os.getenv('AI_IMAGE_MAX_DIMENSION', 1536))
+AI_IMAGE_JPEG_QUALITY = 85
+IMAGE_CACHE_FOLDER = 'image_cache'
+IMAGE_CACHE_MAX_MB = int(os.getenv('IMAGE_CACHE_MAX_MB', 200))
+CACHE_TEMP_MAX_AGE_SECONDS = 3600
+
+class InvalidAttachmentError(ValueError):
+    """An attachment's data is not valid base64; reported to the client as a 400."""
+
+def decode_attachment(data):
+    try:
+        return base64.b64decode(data, validate=True)
+    except (ValueError, TypeError):  # binascii.Error is a ValueError.
+        raise InvalidAttachmentError("An attached file is not valid base64 data.")
 
-    data = request.get_json()
-    student_name = data.get('studentName')
-    lesson_context = data.get('lessonContext', '')
-    lesson_file_data = data.get('lessonFileData')
-    lesson_mime_type = data.get('lessonMimeType')
-    student_work_file_data = data.get('studentWorkFileData')
-    student_work_mime_type = data.get('studentWorkMimeType')
-    
+def read_cache_file(path):
+    """Returns a cache file's bytes, or None if it is missing, marking it as recently used."""
+    try:
+        with open(path, 'rb') as f:
+            content = f.read()
+    except FileNotFoundError:  # Pruned by another request.
+        return None
+    try: os.utime(path)
+    except OSError: pass
+    return content
+
+def write_cache_file(folder, filename, content, max_mb):
+    """Writes a cache file through a temporary file, so readers never see half of it, then removes the least
+    recently used files while `folder` holds more than `max_mb` megabytes."""
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, filename)
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(content)
+    _replace_file(temp_path, path)
+    entries, total, now = [], 0, time.time()
+    for entry in os.scandir(folder):
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        if entry.name.endswith('.tmp'):
+            if now - stat.st_mtime > CACHE_TEMP_MAX_AGE_SECONDS:  # Left behind by a crashed write.
+                try: os.remove(entry.path)
+                except OSError: pass
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total += stat.st_size
+    for _, size, entry_path in sorted(entries):
+        if total <= max_mb * 1024 * 1024:
+            break
+        if entry_path == path:
+            continue
+        try:
+            os.remove(entry_path)
+            total -= size
+        except OSError:
+            pass
+
+image_metrics_lock = threading.Lock()
+image_metrics = {'images': 0, 'cache_hits': 0, 'bytes_in': 0, 'bytes_out': 0, 'recent_requests': deque(maxlen=50)}
+
+def _downscale_image(raw):
+    Image, ImageOps = deferred_import('PIL.Image'), deferred_import('PIL.ImageOps')
+    with Image.open(BytesIO(raw)) as img:
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((AI_IMAGE_MAX_DIMENSION, AI_IMAGE_MAX_DIMENSION))
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[-1])
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+        output = BytesIO()
+        img.save(output, format='JPEG', quality=AI_IMAGE_JPEG_QUALITY, optimize=True)
+        return output.getvalue()
+
+def prepare_inline_image(data, mime_type):
+    """Returns (base64 data, mime type, cache hit) for an inline attachment, shrinking images where it helps."""
+    # Without Pillow, image attachments are forwarded to the AI unmodified.
+    if not (mime_type or '').startswith('image/') or deferred_import('PIL.ImageOps', optional=True) is None:
+        return data, mime_type, False
+    raw = decode_attachment(data)
+    cache_name = f"{hashlib.blake2b(raw, digest_size=16).hexdigest()}_{AI_IMAGE_MAX_DIMENSION}.jpg"
+    cached = read_cache_file(os.path.join(IMAGE_CACHE_FOLDER, cache_name))
+    if cached is not None:
+        return base64.b64encode(cached).decode('ascii'), 'image/jpeg', True
+    try:
+        processed = _downscale_image(raw)
+    except Exception as e:  # Formats Pillow cannot decode (e.g. HEIC without a plugin) are sent as-is.
+        print(f"Could not preprocess {mime_type} attachment: {e}")
+        return data, mime_type, False
+    if len(processed) >= len(raw):
+        return data, mime_type, False
+    write_cache_file(IMAGE_CACHE_FOLDER, cache_name, processed, IMAGE_CACHE_MAX_MB)
+    return base64.b64encode(processed).decode('ascii'), 'image/jpeg', False
+
+def preprocess_inline_images(contents, endpoint):
+    """Shrinks every inline image in a Gemini `contents` list in place and records the bytes saved."""
+    bytes_in = bytes_out = images = cache_hits = 0
+    for content in contents:
+        for part in content.get('parts', []):
+            inline = part.get('inline_data')
+            if not inline or not (inline.get('mime_type') or '').startswith('image/'):
+                continue
+            before = len(inline['data'])
+            inline['data'], inline['mime_type'], hit = prepare_inline_image(inline['data'], inline['mime_type'])
+            images += 1
+            cache_hits += hit
+            bytes_in += before
+            bytes_out += len(inline['data'])
+    if not images:
+        return
+    with image_metrics_lock:
+        image_metrics['images'] += images
+        image_metrics['cache_hits'] += cache_hits
+        image_metrics['bytes_in'] += bytes_in
+        image_metrics['bytes_out'] += bytes_out
+        image_metrics['recent_requests'].append({'endpoint': endpoint, 'time': datetime.now().isoformat(timespec='seconds'), 'images': images,
+                                                 'bytes_in': bytes_in, 'bytes_out': bytes_out, 'bytes_saved': bytes_in - bytes_out})
+
+@app.route('/api/metrics/images')
+def image_metrics_api():
+    if not session.get('logged_in'): return jsonify({'error': 'Unauthorized'}), 401
+    with image_metrics_lock:
+        metrics = dict(image_metrics, recent_requests=list(image_metrics['recent_requests']))
+    metrics['bytes_saved'] = metrics['bytes_in'] - metrics['bytes_out']
+    return jsonify(metrics)
+
+# --- AI Document Text Extraction ---
+# Office documents and PDFs are converted to plain text once, on the export process pool, and the text is
+# cached by content hash. The model then receives compact text instead of the binary file, and the same
+# handout attached for every student in a class is only parsed the first time. Like the image cache, the
+# text cache is kept under TEXT_CACHE_MAX_MB.
+TEXT_CACHE_FOLDER = 'text_cache'
+TEXT_CACHE_MAX_MB = int(os.getenv('TEXT_CACHE_MAX_MB', 100))
+EXTRACTION_TIMEOUT_SECONDS = 60
+MAX_EXTRACTED_CHARS = 200000
+
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+PPTX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
+ODT_MIMETYPE = 'application/vnd.oasis.opendocument.text'
+EXTRACTABLE_MIMETYPES = {'application/pdf': 'PDF', DOCX_MIMETYPE: 'Word document', PPTX_MIMETYPE: 'PowerPoint presentation', ODT_MIMETYPE: 'OpenDocument text'}
+
+WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+DRAWING_NS = '{http://schemas.openxmlformats.org/drawingml/2006/main}'
+ODF_TEXT_NS = '{urn:oasis:names:tc:opendocument:xmlns:text:1.0}'
+
+def _xml_paragraphs(xml_bytes, paragraph_tag, text_tag=None):
+    root = deferred_import('xml.etree.ElementTree').fromstring(xml_bytes)
+    for paragraph in root.iter(paragraph_tag):
+        text = ''.join(t.text or '' for t in paragraph.iter(text_tag)) if text_tag else ''.join(paragraph.itertext())
+        if text.strip():
+            yield text
+
+def extract_document_text(raw, mime_type):
+    """Returns the plain text of a PDF/DOCX/PPTX/ODT file, or None if it has none. Runs in pool workers."""
+    if mime_type == 'application/pdf':
+        pypdf = deferred_import('pypdf', optional=True)
+        if pypdf is None:  # PDF attachments are then forwarded to the AI as binary.
+            return None
+        pages = [page.extract_text() or '' for page in pypdf.PdfReader(BytesIO(raw)).pages]
+        text = '\n\n'.join(f"[Page {i}]\n{page}" for i, page in enumerate(pages, 1) if page.strip())
+    else:
+        with zipfile.ZipFile(BytesIO(raw)) as document:
+            if mime_type == DOCX_MIMETYPE:
+                text = '\n'.join(_xml_paragraphs(document.read('word/document.xml'), f'{WORD_NS}p', f'{WORD_NS}t'))
+            elif mime_type == PPTX_MIMETYPE:
+                slides = sorted((n for n in document.namelist() if re.fullmatch(r'ppt/slides/slide\d+\.xml', n)),
+                                key=lambda n: int(re.search(r'(\d+)', n).group(1)))
+                text = '\n\n'.join(f"[Slide {i}]\n" + '\n'.join(_xml_paragraphs(document.read(n), f'{DRAWING_NS}p', f'{DRAWING_NS}t'))
+                                   for i, n in enumerate(slides, 1))
+            else:
+                root = deferred_import('xml.etree.ElementTree').fromstring(document.read('content.xml'))
+                text = '\n'.join(''.join(el.itertext()) for el in root.iter()
+                                 if el.tag in (f'{ODF_TEXT_NS}p', f'{ODF_TEXT_NS}h') and ''.join(el.itertext()).strip())
+    return text[:MAX_EXTRACTED_CHARS] if text.strip() else None
+
+def prepare_inline_document(data, mime_type):
+    """Returns a text part replacing an inline document, or None to keep sending the original file."""
+    label = EXTRACTABLE_MIMETYPES.get(mime_type)
+    if label is None:
+        return None
+    raw = decode_attachment(data)
+    cache_name = f"{hashlib.blake2b(raw, digest_size=16).hexdigest()}.txt"
+    cached = read_cache_file(os.path.join(TEXT_CACHE_FOLDER, cache_name))
+    if cached is not None:
+        text = cached.decode('utf-8')
+    else:
+        future = get_export_pool().submit(extract_document_text, raw, mime_type)
+        try:
+            # The wait is bounded whether the pool is busy or the parser hangs on a malformed file.
+            text = future.result(timeout=EXTRACTION_TIMEOUT_SECONDS)
+        except Exception as e:
+            future.cancel()  # Still queued behind other work: don't parse it after the request gave up.
+            print(f"Could not extract text from {label} attachment: {e or type(e).__name__}")
+            return None
+        # An empty cache file records "no extractable text" (e.g. a scanned PDF) so it is not re-parsed.
+        write_cache_file(TEXT_CACHE_FOLDER, cache_name, (text or '').encode('utf-8'), TEXT_CACHE_MAX_MB)
+    if not text:
+        return None
+    return {"text": f"Text extracted from the attached {label}:\n{text}"}
+
+def preprocess_inline_documents(contents):
+    """Replaces extractable inline documents in a Gemini `contents` list with their text, in place."""
+    for content in contents:
+        parts = content.get('parts', [])
+        for i, part in enumerate(parts):
+            inline = part.get('inline_data')
+            if inline and inline.get('mime_type') in EXTRACTABLE_MIMETYPES:
+                parts[i] = prepare_inline_document(inline['data'], inline['mime_type']) or part
+
+# --- Gemini Call Resilience ---
+# Every model call gets a deadline budget that covers all of its retries, including reading the response
+# body. Transient failures (timeouts, connection errors and 5xx) are retried with jittered backoff while the
+# budget lasts, and a per-model circuit breaker makes calls fail fast once a model keeps failing, instead of
+# each request waiting out its full timeout. After BREAKER_RESET_SECONDS one trial call is let through to
+# probe it. A 429 is returned to the caller straight away: retrying it here, or on the fallback model, would
+# spend quota the caller's own rate limiter (e.g. bulk guidance's) has not accounted for.
+GEMINI_MAX_ATTEMPTS = 3
+GEMINI_BACKOFF_SECONDS = 1.0
+GEMINI_CONNECT_TIMEOUT = 5
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 30
+
+class AIUnavailableError(requests.exceptions.RequestException):
+    """Raised without contacting the model when its circuit is open or the deadline is already spent."""
+
+class CircuitBreaker:
+    def __init__(self, threshold, reset_seconds):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.stats = {'calls': 0, 'failures': 0, 'short_circuits': 0, 'times_opened': 0}
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.reset_seconds else 'open'
+
+    def allow(self):
+        """Returns False to short-circuit, 'probe' for the one trial call of a half-open breaker, else True."""
+        with self.lock:
+            if self.opened_at is not None:
+                if self.probing or time.monotonic() - self.opened_at < self.reset_seconds:
+                    self.stats['short_circuits'] += 1
+                    return False
+                self.probing = True
+                self.stats['calls'] += 1
+                return 'probe'
+            self.stats['calls'] += 1
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            self.stats['failures'] += 1
+            if self.probing or (self.opened_at is None and self.consecutive_failures >= self.threshold):
+                self.opened_at = time.monotonic()
+                self.stats['times_opened'] += 1
+            self.probing = False
+
+    def end_probe(self):
+        """Lets the next call probe again if the probe ended without recording a result (e.g. an unreadable body)."""
+        with self.lock:
+            self.probing = False
+
+gemini_breakers = {}
+gemini_breakers_lock = threading.Lock()
+gemini_call_stats = {'calls': 0, 'fallbacks': 0, 'fallback_failures': 0}
+gemini_call_stats_lock = threading.Lock()
+
+def count_gemini_call(stat):
+    with gemini_call_stats_lock:
+        gemini_call_stats[stat] += 1
+
+def gemini_breaker(model):
+    with gemini_breakers_lock:
+        if model not in gemini_breakers:
+            gemini_breakers[model] = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+        return gemini_breakers[model]
+
+def is_transient_error(error):
+    response = getattr(error, 'response', None)
+    return response is None or response.status_code >= 500
+
+def read_json_within(response, deadline):
+    """Reads a streamed response body as JSON, giving up at `deadline` even if the server keeps trickling
+    bytes: requests' read timeout only bounds each socket read, so a watchdog closes the connection."""
+    watchdog = threading.Timer(max(0.0, deadline - time.monotonic()), response.close)
+    watchdog.daemon = True
+    watchdog.start()
+    body = bytearray()
+    try:
+        for chunk in response.iter_content(64 * 1024):
+            body += chunk
+    except Exception as e:
+        if time.monotonic() < deadline:
+            raise
+        raise requests.exceptions.ReadTimeout(f"The response was still arriving when the deadline ran out ({e}).")
+    finally:
+        watchdog.cancel()
+    if time.monotonic() >= deadline:
+        raise requests.exceptions.ReadTimeout("The response was still arriving when the deadline ran out.")
+    return json.loads(bytes(body))
+
+def post_gemini(model, api_key, payload, deadline, limiter=None):
+    """POSTs a generateContent request to `model`, retrying transient errors until `deadline` (monotonic).
+    With a `limiter`, every attempt, retries included, waits for a slot from it."""
+    breaker = gemini_breaker(model)
+    last_error = None
+    for attempt in range(1, GEMINI_MAX_ATTEMPTS + 1):
+        if limiter:
+            limiter.wait()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        allowed = breaker.allow()
+        if not allowed:
+            raise AIUnavailableError(f"{model} is temporarily unavailable after repeated errors.")
+        try:
+            with requests.post(f"{GEMINI_API_BASE}/models/{model}:generateContent?key={api_key}",
+                               headers={'Content-Type': 'application/json'}, json=payload, stream=True,
+                               timeout=(min(GEMINI_CONNECT_TIMEOUT, remaining), remaining)) as response:
+                response.raise_for_status()
+                result = read_json_within(response, deadline)
+        except requests.exceptions.RequestException as e:
+            if not is_transient_error(e):
+                breaker.record_success()  # The model answered; the request was bad or over quota.
+                raise
+            breaker.record_failure()
+            last_error = e
+            delay = random.uniform(0, GEMINI_BACKOFF_SECONDS * 2 ** (attempt - 1))
+            if attempt == GEMINI_MAX_ATTEMPTS or time.monotonic() + delay >= deadline:
+                break
+            time.sleep(delay)
+            continue
+        else:
+            breaker.record_success()
+            return result
+        finally:
+            if allowed == 'probe':
+                breaker.end_probe()
+    raise last_error or AIUnavailableError(f"The deadline for the {model} request ran out.")
+
+@app.route('/api/metrics/ai')
+def ai_metrics_api():
+    if not session.get('logged_in'): return jsonify({'error': 'Unauthorized'}), 401
+    with gemini_breakers_lock:
+        breakers = {model: dict(b.stats, state=b.state, consecutive_failures=b.consecutive_failures) for model, b in gemini_breakers.items()}
+    with gemini_call_stats_lock:
+        stats = dict(gemini_call_stats)
+    stats['fallback_rate'] = round(stats['fallbacks'] / stats['calls'], 4) if stats['calls'] else 0.0
+    return jsonify({'breakers': breakers, **stats})
+
+def gemini_stub_app(argv):
+    """Builds the fault-injecting Gemini API stand-in. Returns (stub app, parsed options); the options are read
+    on every request, so tests can change the faults of a running stub."""
+    parser = argparse.ArgumentParser(prog='python app.py gemini-stub',
+                                     description='Serve a fault-injecting Gemini API stub. Point GEMINI_API_BASE at the printed URL.')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with --status')
+    parser.add_argument('--status', type=int, default=503, help='HTTP status for injected errors')
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds added before every response')
+    parser.add_argument('--hang-rate', type=float, default=0.0, help='fraction of requests that stall for --hang-seconds')
+    parser.add_argument('--hang-seconds', type=float, default=120.0)
+    parser.add_argument('--drip-seconds', type=float, default=0.0, help='pause between each byte of a successful body, to outlast per-read timeouts')
+    parser.add_argument('--garbage-rate', type=float, default=0.0, help='fraction of requests answered 200 with a body that is not JSON')
+    parser.add_argument('--fail-model', action='append', default=[], help='model that always fails (repeatable), e.g. the primary, to force a fallback')
+    args = parser.parse_args(argv)
+    stub = Flask('gemini_stub')
+    counts, counts_lock = defaultdict(int), threading.Lock()
+
+    def injected_fault(model):
+        time.sleep(args.delay)
+        roll = random.random()
+        with counts_lock:
+            counts[f"{model} requests"] += 1
+        if roll < args.hang_rate:
+            time.sleep(args.hang_seconds)
+        if model in args.fail_model or roll < args.hang_rate + args.error_rate:
+            with counts_lock:
+                counts[f"{model} errors"] += 1
+            return jsonify({'error': {'code': args.status, 'message': 'Injected fault'}}), args.status
+        return None
+
+    @stub.route('/v1beta/models/<path:target>', methods=['POST'])
+    def generate_content(target):
+        model = target.partition(':')[0]
+        fault = injected_fault(model)
+        if fault:
+            return fault
+        if random.random() < args.garbage_rate:
+            return '<html>Injected garbage</html>', 200
+        parts = (request.get_json(silent=True) or {}).get('contents', [{}])[-1].get('parts', [{}])
+        prompt = parts[0].get('text', '') if parts else ''
+        body = json.dumps({'candidates': [{'content': {'parts': [{'text': f"[{model} stub] {prompt[:80]}"}]}}]}).encode()
+        if not args.drip_seconds:
+            return stub.response_class(body, mimetype='application/json')
+
+        def drip():
+            for i in range(len(body)):
+                time.sleep(args.drip_seconds)
+                yield body[i:i + 1]
+        return stub.response_class(drip(), mimetype='application/json')
+
+    @stub.route('/v1beta/cachedContents', methods=['POST'])
+    def create_cached_content():
+        return injected_fault('cachedContents') or jsonify({'name': f"cachedContents/stub-{uuid.uuid4().hex[:12]}"})
+
+    @stub.route('/v1beta/cachedContents/<cache_id>', methods=['DELETE'])
+    def delete_cached_content(cache_id):
+        return jsonify({})
+
+    @stub.route('/stub/stats')
+    def stub_stats():
+        with counts_lock:
+            return jsonify(dict(counts))
+
+    return stub, args
+
+def run_gemini_stub(argv):
+    """Entry point for `python app.py gemini-stub`: serves gemini_stub_app, which injects errors, latency, hangs
+    and slow or garbled bodies, so the retry, deadline, circuit breaker and fallback paths can be exercised."""
+    stub, args = gemini_stub_app(argv)
+    print(f"Gemini stub listening; run the app with GEMINI_API_BASE=http://127.0.0.1:{args.port}/v1beta "
+          f"(request and error counts at /stub/stats).")
+    stub.run(host='127.0.0.1', port=args.port, threaded=True)
+
+# --- AI Assistant ---
+# GEMINI_API_BASE can point at a local stub (`python app.py gemini-stub`) to exercise the retry, breaker and fallback paths.
+GEMINI_API_BASE = os.getenv('GEMINI_API_BASE', "https://generativelanguage.googleapis.com/v1beta")
+GEMINI_MODEL = 'gemini-1.5-flash-latest'
+# A lighter model that chat falls back to while the primary model is failing or its circuit is open.
+GEMINI_FALLBACK_MODEL = os.getenv('GEMINI_FALLBACK_MODEL', 'gemini-1.5-flash-8b')
+# Context caching needs a pinned model version; cached lesson material is only usable with that model.
+GEMINI_CACHE_MODEL = 'gemini-1.5-flash-002'
+
+def build_guidance_contents(student_name, lesson_context, lesson_file_data=None, lesson_mime_type=None,
+                            student_work_file_data=None, student_work_mime_type=None, lesson_attached=False):
+    """Builds the Gemini request contents for a guidance plan for a student, or for a general 'Teacher' question.
+    `lesson_attached` marks lesson material supplied separately through a shared lesson context."""
+    has_lesson_material = bool(lesson_file_data or lesson_attached)
     prompt_parts = []
     
     if student_name == "Teacher":
         prompt_parts.append("Act as an expert educational co-pilot and teaching assistant. A teacher has the following general question or request. Provide a helpful, insightful, and actionable response, formatted nicely with Markdown.")
         prompt_parts.append(f"The teacher's request is: '{lesson_context}'")
-        if lesson_file_data:
+        if has_lesson_material:
             prompt_parts.append("They have also provided a file for context. Please analyze it as part of your response:")
         if student_work_file_data:
             prompt_parts.append("A second file was also attached for additional context.")
 
     else:
         # Student-specific analysis with conditional morale
-        all_checkins = load_data(DATA_FILE, [])
-        student_history = sorted([c for c in all_checkins if c.get('name') == student_name], key=lambda x: x['timestamp'], reverse=True)
-        recent_history = student_history[:5]
+        table = load_checkin_table()
+        recent_history = list(table.rows(table.student_indices(student_name)[-5:][::-1]))
         
         # Determine if morale context is relevant
         include_morale_context = False
@@ -1593,31 +5245,30 @@ def generate_guidance_plan():
             include_morale_context = True
         
         if not include_morale_context and recent_history:
-            low_morale_count = sum(1 for c in recent_history if c.get('morale', 10) <= 5)
+            low_morale_count = sum(1 for c in recent_history if c.morale <= 5)
             if low_morale_count >= 2: # Trigger if 2 or more of last 5 are low
                 include_morale_context = True
         
         if not include_morale_context:
-            open_alerts = [a for a in load_data(ALERTS_FILE, []) if a.get('status') == 'open']
-            if any(alert['title'].endswith(f"for {student_name}") and alert['type'] == 'morale' for alert in open_alerts):
+            if any('morale' in (alert['type'], alert.get('metric')) for alert in get_open_alerts_for_student(student_name)):
                 include_morale_context = True
 
         prompt_parts.append(f"Act as an expert educational coach and a data analyst. You are analyzing a student named {student_name}.")
 
         if include_morale_context:
-            history_str = "\\n".join([f"- On {c['timestamp'][:10]}: Morale={c['morale']}, Understanding={c['understanding']}" for c in recent_history])
+            history_str = "\\n".join([f"- On {c.date_friendly}: Morale={c.morale}, Understanding={c.understanding}" for c in recent_history])
             if history_str:
                 prompt_parts.append(f"Their recent check-in history is:\\n{history_str}")
             prompt_parts.append("Note: This student's morale is a relevant factor for this analysis. Please factor their well-being into your assessment and recommendations, offering empathetic advice where appropriate.")
         else:
             # Morale is not a concern, focus only on understanding
-            understanding_history_str = "\\n".join([f"- On {c['timestamp'][:10]}: Understanding={c['understanding']}" for c in recent_history])
+            understanding_history_str = "\\n".join([f"- On {c.date_friendly}: Understanding={c.understanding}" for c in recent_history])
             if understanding_history_str:
                 prompt_parts.append(f"Their recent academic understanding scores are:\\n{understanding_history_str}")
         
         prompt_parts.append(f"The instructor's primary request or lesson context is: '{lesson_context}'")
 
-        if lesson_file_data:
+        if has_lesson_material:
              prompt_parts.append("The instructor has attached the lesson plan or related material for context. Please analyze it.")
         if student_work_file_data:
             prompt_parts.append("The instructor has also attached the student's work. Please analyze it to gauge proficiency, effort, and ambition.")
@@ -1633,39 +5284,237 @@ def generate_guidance_plan():
     if student_work_file_data and student_work_mime_type:
         contents[0]['parts'].append({"inline_data": {"mime_type": student_work_mime_type, "data": student_work_file_data}})
 
+    return contents
+
+def call_gemini(api_key, contents, timeout, cached_content=None, fallback_model=None, limiter=None):
+    """Calls the model within a `timeout`-second budget, optionally retrying on `fallback_model` if it fails.
+    `limiter`, if given, paces every HTTP attempt (see post_gemini)."""
+    deadline = time.monotonic() + timeout
     payload = {"contents": contents}
-    api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash-latest:generateContent?key={api_key}"
-    headers = {'Content-Type': 'application/json'}
+    model = GEMINI_MODEL
+    if cached_content:
+        payload['cachedContent'] = cached_content
+        model = GEMINI_CACHE_MODEL
+    count_gemini_call('calls')
+    # Keep a third of the budget in reserve so a hung primary still leaves time for the fallback.
+    primary_deadline = deadline - timeout / 3 if fallback_model and not cached_content else deadline
+    try:
+        return post_gemini(model, api_key, payload, primary_deadline, limiter)
+    except requests.exceptions.RequestException as e:
+        if not fallback_model or cached_content or not is_transient_error(e):
+            raise
+        print(f"{model} failed ({e}); falling back to {fallback_model}.")
+        count_gemini_call('fallbacks')
+        try:
+            return post_gemini(fallback_model, api_key, payload, deadline, limiter)
+        except requests.exceptions.RequestException:
+            count_gemini_call('fallback_failures')
+            raise
+
+def plan_from_response(result):
+    """Returns (plan, error message) for a generateContent response."""
+    if 'candidates' in result and result['candidates'][0].get('content', {}).get('parts', [{}])[0].get('text'):
+        return result['candidates'][0]['content']['parts'][0]['text'], None
+    if result.get('candidates') and result['candidates'][0].get('finishReason') == 'SAFETY':
+        return None, 'The response was blocked for safety reasons. Please adjust your prompt.'
+    print("AI Response Error. Full Response:", result)
+    return None, 'The AI assistant returned an empty or invalid response.'
+
+# --- Shared Lesson Contexts ---
+# A lesson (text plus an optional file) is registered once and referenced by id across many student
+# analyses. The file is uploaded to Gemini's context cache when possible; if caching is unavailable
+# (e.g. the material is below the model's minimum cache size), a one-off summary is sent as text instead.
+LESSON_CONTEXTS_FILE = 'lesson_contexts.json'
+LESSON_CONTEXTS_FOLDER = 'lesson_contexts'
+LESSON_CACHE_TTL_SECONDS = 3600
+
+lesson_lock = ProcessLock('lesson_contexts')
+lesson_cache_locks = {}
+lesson_cache_locks_lock = threading.Lock()
+
+def get_lesson_context(context_id):
+    return load_data(LESSON_CONTEXTS_FILE, {}).get(context_id)
+
+def lesson_cache_lock(context_id):
+    """Serializes cache creation per lesson across threads and worker processes, so concurrent requests
+    share one cachedContents entry instead of each creating (and leaking) their own."""
+    with lesson_cache_locks_lock:
+        if context_id not in lesson_cache_locks:
+            lesson_cache_locks[context_id] = ProcessLock(f"lesson_cache_{secure_filename(context_id)}")
+        return lesson_cache_locks[context_id]
+
+def combined_lesson_context(typed_context, lesson):
+    """The saved lesson's notes followed by anything the instructor typed for this request."""
+    return '\n\n'.join(text for text in ((lesson or {}).get('text', ''), typed_context or '') if text.strip())
+
+def _update_lesson_context(context_id, **fields):
+    with lesson_lock:
+        contexts = load_data(LESSON_CONTEXTS_FILE, {})
+        if context_id in contexts:
+            contexts[context_id].update(fields)
+            save_data(LESSON_CONTEXTS_FILE, contexts)
+            return contexts[context_id]
+
+def _lesson_file_part(lesson):
+    with open(os.path.join(LESSON_CONTEXTS_FOLDER, lesson['id']), 'rb') as f:
+        data, mime_type, _ = prepare_inline_image(base64.b64encode(f.read()).decode('ascii'), lesson['mime_type'])
+    return prepare_inline_document(data, mime_type) or {"inline_data": {"mime_type": mime_type, "data": data}}
+
+def _create_lesson_cache(api_key, lesson):
+    payload = {"model": f"models/{GEMINI_CACHE_MODEL}", "ttl": f"{LESSON_CACHE_TTL_SECONDS}s",
+               "contents": [{"role": "user", "parts": [{"text": "Lesson material provided by the instructor:"}, _lesson_file_part(lesson)]}]}
+    response = requests.post(f"{GEMINI_API_BASE}/cachedContents?key={api_key}", json=payload, timeout=60)
+    response.raise_for_status()
+    # Expire our reference a minute early so we never send a cache name the server just dropped.
+    return _update_lesson_context(lesson['id'], cache_name=response.json()['name'],
+                                  cache_expires=time.time() + LESSON_CACHE_TTL_SECONDS - 60)
+
+def _summarize_lesson(api_key, lesson, limiter=None):
+    contents = [{"parts": [{"text": "Summarize this lesson material for a teaching assistant who will use it to assess many students. "
+                                    "Keep the learning objectives, key concepts, examples, exercises and any assessment criteria."},
+                           _lesson_file_part(lesson)]}]
+    summary, error = plan_from_response(call_gemini(api_key, contents, timeout=90, limiter=limiter))
+    if error:
+        raise ValueError(error)
+    return _update_lesson_context(lesson['id'], summary=summary)
+
+def prepare_lesson_context(api_key, lesson, contents, limiter=None):
+    """Attaches a shared lesson's material to `contents`. Returns the cached content name to send, if any."""
+    if not lesson.get('has_file'):
+        return None
+    if not _lesson_material_ready(lesson):
+        with lesson_cache_lock(lesson['id']):
+            # Another request may have created the cache or summary while this one waited.
+            lesson = get_lesson_context(lesson['id']) or lesson
+            if not lesson.get('cache_unsupported') and not _lesson_material_ready(lesson):
+                try:
+                    lesson = _create_lesson_cache(api_key, lesson)
+                except requests.exceptions.RequestException as e:
+                    print(f"Context caching unavailable for lesson {lesson['id']}, using a summary instead: {e}")
+                    lesson = _update_lesson_context(lesson['id'], cache_unsupported=True, cache_name=None)
+            if lesson.get('cache_unsupported') and not lesson.get('summary'):
+                lesson = _summarize_lesson(api_key, lesson, limiter)
+    if not lesson.get('cache_unsupported'):
+        return lesson['cache_name']
+    contents[0]['parts'].append({"text": f"Summary of the attached lesson material:\n{lesson['summary']}"})
+    return None
+
+def _lesson_material_ready(lesson):
+    if lesson.get('cache_unsupported'):
+        return bool(lesson.get('summary'))
+    return bool(lesson.get('cache_name')) and lesson.get('cache_expires', 0) > time.time()
+
+def call_gemini_with_lesson(api_key, contents, lesson, timeout, limiter=None):
+    if lesson is None:
+        return call_gemini(api_key, contents, timeout, limiter=limiter)
+    cached_content = prepare_lesson_context(api_key, lesson, contents, limiter)
+    try:
+        return call_gemini(api_key, contents, timeout, cached_content=cached_content, limiter=limiter)
+    except requests.exceptions.HTTPError as e:
+        if not cached_content or e.response is None or e.response.status_code not in (400, 403, 404):
+            raise
+        # The cache was evicted or rejected server-side; fall back to the summary for this and later requests.
+        lesson = _update_lesson_context(lesson['id'], cache_unsupported=True, cache_name=None)
+        return call_gemini(api_key, contents, timeout, cached_content=prepare_lesson_context(api_key, lesson, contents, limiter), limiter=limiter)
+
+@app.route('/api/lesson_contexts', methods=['GET', 'POST'])
+def lesson_contexts_api():
+    if not session.get('logged_in'): return jsonify({'error': 'Unauthorized'}), 401
+    if request.method == 'GET':
+        contexts = load_data(LESSON_CONTEXTS_FILE, {})
+        return jsonify([{k: c.get(k) for k in ('id', 'title', 'text', 'has_file', 'created_by', 'created_on')} for c in contexts.values()])
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object.'}), 400
+    title = data.get('title') or ''
+    if not isinstance(title, str) or not title.strip():
+        return jsonify({'error': 'A lesson title is required.'}), 400
+    title = title.strip()
+    if not isinstance(data.get('text') or '', str):
+        return jsonify({'error': 'Lesson text must be a string.'}), 400
+    if not data.get('text') and not data.get('fileData'):
+        return jsonify({'error': 'Provide lesson text, a lesson file, or both.'}), 400
+    raw = None
+    if data.get('fileData'):
+        if not isinstance(data.get('mimeType'), str) or not data['mimeType']:
+            return jsonify({'error': 'A lesson file needs its mimeType.'}), 400
+        try:
+            raw = decode_attachment(data['fileData'])
+        except InvalidAttachmentError as e:
+            return jsonify({'error': str(e)}), 400
+
+    lesson = {'id': str(uuid.uuid4()), 'title': title, 'text': data.get('text', ''), 'has_file': bool(data.get('fileData')),
+              'mime_type': data.get('mimeType'), 'created_by': session.get('user_email'),
+              'created_on': datetime.now().strftime('%Y-%m-%d %H:%M')}
+    if lesson['has_file']:
+        os.makedirs(LESSON_CONTEXTS_FOLDER, exist_ok=True)
+        with open(os.path.join(LESSON_CONTEXTS_FOLDER, lesson['id']), 'wb') as f:
+            f.write(raw)
+    with lesson_lock:
+        contexts = load_data(LESSON_CONTEXTS_FILE, {})
+        contexts[lesson['id']] = lesson
+        save_data(LESSON_CONTEXTS_FILE, contexts)
+    return jsonify({'id': lesson['id'], 'title': title}), 201
+
+@app.route('/api/lesson_contexts/<string:context_id>', methods=['DELETE'])
+def delete_lesson_context(context_id):
+    if not session.get('logged_in'): return jsonify({'error': 'Unauthorized'}), 401
+    with lesson_lock:
+        contexts = load_data(LESSON_CONTEXTS_FILE, {})
+        lesson = contexts.pop(context_id, None)
+        if lesson is None:
+            return jsonify({'error': 'Lesson context not found.'}), 404
+        save_data(LESSON_CONTEXTS_FILE, contexts)
+    if lesson.get('has_file'):
+        os.remove(os.path.join(LESSON_CONTEXTS_FOLDER, context_id))
+    api_key = os.getenv("GEMINI_API_KEY")
+    if lesson.get('cache_name') and api_key:
+        try:
+            requests.delete(f"{GEMINI_API_BASE}/{lesson['cache_name']}?key={api_key}", timeout=15)
+        except requests.exceptions.RequestException as e:
+            print(f"Could not delete cached content {lesson['cache_name']}: {e}")
+    return jsonify({'success': True})
+
+def run_generate_plan(data):
+    """Generates a guidance plan for an /api/generate_plan payload. Returns (response body, status code)."""
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        return {'error': 'API key is not configured on the server.'}, 500
+
+    lesson = None
+    if data.get('lessonContextId'):
+        lesson = get_lesson_context(data['lessonContextId'])
+        if lesson is None:
+            return {'error': 'The selected lesson context no longer exists.'}, 404
+    lesson_context = combined_lesson_context(data.get('lessonContext', ''), lesson)
+    contents = build_guidance_contents(data.get('studentName'), lesson_context,
+                                       data.get('lessonFileData'), data.get('lessonMimeType'),
+                                       data.get('studentWorkFileData'), data.get('studentWorkMimeType'),
+                                       lesson_attached=bool(lesson and lesson.get('has_file')))
 
     try:
-        response = requests.post(api_url, headers=headers, json=payload, timeout=60)
-        response.raise_for_status()
-        result = response.json()
-        
-        if 'candidates' in result and result['candidates'][0].get('content', {}).get('parts', [{}])[0].get('text'):
-            plan = result['candidates'][0]['content']['parts'][0]['text']
-            return jsonify({'plan': plan})
-        else:
-            if result.get('candidates') and result['candidates'][0].get('finishReason') == 'SAFETY':
-                 return jsonify({'error': 'The response was blocked for safety reasons. Please adjust your prompt.'}), 500
-            print("AI Response Error. Full Response:", result)
-            return jsonify({'error': 'The AI assistant returned an empty or invalid response.'}), 500
+        preprocess_inline_images(contents, 'generate_plan')
+        preprocess_inline_documents(contents)
+    except InvalidAttachmentError as e:
+        return {'error': str(e)}, 400
+    try:
+        plan, error = plan_from_response(call_gemini_with_lesson(api_key, contents, lesson, timeout=60))
+        if error:
+            return {'error': error}, 500
+        return {'plan': plan}, 200
 
     except requests.exceptions.RequestException as e:
-        return jsonify({'error': f'Failed to communicate with the AI assistant: {e}'}), 500
-    except (KeyError, IndexError) as e:
-        return jsonify({'error': f'Could not parse the response from the AI assistant: {e}'}), 500
-
-@app.route('/api/chat', methods=['POST'])
-def handle_ai_chat():
-    if not session.get('logged_in'):
-        return jsonify({'error': 'Unauthorized'}), 401
+        return {'error': f'Failed to communicate with the AI assistant: {e}'}, 500
+    except (KeyError, IndexError, ValueError) as e:
+        return {'error': f'Could not parse the response from the AI assistant: {e}'}, 500
 
+def run_chat(data):
+    """Answers an /api/chat payload. Returns (response body, status code)."""
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
-        return jsonify({'error': 'API key not configured on server.'}), 500
+        return {'error': 'API key not configured on server.'}, 500
     
-    data = request.json
     user_message = data.get('message')
     history = data.get('history', [])
     file_data = data.get('fileData')
@@ -1678,25 +5527,500 @@ def handle_ai_chat():
         user_turn_parts.append({"inline_data": {"mime_type": mime_type, "data": file_data}})
     
     contents = history + [{"role": "user", "parts": user_turn_parts}]
-    
-    payload = {"contents": contents}
-    api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash-latest:generateContent?key={api_key}"
-    headers = {'Content-Type': 'application/json'}
+    try:
+        preprocess_inline_images(contents, 'chat')
+        preprocess_inline_documents(contents)
+    except InvalidAttachmentError as e:
+        return {'error': str(e)}, 400
     
     try:
-        response = requests.post(api_url, headers=headers, json=payload, timeout=45)
-        response.raise_for_status()
-        result = response.json()
+        result = call_gemini(api_key, contents, timeout=45, fallback_model=GEMINI_FALLBACK_MODEL)
         reply = result['candidates'][0]['content']['parts'][0]['text']
-        return jsonify({'reply': reply})
+        return {'reply': reply}, 200
     except Exception as e:
         print(f"Chat API Error: {e}")
-        return jsonify({'error': 'Failed to get a response from the AI assistant.'}), 500
+        return {'error': 'Failed to get a response from the AI assistant.'}, 500
+
+@app.route('/api/generate_plan', methods=['POST'])
+def generate_guidance_plan():
+    if not session.get('logged_in'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    data = request.get_json()
+    if data.get('async'):
+        return enqueue_ai_job('generate_plan', data)
+    body, status = run_generate_plan(data)
+    return jsonify(body), status
+
+@app.route('/api/chat', methods=['POST'])
+def handle_ai_chat():
+    if not session.get('logged_in'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    data = request.json
+    if data.get('async'):
+        return enqueue_ai_job('chat', data)
+    body, status = run_chat(data)
+    return jsonify(body), status
+
+# --- AI Job Queue ---
+# With `async: true` in the payload, the AI endpoints persist the request as a job and return its id at
+# once. Background workers run jobs in order and write the result to the job file, so a slow model call
+# does not hold a web request open and the result is still there if the browser disconnects. Jobs left
+# queued or running when the server stopped are picked up again on the next start.
+AI_JOBS_FOLDER = 'ai_jobs'
+AI_JOB_CLAIMS_FOLDER = os.path.join(AI_JOBS_FOLDER, 'claims')
+AI_QUEUE_WORKERS = 2
+AI_JOB_RETENTION_DAYS = 7
+
+ai_job_queue = queue.Queue()
+ai_workers_lock = threading.Lock()
+ai_workers_started = False
+ai_jobs_in_flight = {'count': 0}
+ai_jobs_recovery_lock = ProcessLock('ai_jobs')
+
+def ai_job_path(job_id):
+    return os.path.join(AI_JOBS_FOLDER, f"{job_id}.json")
+
+def ai_job_claim_path(job_id):
+    return os.path.join(AI_JOB_CLAIMS_FOLDER, job_id)
+
+def process_alive(pid):
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        return True  # Windows serves from a single waitress process, so a claim there is only stale across runs.
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def job_owner():
+    """Identifies this worker process in this server run, for work other processes may need to recover."""
+    return f"{serve_state['run_id']} {os.getpid()}"
+
+def job_owner_is_gone(owner):
+    """True if `owner` (see job_owner) is from an earlier server run, or a worker process that has since died
+    (gunicorn forks every worker from one master, so they all share the run id)."""
+    run_id, _, pid = (owner or '').partition(' ')
+    return run_id != serve_state['run_id'] or not pid.isdigit() or not process_alive(int(pid))
+
+def ai_job_claim_is_stale(claim_path):
+    try:
+        with open(claim_path, 'r') as f:
+            return job_owner_is_gone(f.read())
+    except FileNotFoundError:
+        return False
+
+def remove_stale_ai_job_claim(job_id):
+    """Removes the job's claim if its owner is gone. Returns True if it did."""
+    with ai_jobs_recovery_lock:
+        claim_path = ai_job_claim_path(job_id)
+        if not ai_job_claim_is_stale(claim_path):
+            return False
+        try:
+            os.remove(claim_path)
+        except FileNotFoundError:
+            return False
+        return True
+
+def _claim_ai_job(job_id):
+    """Atomically claims a job for this worker process, so that only one process executes it."""
+    os.makedirs(AI_JOB_CLAIMS_FOLDER, exist_ok=True)
+    try:
+        fd = os.open(ai_job_claim_path(job_id), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, 'w') as f:
+        f.write(job_owner())
+    return True
+
+def ai_job_handlers():
+    return {'generate_plan': run_generate_plan, 'chat': run_chat}
+
+def _process_ai_job(job_id):
+    job = load_data(ai_job_path(job_id), None)
+    if job is None or job['status'] not in ('queued', 'running'):
+        return
+    if not _claim_ai_job(job_id) and not (remove_stale_ai_job_claim(job_id) and _claim_ai_job(job_id)):
+        return
+    try:
+        # Another process may have finished the job between the read above and the claim.
+        job = load_data(ai_job_path(job_id), None)
+        if job is not None and job['status'] in ('queued', 'running'):
+            _run_ai_job(job)
+    finally:
+        try:
+            os.remove(ai_job_claim_path(job_id))
+        except FileNotFoundError:
+            pass  # Already released, e.g. by a process that took this one for a dead worker.
+
+def _run_ai_job(job):
+    job_id = job['id']
+    job.update(status='running', started_on=datetime.now().isoformat(timespec='seconds'))
+    save_data(ai_job_path(job_id), job)
+    try:
+        body, status_code = ai_job_handlers()[job['kind']](job['payload'])
+    except Exception as e:
+        print(f"AI job {job_id} failed: {e}")
+        body, status_code = {'error': f'The AI request failed: {e}'}, 500
+    # The payload can hold large attachments; it is only needed until the job has run.
+    job.update(status='done' if status_code < 400 else 'failed', result=body, status_code=status_code,
+               payload=None, finished_on=datetime.now().isoformat(timespec='seconds'))
+    save_data(ai_job_path(job_id), job)
+
+def _ai_worker():
+    while True:
+        job_id = ai_job_queue.get()
+        try:
+            # While shutting down, queued jobs stay on disk for the next start instead of being begun here.
+            if not serve_state['draining']:
+                with ai_workers_lock:
+                    ai_jobs_in_flight['count'] += 1
+                try:
+                    _process_ai_job(job_id)
+                finally:
+                    with ai_workers_lock:
+                        ai_jobs_in_flight['count'] -= 1
+        finally:
+            ai_job_queue.task_done()
+
+def start_ai_workers():
+    """Starts the worker threads once, re-queueing unfinished jobs and pruning old finished ones."""
+    global ai_workers_started
+    with ai_workers_lock:
+        if ai_workers_started:
+            return
+        ai_workers_started = True
+        os.makedirs(AI_JOB_CLAIMS_FOLDER, exist_ok=True)
+        cutoff = time.time() - AI_JOB_RETENTION_DAYS * 86400
+        pending = []
+        with ai_jobs_recovery_lock:
+            for filename in os.listdir(AI_JOBS_FOLDER):
+                path = os.path.join(AI_JOBS_FOLDER, filename)
+                job = load_data(path, None) if filename.endswith('.json') else None
+                if job is None:
+                    continue
+                if job['status'] in ('queued', 'running'):
+                    pending.append((job['created_on'], job['id']))
+                    # A claim left by an earlier server run, or by a worker that was killed, is released.
+                    claim_path = ai_job_claim_path(job['id'])
+                    if ai_job_claim_is_stale(claim_path):
+                        os.remove(claim_path)
+                elif os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+        for _, job_id in sorted(pending):
+            ai_job_queue.put(job_id)
+        for _ in range(AI_QUEUE_WORKERS):
+            threading.Thread(target=_ai_worker, daemon=True).start()
+
+def enqueue_ai_job(kind, data):
+    if serve_state['draining']:
+        return jsonify({'error': 'The server is restarting. Please try again in a moment.'}), 503
+    start_ai_workers()
+    job = {'id': str(uuid.uuid4()), 'kind': kind, 'status': 'queued', 'requested_by': session.get('user_email'),
+           'created_on': datetime.now().isoformat(timespec='seconds'), 'payload': {k: v for k, v in data.items() if k != 'async'}}
+    save_data(ai_job_path(job['id']), job)
+    ai_job_queue.put(job['id'])
+    return jsonify({'job_id': job['id'], 'status': 'queued', 'status_url': url_for('ai_job_status', job_id=job['id'])}), 202
+
+@app.route('/api/ai_jobs/<string:job_id>')
+def ai_job_status(job_id):
+    if not session.get('logged_in'): return jsonify({'error': 'Unauthorized'}), 401
+    job = load_data(ai_job_path(secure_filename(job_id)), None)
+    if job is None:
+        return jsonify({'error': 'Unknown AI job.'}), 404
+    return jsonify({k: v for k, v in job.items() if k != 'payload'})
+
+# --- Bulk Guidance Jobs ---
+# Generates guidance plans for many students at once (by default everyone with an open alert). Requests
+# go through a small thread pool and a rate limiter shared by every worker process, so a class-sized batch
+# stays inside the API's per-minute quota; throttled or failed calls are retried with exponential backoff.
+# A job runs on a thread of the process that started it; if that process dies, the job is marked failed.
+GUIDANCE_PLANS_FILE = 'guidance_plans.json'
+GUIDANCE_JOBS_FOLDER = 'guidance_jobs'
+GUIDANCE_WORKERS = 4
+GUIDANCE_REQUESTS_PER_MINUTE = int(os.getenv('GUIDANCE_REQUESTS_PER_MINUTE', 10))
+GUIDANCE_MAX_ATTEMPTS = 4
+GUIDANCE_BACKOFF_SECONDS = 5
+
+class RateLimiter:
+    """Spaces calls evenly so that no more than `per_minute` start in any minute, across all worker processes:
+    the next free slot (wall-clock time) is kept in a file next to the locks, guarded by a ProcessLock."""
+    def __init__(self, name, per_minute):
+        self.interval = 60.0 / max(per_minute, 1)
+        self.lock = ProcessLock(f"{name}_rate")
+        self.path = os.path.join(LOCKS_FOLDER, f"{name}_rate.json")
+
+    def wait(self):
+        with self.lock:
+            now = time.time()
+            next_slot = load_data(self.path, {}).get('next_slot', 0.0)
+            # A slot over an hour away is left from a clock that was set back, not from queued callers.
+            slot = now if next_slot > now + 3600 else max(now, next_slot)
+            save_data(self.path, {'next_slot': slot + self.interval})
+        time.sleep(max(0.0, slot - now))
+
+guidance_rate_limiter = RateLimiter('guidance', GUIDANCE_REQUESTS_PER_MINUTE)
+guidance_lock = ProcessLock('guidance_plans')
+
+def request_plan_with_retry(api_key, contents, lesson=None):
+    """Returns (plan, error, attempts). Retries on 429, 5xx and connection errors."""
+    for attempt in range(1, GUIDANCE_MAX_ATTEMPTS + 1):
+        try:
+            # The limiter paces every HTTP attempt inside the call too, so retries stay within the budget.
+            plan, error = plan_from_response(call_gemini_with_lesson(api_key, [dict(c, parts=list(c['parts'])) for c in contents], lesson,
+                                                                     timeout=60, limiter=guidance_rate_limiter))
+            return plan, error, attempt
+        except requests.exceptions.RequestException as e:
+            response = getattr(e, 'response', None)
+            retryable = response is None or response.status_code == 429 or response.status_code >= 500
+            if not retryable or attempt == GUIDANCE_MAX_ATTEMPTS:
+                return None, f'Failed to communicate with the AI assistant: {e}', attempt
+            retry_after = response.headers.get('Retry-After', '') if response is not None else ''
+            delay = int(retry_after) if retry_after.isdigit() else GUIDANCE_BACKOFF_SECONDS * 2 ** (attempt - 1)
+            print(f"Guidance request failed ({e}); retrying in {delay}s.")
+            time.sleep(delay)
+        except (KeyError, IndexError, ValueError) as e:
+            return None, f'Could not parse the response from the AI assistant: {e}', attempt
+
+def guidance_job_path(job_id):
+    return os.path.join(GUIDANCE_JOBS_FOLDER, f"{job_id}.json")
+
+def _update_guidance_job(job, student_name, **fields):
+    with guidance_lock:
+        job['students'][student_name].update(fields)
+        job['done'] = sum(1 for s in job['students'].values() if s['status'] in ('done', 'failed'))
+        save_data(guidance_job_path(job['id']), job)
+
+def _save_guidance_plan(student_name, record):
+    with guidance_lock:
+        plans = load_data(GUIDANCE_PLANS_FILE, {})
+        plans[student_name] = record
+        save_data(GUIDANCE_PLANS_FILE, plans)
+
+def generate_plan_for_job(job, api_key, student_name):
+    _update_guidance_job(job, student_name, status='running')
+    lesson = get_lesson_context(job['lesson_context_id']) if job.get('lesson_context_id') else None
+    contents = build_guidance_contents(student_name, combined_lesson_context(job['lesson_context'], lesson),
+                                       lesson_attached=bool(lesson and lesson.get('has_file')))
+    plan, error, attempts = request_plan_with_retry(api_key, contents, lesson)
+    if error:
+        _update_guidance_job(job, student_name, status='failed', error=error, attempts=attempts)
+        return
+    _save_guidance_plan(student_name, {'plan': plan, 'lesson_context': job['lesson_context'], 'job_id': job['id'],
+                                       'generated_by': job['requested_by'],
+                                       'generated_on': datetime.now().strftime('%Y-%m-%d %H:%M')})
+    _update_guidance_job(job, student_name, status='done', attempts=attempts)
+
+def run_guidance_job(job, api_key):
+    status = 'failed'
+    try:
+        with deferred_import('concurrent.futures').ThreadPoolExecutor(max_workers=GUIDANCE_WORKERS) as pool:
+            futures = {pool.submit(generate_plan_for_job, job, api_key, name): name for name in job['students']}
+            for future, name in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Guidance for {name} in job {job['id']} failed: {e}")
+                    _update_guidance_job(job, name, status='failed', error=f'Guidance could not be generated: {e}')
+        status = 'done'
+    finally:
+        # Always written, so the dashboard's polling ends even if the job itself broke.
+        with guidance_lock:
+            job['status'] = status
+            job['finished_on'] = datetime.now().isoformat(timespec='seconds')
+            save_data(guidance_job_path(job['id']), job)
+
+def fail_orphaned_guidance_job(job):
+    """Marks a running job failed if the process running it is gone. The caller must hold guidance_lock."""
+    if job.get('status') != 'running' or not job_owner_is_gone(job.get('owner')):
+        return False
+    for student in job['students'].values():
+        if student['status'] not in ('done', 'failed'):
+            student.update(status='failed', error='Interrupted when the server restarted; start the job again.')
+    job.update(status='failed', done=len(job['students']), finished_on=datetime.now().isoformat(timespec='seconds'))
+    save_data(guidance_job_path(job['id']), job)
+    return True
+
+def fail_orphaned_guidance_jobs():
+    """Startup recovery: bulk jobs run on threads of the process that started them, so none survive it."""
+    if not os.path.isdir(GUIDANCE_JOBS_FOLDER):
+        return
+    with guidance_lock:
+        for filename in os.listdir(GUIDANCE_JOBS_FOLDER):
+            job = load_data(os.path.join(GUIDANCE_JOBS_FOLDER, filename), None) if filename.endswith('.json') else None
+            if job and fail_orphaned_guidance_job(job):
+                print(f"Bulk guidance job {job['id']} was interrupted; marked failed.")
+
+@app.route('/api/guidance/bulk', methods=['POST'])
+def start_bulk_guidance():
+    """Starts a bulk guidance job for `students`, defaulting to every student with an open alert."""
+    if not session.get('logged_in'): return jsonify({'error': 'Unauthorized'}), 401
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        return jsonify({'error': 'API key is not configured on the server.'}), 500
+
+    data = request.get_json(silent=True) or {}
+    students = data.get('students') or sorted({alert_student(a) for a in get_open_alerts()} - {None})
+    if not students:
+        return jsonify({'error': 'No students to generate guidance for.'}), 400
+
+    if data.get('lessonContextId') and get_lesson_context(data['lessonContextId']) is None:
+        return jsonify({'error': 'The selected lesson context no longer exists.'}), 404
+
+    os.makedirs(GUIDANCE_JOBS_FOLDER, exist_ok=True)
+    job = {'id': str(uuid.uuid4()), 'status': 'running', 'owner': job_owner(), 'lesson_context': data.get('lessonContext', ''),
+           'lesson_context_id': data.get('lessonContextId'),
+           'requested_by': session.get('user_email'), 'requested_on': datetime.now().isoformat(timespec='seconds'),
+           'total': len(students), 'done': 0, 'students': {name: {'status': 'pending'} for name in students}}
+    save_data(guidance_job_path(job['id']), job)
+    threading.Thread(target=run_guidance_job, args=(job, api_key), daemon=True).start()
+    return jsonify({'job_id': job['id'], 'total': job['total']}), 202
+
+@app.route('/api/guidance/bulk/<string:job_id>')
+def bulk_guidance_status(job_id):
+    if not session.get('logged_in'): return jsonify({'error': 'Unauthorized'}), 401
+    with guidance_lock:
+        job = load_data(guidance_job_path(secure_filename(job_id)), None)
+        if job is None:
+            return jsonify({'error': 'Unknown guidance job.'}), 404
+        fail_orphaned_guidance_job(job)  # Its worker process died while this server kept running.
+    return jsonify(job)
+
+@app.route('/api/guidance/plans')
+def get_guidance_plans():
+    if not session.get('logged_in'): return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(load_data(GUIDANCE_PLANS_FILE, {}))
+
+# --- Production Serving ---
+# `python app.py serve` runs the app under gunicorn with several preforked worker processes (or a single
+# waitress process where gunicorn is unavailable, e.g. on Windows). Shared state lives in the data files:
+# writes are atomic and guarded by ProcessLock, and in-memory caches reload when a file's signature changes.
+DEV_SECRET_KEY = 'a-super-secret-key-for-development-only-please-change-it'
+LIVE_RESERVED_THREADS = int(os.getenv('LIVE_RESERVED_THREADS', 8))
+
+def drain_background_work(timeout):
+    """Stops taking AI jobs and waits up to `timeout` seconds for running ones."""
+    serve_state['draining'] = True
+    deadline = time.monotonic() + timeout
+    while ai_jobs_in_flight['count'] and time.monotonic() < deadline:
+        time.sleep(0.2)
+    if ai_jobs_in_flight['count']:
+        print(f"Shutting down with {ai_jobs_in_flight['count']} AI job(s) still running; they will be retried on the next start.")
+
+@app.route('/healthz')
+def healthz():
+    return jsonify({'status': 'ok', 'pid': os.getpid()})
+
+@app.route('/readyz')
+def readyz():
+    checks = {
+        'data_folder_writable': os.access('.', os.W_OK) and os.access(UPLOAD_FOLDER, os.W_OK),
+        'users_configured': os.path.exists(USERS_FILE),
+        'ai_workers_running': ai_workers_started,
+        'accepting_work': not serve_state['draining'],
+    }
+    try:
+        load_checkin_table()
+        checks['checkins_loadable'] = True
+    except Exception as e:
+        print(f"Readiness check could not load check-ins: {e}")
+        checks['checkins_loadable'] = False
+    ready = all(checks.values())
+    return jsonify({'ready': ready, 'checks': checks, 'pid': os.getpid()}), 200 if ready else 503
+
+@app.route('/api/metrics/startup')
+def startup_metrics_api():
+    if not session.get('logged_in'): return jsonify({'error': 'Unauthorized'}), 401
+    with deferred_import_lock:
+        deferred = dict(startup_report['deferred_imports'])
+    # In a gunicorn worker the import happened once in the master, before the fork.
+    return jsonify({'pid': os.getpid(), 'import_ms': startup_report['import_ms'], 'budget_ms': STARTUP_BUDGET_MS,
+                    'import_in_master': startup_report['forked_at'] is not None,
+                    'modules_loaded': len(sys.modules), 'peak_rss_mb': peak_rss_mb(), 'deferred_imports_ms': deferred})
+
+def serve(argv):
+    parser = argparse.ArgumentParser(prog='python app.py serve', description='Run the app with a production WSGI server.')
+    parser.add_argument('--bind', default=os.getenv('BIND', '0.0.0.0:8000'), help='host:port to listen on')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_WORKERS', 2)), help='worker processes')
+    parser.add_argument('--threads', type=int, default=int(os.getenv('WEB_THREADS', 32)), help='threads per worker')
+    parser.add_argument('--timeout', type=int, default=120, help='seconds before a stuck worker is restarted')
+    parser.add_argument('--graceful-timeout', type=int, default=30, help='seconds to finish requests and AI jobs on shutdown')
+    args = parser.parse_args(argv)
+    # Live-update streams each hold a thread; the rest stay free for check-ins and page loads.
+    serve_state['stream_slots'] = max(1, args.threads - LIVE_RESERVED_THREADS)
+
+    setup_app()
+    if initial_setup():
+        return
+    if not os.path.exists(STATUS_FILE):
+        save_data(STATUS_FILE, {'is_open': False})
+    if app.secret_key == DEV_SECRET_KEY:
+        print("WARNING: FLASK_SECRET_KEY is not set; sessions are signed with the development key.")
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        try:
+            from waitress import serve as waitress_serve
+        except ImportError:
+            sys.exit("Serve mode needs gunicorn (Linux/macOS) or waitress (Windows): pip install gunicorn waitress")
+        host, port = args.bind.rsplit(':', 1)
+        print(f"gunicorn is not available; serving a single process with {args.threads} threads via waitress.")
+        start_ai_workers()
+        start_retention_scheduler()
+        print_startup_report('waitress')
+        atexit.register(drain_background_work, args.graceful_timeout)
+        waitress_serve(app, host=host, port=int(port), threads=args.threads)
+        return
+
+    serve_state['workers'] = args.workers
+    options = {
+        'bind': args.bind, 'workers': args.workers, 'threads': args.threads, 'worker_class': 'gthread',
+        'timeout': args.timeout, 'graceful_timeout': args.graceful_timeout,
+        'post_fork': lambda server, worker: startup_report.update(forked_at=time.perf_counter()),
+        'post_worker_init': lambda worker: (start_ai_workers(), start_retention_scheduler(),
+                                            print_startup_report('worker', forked_at=startup_report['forked_at'])),
+        'worker_exit': lambda server, worker: drain_background_work(args.graceful_timeout),
+    }
+
+    class ProductionServer(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    print_startup_report('master')
+    ProductionServer().run()
+
+startup_report['import_ms'] = round((time.perf_counter() - BOOT_STARTED) * 1000, 1)
 
 if __name__ == '__main__':
+    if sys.argv[1:2] == ['serve']:
+        serve(sys.argv[2:])
+        sys.exit()
+    if sys.argv[1:2] == ['gemini-stub']:
+        run_gemini_stub(sys.argv[2:])
+        sys.exit()
+    if sys.argv[1:2] == ['verify']:
+        sys.exit(0 if verify_data(repair='--repair' in sys.argv[2:]) else 1)
+    if sys.argv[1:2] == ['compact']:
+        setup_app()
+        with retention_lock:
+            print(json.dumps(compact_checkins(dry_run='--dry-run' in sys.argv[2:], trigger='command line'), indent=4))
+        sys.exit()
     setup_app()
     if initial_setup():
         exit()
     if not os.path.exists(STATUS_FILE):
         save_data(STATUS_FILE, {'is_open': False})
+    # The debug reloader re-runs this module in a child process; only that child serves requests.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_ai_workers()
+        start_retention_scheduler()
+        print_startup_report('dev server')
     app.run(debug=True)
@@ -0,0 +1,51 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+
+def reset_caches():
+    """Forgets in-memory state kept for the previous test's data folder."""
+    app_module.registry_cache.update(version=None, index=None)
+    app_module.archive_cache.update(signature=None, table=None)
+    app_module.checkin_table_cache.update(signature=None, table=None, records=None, count=0, hidden_before=None)
+    app_module.rollup_cache.update(signature=None, daily=None, weekly=None)
+    app_module.checkin_id_index.update(checkins=None, scanned=0, ids=set())
+    app_module.alert_index.update(signature=None, by_id={}, by_student={})
+    app_module.notification_cache.update(signature=None, buckets={})
+    for store in app_module.journaled_stores.values():
+        store.state = None
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """The app running on an empty data folder, with alert emails switched off."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app_module, 'WAL_FSYNC', False)
+    monkeypatch.setattr(app_module, 'send_alert_email', lambda subject, body: None)
+    reset_caches()
+    with open(app_module.USERS_FILE, 'w', encoding='utf-8') as f:
+        json.dump([{'email': 'admin@example.com', 'password': generate_password_hash('pw'), 'role': 'super_admin'}], f)
+    app_module.setup_app()
+    app_module.save_data(app_module.STATUS_FILE, {'is_open': True})
+    yield app_module
+    reset_caches()
+
+
+@pytest.fixture
+def sent_emails(app, monkeypatch):
+    sent = []
+    monkeypatch.setattr(app, 'send_alert_email', lambda subject, body: sent.append(subject))
+    return sent
+
+
+@pytest.fixture
+def client(app):
+    client = app.app.test_client()
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'pw'})
+    return client
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def handled(app, monkeypatch):
+    """Runs AI jobs with a handler that records the payloads it was given instead of calling the model."""
+    calls = []
+    monkeypatch.setattr(app, 'ai_job_handlers', lambda: {'chat': lambda payload: calls.append(payload) or ({'reply': 'hi'}, 200)})
+    return calls
+
+
+def write_job(app, job_id, claim_owner=None):
+    os.makedirs(app.AI_JOB_CLAIMS_FOLDER, exist_ok=True)
+    app.save_data(app.ai_job_path(job_id), {'id': job_id, 'kind': 'chat', 'status': 'running', 'requested_by': 'admin@example.com',
+                                            'created_on': '2026-01-05T10:00:00', 'payload': {'message': job_id}})
+    if claim_owner is not None:
+        with open(app.ai_job_claim_path(job_id), 'w') as f:
+            f.write(claim_owner)
+
+
+def job_status(app, job_id):
+    return app.load_data(app.ai_job_path(job_id), None)['status']
+
+
+def test_claim_left_by_an_earlier_run_is_taken_over(app, handled):
+    write_job(app, 'j1', claim_owner='earlier-run 1234')
+    app._process_ai_job('j1')
+    assert handled == [{'message': 'j1'}]
+    assert job_status(app, 'j1') == 'done'
+    assert not os.path.exists(app.ai_job_claim_path('j1'))
+
+
+def test_claim_of_a_dead_worker_is_taken_over(app, handled, monkeypatch):
+    write_job(app, 'j1', claim_owner=f"{app.serve_state['run_id']} 4242")
+    monkeypatch.setattr(app, 'process_alive', lambda pid: pid != 4242)
+    app._process_ai_job('j1')
+    assert job_status(app, 'j1') == 'done'
+
+
+def test_claim_of_a_live_worker_is_respected(app, handled):
+    owner = f"{app.serve_state['run_id']} {os.getppid()}"
+    write_job(app, 'j1', claim_owner=owner)
+    app._process_ai_job('j1')
+    assert handled == []
+    assert job_status(app, 'j1') == 'running'
+    with open(app.ai_job_claim_path('j1')) as f:
+        assert f.read() == owner
+
+
+def test_claim_already_released_does_not_fail_the_job(app, monkeypatch):
+    write_job(app, 'j1')
+    monkeypatch.setattr(app, 'ai_job_handlers', lambda: {'chat': lambda payload: os.remove(app.ai_job_claim_path('j1')) or ({}, 200)})
+    app._process_ai_job('j1')
+    assert job_status(app, 'j1') == 'done'
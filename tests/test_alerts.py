@@ -0,0 +1,74 @@
+import math
+from datetime import datetime, timedelta
+
+import pytest
+
+
+def low_morale_rule(app, **overrides):
+    return app.validate_alert_rule(dict({
+        'key': 'morale-low', 'metric': 'morale', 'window': 2, 'aggregation': 'max', 'threshold': 3,
+        'title': 'Low morale for {name}', 'message': '{name} was at {value:.0f} on {days}.',
+        'email_detail': '<b>{name}</b> stayed at or below {threshold} for {window} check-ins.',
+    }, **overrides))
+
+
+def history(app, name, scores, days_ago=10):
+    start = datetime.now().replace(microsecond=0) - timedelta(days=days_ago)
+    return [{'name': name, 'morale': score, 'understanding': 8, 'timestamp': (start + timedelta(days=i)).isoformat()}
+            for i, score in enumerate(scores)]
+
+
+@pytest.mark.parametrize('overrides', [
+    {'title': 'Low morale for {student}'},
+    {'message': '{name} dropped to {value:.1f'},
+    {'email_detail': '{0} is struggling'},
+    {'title': None},
+    {'threshold': 'nan'},
+    {'threshold': math.inf},
+    {'window': 0},
+    {'metric': 'attendance'},
+])
+def test_rule_validation_rejects_rules_that_cannot_fire(app, overrides):
+    with pytest.raises(ValueError):
+        low_morale_rule(app, **overrides)
+
+
+def test_rules_api_rejects_unknown_placeholder(client):
+    rule = {'key': 'morale-5-day-avg', 'title': 'Low morale for {student}'}
+    response = client.post('/api/alert_rules', json={'rules': [rule]})
+    assert response.status_code == 400
+    assert all('{student}' not in r['title'] for r in client.get('/api/alert_rules').get_json())
+
+
+def test_rule_fires_on_checkin_and_emails_once(app, sent_emails):
+    app.save_data(app.ALERT_RULES_FILE, [low_morale_rule(app)])
+    for morale in (2, 3):
+        assert app.ingest_checkins([{'name': 'amy lee', 'morale': morale, 'understanding': 8}])[0]['status'] == 'saved'
+    alerts = app.get_open_alerts_for_student('Amy Lee')
+    assert [a['title'] for a in alerts] == ['Low morale for Amy Lee']
+    assert alerts[0]['student_id'] == app.student_id_for('Amy Lee')
+    assert len(sent_emails) == 1
+
+    app.ingest_checkins([{'name': 'Amy Lee', 'morale': 1, 'understanding': 8}])
+    assert len(app.get_open_alerts_for_student('Amy Lee')) == 1
+
+
+def test_failing_alert_pass_keeps_checkin_saved(app, monkeypatch):
+    def broken(checkins):
+        raise KeyError('student')
+    monkeypatch.setattr(app, 'run_alert_pass', broken)
+    assert app.ingest_checkins([{'name': 'Bo', 'morale': 5, 'understanding': 5, 'client_id': 'c1'}])[0]['status'] == 'saved'
+    assert len(app.checkin_store.data()) == 1
+
+
+def test_backfill_finds_each_past_window_once(app):
+    with app.checkin_lock:
+        app.checkin_store.append('append_batch', entries=history(app, 'Cy', [2, 2, 8, 1, 1, 1]))
+    rule = low_morale_rule(app)
+    results = app.backfill_alerts([rule], app.load_checkin_table(), lambda alert_id, date_str: False)
+    dates = [alert['date'] for alert, _ in results]
+    assert len(dates) == 3 and dates == sorted(set(dates))
+
+    raised = {alert_id for _, alert_id in results[:1]}
+    again = app.backfill_alerts([rule], app.load_checkin_table(), lambda alert_id, date_str: alert_id in raised)
+    assert len(again) == 2
@@ -0,0 +1,113 @@
+import base64
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import pytest
+
+WORD_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+
+def png_base64(size=(2400, 1800)):
+    Image = pytest.importorskip('PIL.Image')  # Without Pillow, image attachments are forwarded unmodified.
+    output = BytesIO()
+    Image.effect_noise(size, 64).convert('RGB').save(output, format='PNG')
+    return base64.b64encode(output.getvalue()).decode('ascii')
+
+
+@pytest.fixture
+def api_key(monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEY', 'test-key')
+
+
+def docx_base64(text):
+    output = BytesIO()
+    with zipfile.ZipFile(output, 'w') as document:
+        document.writestr('word/document.xml', f'<w:document xmlns:w="{WORD_NS}"><w:body><w:p><w:r><w:t>{text}</w:t></w:r></w:p></w:body></w:document>')
+    return base64.b64encode(output.getvalue()).decode('ascii')
+
+
+@pytest.fixture
+def thread_pool(app, monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(app, 'get_export_pool', lambda: pool)
+    yield pool
+    pool.shutdown(wait=False)
+
+
+@pytest.mark.parametrize('mime_type', ['image/png', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'])
+def test_chat_rejects_malformed_attachment_data(client, api_key, mime_type):
+    if mime_type.startswith('image/'):
+        pytest.importorskip('PIL.Image')
+    response = client.post('/api/chat', json={'message': 'hi', 'fileData': 'not base64!', 'mimeType': mime_type})
+    assert response.status_code == 400
+    assert 'base64' in response.get_json()['error']
+
+
+def test_downscaled_image_is_cached(app):
+    data = png_base64()
+    first = app.prepare_inline_image(data, 'image/png')
+    second = app.prepare_inline_image(data, 'image/png')
+    assert (first[1], first[2], second[2]) == ('image/jpeg', False, True)
+    assert first[0] == second[0]
+    assert not [f for f in os.listdir(app.IMAGE_CACHE_FOLDER) if f.endswith('.tmp')]
+
+
+def test_cache_removes_least_recently_used_files(app, tmp_path):
+    folder = str(tmp_path / 'cache')
+    limit_mb = 2500 / (1024 * 1024)
+    for name in ('a', 'b'):
+        app.write_cache_file(folder, name, b'x' * 1000, limit_mb)
+    past = time.time() - 60
+    os.utime(os.path.join(folder, 'a'), (past, past))
+    os.utime(os.path.join(folder, 'b'), (past - 10, past - 10))
+    assert app.read_cache_file(os.path.join(folder, 'b')) == b'x' * 1000  # Now the most recently used.
+    app.write_cache_file(folder, 'c', b'x' * 1000, limit_mb)
+    assert sorted(os.listdir(folder)) == ['b', 'c']
+    assert app.read_cache_file(os.path.join(folder, 'a')) is None
+
+
+def test_extracted_text_is_cached(app, thread_pool):
+    part = app.prepare_inline_document(docx_base64('Fractions recap'), app.DOCX_MIMETYPE)
+    assert part['text'].endswith('Fractions recap')
+    files = os.listdir(app.TEXT_CACHE_FOLDER)
+    assert len(files) == 1 and files[0].endswith('.txt')
+    with open(os.path.join(app.TEXT_CACHE_FOLDER, files[0]), encoding='utf-8') as f:
+        assert f.read() == 'Fractions recap'
+
+
+def test_stuck_extraction_gives_up_at_the_timeout(app, thread_pool, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(app, 'extract_document_text', lambda raw, mime_type: release.wait(10) and 'late')
+    monkeypatch.setattr(app, 'EXTRACTION_TIMEOUT_SECONDS', 0.2)
+    started = time.monotonic()
+    try:
+        assert app.prepare_inline_document(docx_base64('x'), app.DOCX_MIMETYPE) is None
+        assert time.monotonic() - started < 2
+        assert not os.path.exists(app.TEXT_CACHE_FOLDER)
+    finally:
+        release.set()
+
+
+@pytest.mark.parametrize('body', [
+    ['not', 'an', 'object'],
+    {'title': 'Fractions', 'fileData': 'not base64!', 'mimeType': 'application/pdf'},
+    {'title': 'Fractions', 'fileData': 42, 'mimeType': 'application/pdf'},
+    {'title': 'Fractions', 'fileData': base64.b64encode(b'%PDF').decode('ascii')},
+    {'title': ['Fractions'], 'text': 'Halves and quarters'},
+])
+def test_lesson_context_rejects_bad_payloads(client, body):
+    response = client.post('/api/lesson_contexts', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_lesson_context_stores_the_decoded_file(app, client):
+    response = client.post('/api/lesson_contexts', json={'title': 'Fractions', 'fileData': base64.b64encode(b'%PDF-1.4').decode('ascii'),
+                                                          'mimeType': 'application/pdf'})
+    assert response.status_code == 201
+    with open(os.path.join(app.LESSON_CONTEXTS_FOLDER, response.get_json()['id']), 'rb') as f:
+        assert f.read() == b'%PDF-1.4'
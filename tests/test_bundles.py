@@ -0,0 +1,66 @@
+import json
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def thread_pool(app, monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(app, 'get_export_pool', lambda: pool)
+    yield pool
+    pool.shutdown()
+
+
+def write_job(app, job_id, status, when, owner='earlier-run 1'):
+    os.makedirs(app.BUNDLE_FOLDER, exist_ok=True)
+    app.save_data(app.bundle_job_path(job_id), {'id': job_id, 'status': status, 'owner': owner, 'done': 0, 'total': 0,
+                                                'requested_on': when, 'finished_on': when if status in ('done', 'failed') else None})
+    with open(os.path.join(app.BUNDLE_FOLDER, f"{job_id}.zip"), 'wb') as f:
+        f.write(b'zip')
+
+
+def test_failed_render_is_listed_in_the_manifest(app, thread_pool, monkeypatch):
+    app.ingest_checkins([{'name': 'Amy', 'morale': 7, 'understanding': 8}, {'name': 'Bo', 'morale': 5, 'understanding': 6}])
+    render_export = app.render_export
+
+    def flaky(kind, source, format_type):
+        if source == 'Bo':
+            raise RuntimeError('font missing')
+        return render_export(kind, source, format_type)
+    monkeypatch.setattr(app, 'render_export', flaky)
+    write_job(app, 'b1', 'queued', datetime.now().isoformat(timespec='seconds'), owner=app.job_owner())
+    app.run_export_bundle('b1')
+
+    job = app.load_data(app.bundle_job_path('b1'), None)
+    formats = len(app.EXPORT_MIMETYPES)
+    assert (job['status'], job['errors'], job['done']) == ('done', formats, job['total'])
+    with zipfile.ZipFile(job['zip_path']) as bundle:
+        manifest = json.loads(bundle.read('manifest.json'))
+        assert any(name.startswith('students/') and 'Amy' in name for name in bundle.namelist())
+    assert [(e['source'], e['error']) for e in manifest['errors']] == [('Bo', 'font missing')] * formats
+
+
+def test_startup_fails_bundles_left_running(app):
+    now = datetime.now().isoformat(timespec='seconds')
+    write_job(app, 'stale', 'running', now)
+    write_job(app, 'live', 'running', now, owner=app.job_owner())
+    app.setup_app()
+    assert app.load_data(app.bundle_job_path('stale'), None)['status'] == 'failed'
+    assert app.load_data(app.bundle_job_path('live'), None)['status'] == 'running'
+
+
+def test_old_bundles_are_pruned(app, monkeypatch):
+    now = datetime.now()
+    for i in range(7):
+        write_job(app, f"recent{i}", 'done', (now - timedelta(hours=i)).isoformat(timespec='seconds'))
+    write_job(app, 'expired', 'failed', (now - timedelta(days=app.BUNDLE_RETENTION_DAYS + 1)).isoformat(timespec='seconds'))
+    write_job(app, 'live', 'running', now.isoformat(timespec='seconds'), owner=app.job_owner())
+    with open(os.path.join(app.BUNDLE_FOLDER, 'orphan.zip'), 'wb') as f:
+        f.write(b'zip')
+    app.prune_bundles()
+    kept = {name.split('.')[0] for name in os.listdir(app.BUNDLE_FOLDER)}
+    assert kept == {f"recent{i}" for i in range(app.BUNDLES_KEPT)} | {'live'}
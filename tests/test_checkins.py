@@ -0,0 +1,35 @@
+from conftest import reset_caches
+
+
+def item(client_id, name='Amy', morale=6):
+    return {'client_id': client_id, 'name': name, 'morale': morale, 'understanding': 7}
+
+
+def post_batch(client, *items):
+    response = client.post('/api/checkin/batch', json={'checkins': list(items)})
+    assert response.status_code == 200
+    return [result['status'] for result in response.get_json()['results']]
+
+
+def test_repeated_client_id_within_a_batch_is_saved_once(app, client):
+    assert post_batch(client, item('c1'), item('c2', 'Bo'), item('c1')) == ['saved', 'saved', 'duplicate']
+    assert [c['client_id'] for c in app.checkin_store.data()] == ['c1', 'c2']
+
+
+def test_resent_batch_is_recognised(app, client):
+    post_batch(client, item('c1'), item('c2', 'Bo'))
+    assert post_batch(client, item('c2', 'Bo'), item('c1'), item('c3')) == ['duplicate', 'duplicate', 'saved']
+    reset_caches()  # Another worker process, reading the log from disk.
+    assert post_batch(client, item('c3'), item('c1')) == ['duplicate', 'duplicate']
+    assert len(app.checkin_store.data()) == 3
+
+
+def test_rejected_item_can_be_resent(app, client):
+    assert post_batch(client, item('c1', morale='high')) == ['rejected']
+    assert post_batch(client, item('c1')) == ['saved']
+
+
+def test_single_checkin_reports_a_duplicate(app, client):
+    assert client.post('/api/checkin', json=item('c1')).get_json() == {'success': True, 'duplicate': False}
+    assert client.post('/api/checkin', json=item('c1')).get_json() == {'success': True, 'duplicate': True}
+    assert len(app.checkin_store.data()) == 1
@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+import requests
+from werkzeug.serving import make_server
+
+PRIMARY = 'gemini-1.5-flash-latest'
+FALLBACK = 'stub-fallback'
+CONTENTS = [{'parts': [{'text': 'hello'}]}]
+
+
+@pytest.fixture
+def stub(app, monkeypatch):
+    """An in-process fault-injecting stub, with fresh breakers that open after 3 failures (one call's attempts) and reset after 0.3s."""
+    stub_app, options = app.gemini_stub_app([])
+    server = make_server('127.0.0.1', 0, stub_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(app, 'GEMINI_API_BASE', f"http://127.0.0.1:{server.server_port}/v1beta")
+    monkeypatch.setattr(app, 'GEMINI_BACKOFF_SECONDS', 0.01)
+    monkeypatch.setattr(app, 'BREAKER_FAILURE_THRESHOLD', 3)
+    monkeypatch.setattr(app, 'BREAKER_RESET_SECONDS', 0.3)
+    monkeypatch.setattr(app, 'gemini_breakers', {})
+    options.stats = lambda: requests.get(f"http://127.0.0.1:{server.server_port}/stub/stats").json()
+    yield options
+    server.shutdown()
+
+
+def reply_text(result):
+    return result['candidates'][0]['content']['parts'][0]['text']
+
+
+def test_breaker_opens_and_short_circuits(app, stub):
+    stub.error_rate = 1.0
+    with pytest.raises(requests.exceptions.HTTPError):
+        app.call_gemini('key', CONTENTS, timeout=5)
+    breaker = app.gemini_breakers[PRIMARY]
+    assert breaker.state == 'open'
+    with pytest.raises(app.AIUnavailableError):
+        app.call_gemini('key', CONTENTS, timeout=5)
+    assert stub.stats()[f"{PRIMARY} requests"] == 3
+    assert breaker.stats['short_circuits'] == 1
+
+
+def test_half_open_probe_closes_or_reopens(app, stub):
+    stub.error_rate = 1.0
+    with pytest.raises(requests.exceptions.HTTPError):
+        app.call_gemini('key', CONTENTS, timeout=5)
+    breaker = app.gemini_breakers[PRIMARY]
+    time.sleep(0.35)
+    assert breaker.state == 'half_open'
+    # A failed probe reopens the circuit without a second attempt.
+    with pytest.raises(app.AIUnavailableError):
+        app.call_gemini('key', CONTENTS, timeout=5)
+    assert breaker.state == 'open'
+    assert stub.stats()[f"{PRIMARY} requests"] == 4
+
+    stub.error_rate = 0.0
+    time.sleep(0.35)
+    assert reply_text(app.call_gemini('key', CONTENTS, timeout=5)).startswith(f"[{PRIMARY} stub]")
+    assert breaker.state == 'closed'
+
+
+def test_unreadable_probe_lets_the_next_call_probe(app, stub):
+    stub.error_rate = 1.0
+    with pytest.raises(requests.exceptions.HTTPError):
+        app.call_gemini('key', CONTENTS, timeout=5)
+    stub.error_rate, stub.garbage_rate = 0.0, 1.0
+    time.sleep(0.35)
+    with pytest.raises(ValueError):
+        app.call_gemini('key', CONTENTS, timeout=5)
+    breaker = app.gemini_breakers[PRIMARY]
+    assert not breaker.probing
+    stub.garbage_rate = 0.0
+    app.call_gemini('key', CONTENTS, timeout=5)
+    assert breaker.state == 'closed'
+
+
+def test_falls_back_when_the_primary_fails(app, stub):
+    stub.fail_model = [PRIMARY]
+    before = dict(app.gemini_call_stats)
+    result = app.call_gemini('key', CONTENTS, timeout=5, fallback_model=FALLBACK)
+    assert reply_text(result).startswith(f"[{FALLBACK} stub]")
+    assert app.gemini_call_stats['fallbacks'] == before['fallbacks'] + 1
+
+
+def test_over_quota_is_not_retried_or_sent_to_the_fallback(app, stub):
+    stub.error_rate, stub.status = 1.0, 429
+    with pytest.raises(requests.exceptions.HTTPError) as excinfo:
+        app.call_gemini('key', CONTENTS, timeout=5, fallback_model=FALLBACK)
+    assert excinfo.value.response.status_code == 429
+    stats = stub.stats()
+    assert stats[f"{PRIMARY} requests"] == 1
+    assert f"{FALLBACK} requests" not in stats
+    assert app.gemini_breakers[PRIMARY].state == 'closed'
+
+
+def test_every_attempt_waits_for_the_limiter(app, stub):
+    class CountingLimiter:
+        waits = 0
+
+        def wait(self):
+            self.waits += 1
+
+    limiter = CountingLimiter()
+    stub.error_rate = 1.0
+    with pytest.raises(requests.exceptions.HTTPError):
+        app.call_gemini('key', CONTENTS, timeout=5, limiter=limiter)
+    assert limiter.waits == stub.stats()[f"{PRIMARY} requests"] == 3
+
+
+@pytest.mark.parametrize('fault', [{'delay': 3.0}, {'drip_seconds': 0.05}])
+def test_deadline_covers_slow_responses(app, stub, fault):
+    """A slow server and one trickling its body byte by byte must both be cut off at the deadline."""
+    for name, value in fault.items():
+        setattr(stub, name, value)
+    start = time.monotonic()
+    with pytest.raises(requests.exceptions.RequestException):
+        app.call_gemini('key', CONTENTS, timeout=1)
+    assert time.monotonic() - start < 1.5
@@ -0,0 +1,46 @@
+import os
+import time
+
+
+def test_rate_limit_is_shared_between_processes(app):
+    # Two limiters with the same name stand in for two worker processes: flock() also excludes the second
+    # handle opened by this process.
+    first, second = app.RateLimiter('test', 600), app.RateLimiter('test', 600)
+    started = time.monotonic()
+    for limiter in (first, second, first, second):
+        limiter.wait()
+    assert time.monotonic() - started >= 0.3 - 0.01
+
+
+def test_clock_set_back_does_not_stall_the_limiter(app):
+    limiter = app.RateLimiter('test', 600)
+    app.save_data(limiter.path, {'next_slot': time.time() + 86400})
+    started = time.monotonic()
+    limiter.wait()
+    assert time.monotonic() - started < 1
+
+
+def write_job(app, job_id, owner, students):
+    os.makedirs(app.GUIDANCE_JOBS_FOLDER, exist_ok=True)
+    job = {'id': job_id, 'status': 'running', 'owner': owner, 'lesson_context': '', 'lesson_context_id': None,
+           'requested_by': 'admin@example.com', 'requested_on': '2026-01-05T10:00:00', 'total': len(students),
+           'done': sum(1 for s in students.values() if s['status'] == 'done'), 'students': students}
+    app.save_data(app.guidance_job_path(job_id), job)
+
+
+def test_startup_fails_jobs_left_by_an_earlier_run(app):
+    write_job(app, 'old', 'earlier-run 1234', {'Amy': {'status': 'done'}, 'Bo': {'status': 'running'}, 'Cy': {'status': 'pending'}})
+    write_job(app, 'live', app.job_owner(), {'Amy': {'status': 'running'}})
+    app.setup_app()
+    old = app.load_data(app.guidance_job_path('old'), None)
+    assert old['status'] == 'failed' and old['done'] == 3
+    assert [old['students'][name]['status'] for name in ('Amy', 'Bo', 'Cy')] == ['done', 'failed', 'failed']
+    assert app.load_data(app.guidance_job_path('live'), None)['status'] == 'running'
+
+
+def test_status_reports_a_job_whose_worker_died(app, client, monkeypatch):
+    write_job(app, 'orphan', f"{app.serve_state['run_id']} 4242", {'Amy': {'status': 'pending'}})
+    monkeypatch.setattr(app, 'process_alive', lambda pid: pid != 4242)
+    job = client.get('/api/guidance/bulk/orphan').get_json()
+    assert job['status'] == 'failed'
+    assert job['students']['Amy']['status'] == 'failed'
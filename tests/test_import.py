@@ -0,0 +1,49 @@
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+
+def csv_file(rows):
+    lines = ['Name,Morale,Understanding,Date,Time'] + [','.join(map(str, row)) for row in rows]
+    return io.BytesIO(('\n'.join(lines) + '\n').encode('utf-8'))
+
+
+@pytest.fixture
+def rows():
+    day = (datetime.now() - timedelta(days=3)).strftime('%Y-%m-%d')
+    return [('Amy Lee', 5, 6, day, '09:00:00'), ('Bo', 7, 7, day, '09:05:00'), ('amy lee', 5, 6, day, '09:00:00')]
+
+
+def test_duplicate_across_chunk_boundary_is_skipped(app, monkeypatch, rows):
+    monkeypatch.setattr(app, 'IMPORT_CHUNK_ROWS', 2)
+    summary = app.import_checkins(csv_file(rows), 'history.csv', dry_run=False)
+    assert (summary['imported'], summary['duplicates']) == (2, 1)
+    assert len(app.checkin_store.data()) == 2
+
+
+def test_dry_run_counts_match_real_run(app, monkeypatch, rows):
+    monkeypatch.setattr(app, 'IMPORT_CHUNK_ROWS', 2)
+    preview = app.import_checkins(csv_file(rows), 'history.csv', dry_run=True)
+    result = app.import_checkins(csv_file(rows), 'history.csv', dry_run=False)
+    assert {k: preview[k] for k in ('rows', 'imported', 'duplicates', 'errors')} == \
+           {k: result[k] for k in ('rows', 'imported', 'duplicates', 'errors')}
+
+
+def test_reimport_and_rows_saved_meanwhile_are_duplicates(app, monkeypatch, rows):
+    app.import_checkins(csv_file(rows), 'history.csv', dry_run=False)
+    again = app.import_checkins(csv_file(rows), 'history.csv', dry_run=False)
+    assert (again['imported'], again['duplicates']) == (0, 3)
+
+    # A row stored after the import read the table is still caught when its chunk is written.
+    extra = ('Cy', 4, 4, rows[0][3], '10:00:00')
+    original_load = app.load_checkin_table
+    def load_then_checkin():
+        table = original_load()
+        with app.checkin_lock:
+            app.checkin_store.append('append', entry={'name': 'Cy', 'student_id': app.register_students(['Cy'])['Cy'],
+                                                      'morale': 4, 'understanding': 4, 'timestamp': f"{extra[3]}T{extra[4]}"})
+        return table
+    monkeypatch.setattr(app, 'load_checkin_table', load_then_checkin)
+    summary = app.import_checkins(csv_file([extra]), 'late.csv', dry_run=False)
+    assert (summary['imported'], summary['duplicates']) == (0, 1)
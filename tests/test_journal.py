@@ -0,0 +1,94 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+
+
+def append_value(state, record):
+    return state + [record['value']]
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app, 'WAL_FSYNC', False)
+    yield tmp_path
+    app.journaled_stores.pop('notes', None)
+
+
+def open_store(lock):
+    return app.JournaledStore('notes', None, [], append_value, lock)
+
+
+def write(store, *values):
+    with store.lock:
+        for value in values:
+            store.append('add', value=value)
+
+
+def test_recover_discards_torn_tail(data_dir):
+    lock = app.ProcessLock('notes')
+    write(open_store(lock), 1, 2, 3)
+    segment = open_store(lock).segment_path(1)
+    intact_size = os.path.getsize(segment)
+    with open(segment, 'ab') as f:
+        f.write(b'{"seq": 4, "op": "add", "val')
+
+    store = open_store(lock)
+    store.recover()
+    assert store.data() == [1, 2, 3]
+    assert os.path.getsize(segment) == intact_size
+
+    write(store, 4)
+    assert open_store(lock).data() == [1, 2, 3, 4]
+
+
+def test_verify_repair_keeps_records_before_damage(data_dir):
+    lock = app.ProcessLock('notes')
+    store = open_store(lock)
+    write(store, 1, 2, 3, 4)
+    segment = store.segment_path(1)
+    with open(segment, 'rb') as f:
+        lines = f.readlines()
+    lines[2] = lines[2].replace(b'3', b'7')
+    with open(segment, 'wb') as f:
+        f.writelines(lines)
+
+    with pytest.raises(app.StoreCorruptError):
+        open_store(lock).data()
+    assert app.verify_store(open_store(lock)) is False
+    assert app.verify_store(open_store(lock), repair=True) is True
+
+    assert open_store(lock).data() == [1, 2]
+    assert os.listdir(app.STORE_DAMAGED_FOLDER)
+    assert app.verify_store(open_store(lock)) is True
+
+
+def test_reader_catches_up_across_snapshots_and_segments(data_dir, monkeypatch):
+    monkeypatch.setattr(app, 'WAL_SNAPSHOT_RECORDS', 3)
+    lock = app.ProcessLock('notes')
+    writer, reader = open_store(lock), open_store(lock)
+    writer.recover()
+
+    write(writer, 1, 2)
+    assert reader.data() == [1, 2]
+
+    # Two snapshots pass, so the segment the reader was following is removed.
+    write(writer, 3, 4, 5, 6, 7)
+    assert not os.path.exists(writer.segment_path(1))
+    assert reader.data() == [1, 2, 3, 4, 5, 6, 7]
+
+    write(reader, 8)
+    assert writer.data() == [1, 2, 3, 4, 5, 6, 7, 8]
+    assert open_store(lock).data() == [1, 2, 3, 4, 5, 6, 7, 8]
+
+
+def test_load_data_keeps_one_copy_of_a_corrupt_file(data_dir):
+    with open('status.json', 'w', encoding='utf-8') as f:
+        f.write('{"is_open": tr')
+    assert app.load_data('status.json', {'is_open': False}) == {'is_open': False}
+    assert app.load_data('status.json', {'is_open': False}) == {'is_open': False}
+    assert len([name for name in os.listdir() if name.startswith('status.json.corrupt-')]) == 1
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from conftest import reset_caches
+
+NOW = datetime.now().replace(microsecond=0)
+
+
+def entry(name, days_ago, morale=5):
+    return {'name': name, 'morale': morale, 'understanding': 7, 'timestamp': (NOW - timedelta(days=days_ago)).isoformat()}
+
+
+def save(app, *entries):
+    with app.checkin_lock:
+        app.checkin_store.append('append_batch', entries=list(entries))
+
+
+def rollup_totals(app):
+    daily, _ = app.load_rollups()
+    names = app.student_registry()['names']
+    return sorted((names[s], int(c), int(m)) for s, c, m in zip(daily.student, daily.count, daily.morale_sum))
+
+
+def raw_names(app):
+    return sorted(row.name for row in app.load_checkin_table().rows())
+
+
+def enable_retention(app, raw_days=60):
+    app.save_data(app.RETENTION_POLICY_FILE, {'enabled': True, 'raw_days': raw_days, 'interval_hours': 24})
+
+
+def test_rows_past_the_cutoff_move_to_rollups_and_cold_storage(app):
+    enable_retention(app)
+    save(app, entry('Amy', 200, morale=4), entry('Bo', 100, morale=6))
+    app.seal_checkins((NOW - timedelta(days=150)).strftime('%Y-%m-%d'))  # Amy's row now lives in the archive.
+    save(app, entry('Amy', 90, morale=8), entry('Amy', 5), entry('Bo', 1))
+    with app.retention_lock:
+        report = app.compact_checkins()
+
+    assert (report['rows_rolled_up'], report['students'], report['days']) == (3, 2, 3)
+    assert rollup_totals(app) == [('Amy', 1, 4), ('Amy', 1, 8), ('Bo', 1, 6)]
+    assert sorted((c['name'], c['morale']) for c in app.iter_cold_checkins()) == [('Amy', 4), ('Amy', 8), ('Bo', 6)]
+    assert raw_names(app) == ['Amy', 'Bo']
+    assert len(app.load_archive_table()) == 0
+    assert all(c['timestamp'] >= report['cutoff'] for c in app.checkin_store.data())
+
+    reset_caches()  # Another process reading the compacted files.
+    assert rollup_totals(app) == [('Amy', 1, 4), ('Amy', 1, 8), ('Bo', 1, 6)]
+    assert raw_names(app) == ['Amy', 'Bo']
+
+
+def interrupt_compaction(app, cutoff):
+    """Runs a compaction up to the point where the rollups are written, as if the process died there."""
+    table = app.load_checkin_table()
+    old = np.arange(np.searchsorted(table.ts, app.to_epoch_seconds(cutoff), 'left'))
+    cold_file, daily = app.prepare_compaction(table, old)
+    app.write_rollups(daily, cutoff, pending_drop=cutoff, pending_cold_file=cold_file)
+    return cold_file
+
+
+def test_rolled_up_rows_are_hidden_until_they_are_dropped(app):
+    save(app, entry('Amy', 100), entry('Amy', 2))
+    app.load_checkin_table()
+    cutoff = (NOW - timedelta(days=60)).strftime('%Y-%m-%d')
+    interrupt_compaction(app, cutoff)
+
+    assert len(app.checkin_store.data()) == 2  # The raw row is still stored...
+    assert raw_names(app) == ['Amy']  # ...but not counted next to its rollup.
+    save(app, entry('Bo', 90), entry('Bo', 1))  # e.g. an import of old rows while the drop is pending.
+    assert raw_names(app) == ['Amy', 'Bo']
+    reset_caches()
+    assert raw_names(app) == ['Amy', 'Bo']
+
+
+def test_startup_finishes_an_interrupted_compaction(app):
+    save(app, entry('Amy', 100, morale=3), entry('Amy', 2))
+    cold_file = interrupt_compaction(app, (NOW - timedelta(days=60)).strftime('%Y-%m-%d'))
+    assert app.cold_storage_files() == []  # Still under its .pending name.
+
+    reset_caches()
+    app.setup_app()
+    assert app.cold_storage_files() == [cold_file]
+    assert len(app.checkin_store.data()) == 1
+    assert app.load_data(app.ROLLUP_MANIFEST_FILE, None)['pending_drop'] is None
+
+    enable_retention(app)
+    with app.retention_lock:
+        assert app.compact_checkins()['rows_rolled_up'] == 0
+    assert rollup_totals(app) == [('Amy', 1, 3)]  # Not counted twice.
@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+DEFERRED = ('multiprocessing', 'concurrent.futures', 'xml.etree.ElementTree', 'xml.sax.saxutils', 'openpyxl', 'fpdf', 'PIL', 'pypdf')
+
+
+def test_importing_the_app_leaves_heavy_modules_unloaded(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = f"import sys, app; print(','.join(m for m in {DEFERRED!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, '-c', script], cwd=tmp_path, capture_output=True, text=True,
+                            env={**os.environ, 'PYTHONPATH': root}, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ''
+
+
+def test_second_thread_waits_for_a_module_still_being_imported(app, tmp_path, monkeypatch):
+    (tmp_path / 'slow_module.py').write_text('import time\ntime.sleep(0.3)\nREADY = True\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, 'slow_module', raising=False)
+    first = threading.Thread(target=app.deferred_import, args=('slow_module',))
+    first.start()
+    while 'slow_module' not in sys.modules:
+        time.sleep(0.01)
+    try:
+        assert app.deferred_import('slow_module').READY
+    finally:
+        first.join()
+        sys.modules.pop('slow_module', None)
@@ -0,0 +1,87 @@
+import io
+from datetime import datetime, timedelta
+
+
+def checkin(name, morale=5):
+    return {'name': name, 'morale': morale, 'understanding': 7}
+
+
+def ids(app, *names):
+    registered = app.register_students(names)
+    return [registered[app.normalize_student_name(name)] for name in names]
+
+
+def checkin_counts(app):
+    table = app.load_checkin_table()
+    return {table.names[sid]: len(group) for sid, group in table.student_groups().items()}
+
+
+def test_alias_routes_checkins_to_the_student(app, client):
+    amy, = ids(app, 'Amy')
+    assert client.post(f'/api/students/{amy}/aliases', json={'alias': 'amelia '}).status_code == 200
+    app.ingest_checkins([checkin('Amy'), checkin('Amelia')])
+    assert checkin_counts(app) == {'Amy': 2}
+    assert [(s['name'], s['aliases'], s['checkins']) for s in client.get('/api/students').get_json()] == [('Amy', ['Amelia'], 2)]
+
+
+def test_rename_keeps_the_old_name_as_an_alias(app, client):
+    amy, = ids(app, 'Amy')
+    app.ingest_checkins([checkin('Amy')])
+    assert client.post(f'/api/students/{amy}/rename', json={'name': 'amy lee'}).get_json() == {'id': amy, 'name': 'Amy Lee'}
+    app.ingest_checkins([checkin('Amy')])
+    assert checkin_counts(app) == {'Amy Lee': 2}
+    assert app.student_id_for('amy') == amy
+
+
+def test_names_belonging_to_another_student_are_refused(app, client):
+    amy, bo = ids(app, 'Amy', 'Bo')
+    assert client.post(f'/api/students/{amy}/rename', json={'name': 'Bo'}).status_code == 409
+    assert client.post(f'/api/students/{amy}/aliases', json={'alias': 'bo'}).status_code == 409
+    assert app.student_name(amy) == 'Amy' and app.student_id_for('Bo') == bo
+
+
+def test_merge_moves_checkins_and_aliases(app, client):
+    amy, amyy = ids(app, 'Amy', 'Amyy')
+    app.ingest_checkins([checkin('Amy'), checkin('Amyy'), checkin('Amyy')])
+    assert client.post('/api/students/merge', json={'from_id': amyy, 'into_id': amy}).status_code == 200
+    assert checkin_counts(app) == {'Amy': 3}
+    assert app.student_id_for('Amyy') == amy
+    assert client.post('/api/students/merge', json={'from_id': amyy, 'into_id': amy}).status_code == 409
+    assert [s['id'] for s in client.get('/api/students').get_json()] == [amy]
+
+
+def test_merge_chains_resolve_to_the_last_survivor(app, client):
+    first, second, third = ids(app, 'Amy', 'Amie', 'Aimee')
+    app.ingest_checkins([checkin('Amy'), checkin('Amie'), checkin('Aimee')])
+    client.post('/api/students/merge', json={'from_id': first, 'into_id': second})
+    client.post('/api/students/merge', json={'from_id': second, 'into_id': third})
+    assert [app.root_student_id(sid) for sid in (first, second, third)] == [third] * 3
+    assert app.student_id_for('Amy') == third
+    assert checkin_counts(app) == {'Aimee': 3}
+    app.registry_cache.update(version=None, index=None)  # Another process replaying the registry log.
+    app.student_store.state = None
+    assert app.student_name(first) == 'Aimee'
+
+
+def test_import_matches_rows_of_a_merged_student(app, client):
+    when = datetime.now().replace(microsecond=0) - timedelta(days=2)
+    amy, amyy = ids(app, 'Amy', 'Amyy')
+    with app.checkin_lock:
+        app.checkin_store.append('append', entry={'name': 'Amyy', 'student_id': amyy, 'morale': 5, 'understanding': 7,
+                                                  'timestamp': when.isoformat()})
+    client.post('/api/students/merge', json={'from_id': amyy, 'into_id': amy})
+    csv = f"Name,Morale,Understanding,Date,Time\nAmy,5,7,{when:%Y-%m-%d},{when:%H:%M:%S}\nAmyy,6,7,{when:%Y-%m-%d},08:00:00\n"
+    summary = app.import_checkins(io.BytesIO(csv.encode('utf-8')), 'history.csv', dry_run=False)
+    assert (summary['imported'], summary['duplicates']) == (1, 1)
+    assert checkin_counts(app) == {'Amy': 2}
+
+
+def test_alerts_follow_renames_and_merges(app, client):
+    amy, amyy = ids(app, 'Amy', 'Amyy')
+    app.add_open_alerts([{'id': 'a1', 'title': 'Low Morale Alert for Amyy', 'message': 'Low.', 'date': '2026-01-05',
+                          'type': 'warning', 'student': 'Amyy', 'student_id': amyy, 'status': 'open'}])
+    client.post('/api/students/merge', json={'from_id': amyy, 'into_id': amy})
+    client.post(f'/api/students/{amy}/rename', json={'name': 'Amy Lee'})
+    alert, = app.get_open_alerts_for_student('Amyy')
+    assert app.alert_student(alert) == 'Amy Lee'
+    assert [a['id'] for a in app.get_open_alerts_for_student('Amy Lee')] == ['a1']
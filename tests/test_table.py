@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from conftest import reset_caches
+
+
+def save(app, *entries):
+    with app.checkin_lock:
+        app.checkin_store.append('append_batch', entries=list(entries))
+
+
+def entry(name, when, morale=5):
+    return {'name': name, 'morale': morale, 'understanding': 7, 'timestamp': when.isoformat()}
+
+
+def columns(table):
+    return [np.asarray(getattr(table, name)).tolist() for name, _ in (('student', 0), ('ts', 0), ('morale', 0), ('us', 0))]
+
+
+def test_new_checkins_are_appended_to_the_cached_table(app, monkeypatch):
+    app.ingest_checkins([{'name': 'Amy', 'morale': 5, 'understanding': 7}, {'name': 'Bo', 'morale': 6, 'understanding': 7}])
+    app.load_checkin_table().student_groups()
+
+    parsed = []
+    from_records = app.CheckinTable.from_records.__func__
+    monkeypatch.setattr(app.CheckinTable, 'from_records', classmethod(lambda cls, checkins: parsed.append(len(checkins)) or from_records(cls, checkins)))
+    for name in ('Amy', 'Cy', 'Amy'):
+        app.ingest_checkins([{'name': name, 'morale': 3, 'understanding': 7}])
+        table = app.load_checkin_table()
+    assert parsed == [1, 1, 1]
+    incremental = columns(table), {sid: group.tolist() for sid, group in table.student_groups().items()}
+
+    reset_caches()
+    rebuilt = app.load_checkin_table()
+    assert incremental == (columns(rebuilt), {sid: group.tolist() for sid, group in rebuilt.student_groups().items()})
+
+
+def test_backdated_checkin_keeps_the_table_sorted(app):
+    start = datetime.now().replace(microsecond=0) - timedelta(days=3)
+    save(app, entry('Amy', start), entry('Amy', start + timedelta(days=1)))
+    app.load_checkin_table()
+    save(app, entry('Bo', start + timedelta(hours=5)))
+    table = app.load_checkin_table()
+    assert [row.name for row in table.rows()] == ['Amy', 'Bo', 'Amy']
+    assert table.student_indices('Bo').tolist() == [1]
+
+
+def test_timestamps_keep_their_microseconds(app):
+    when = datetime.now().replace(microsecond=123456) - timedelta(days=1)
+    save(app, entry('Amy', when))
+    row = app.load_checkin_table().rows()[0]
+    assert row.timestamp == when.isoformat()
+    assert row.to_dict()['timestamp'] == when.isoformat()
@@ -0,0 +1,37 @@
+def checkin(name, morale):
+    return {'name': name, 'morale': morale, 'understanding': 7}
+
+
+def test_checkin_logs_only_the_rows_it_changed(app, monkeypatch):
+    app.ingest_checkins([checkin('Amy', 8), checkin('Bo', 7)])
+    logged = []
+    append = app.trend_store.append
+    monkeypatch.setattr(app.trend_store, 'append', lambda op, **payload: logged.append((op, sorted(payload.get('rows', {})))) or append(op, **payload))
+    app.ingest_checkins([checkin('Amy', 6)])
+    assert logged == [('update', ['Amy'])]
+    assert app.get_trend_scores()['Amy']['count'] == 2
+    assert app.get_trend_scores()['Bo']['count'] == 1
+
+
+def test_other_workers_replay_trend_updates(app):
+    app.ingest_checkins([checkin('Amy', 8)])
+    app.ingest_checkins([checkin('Amy', 4)])
+    expected = app.get_trend_scores()
+    app.trend_store.state = None  # A second process reading the store from disk.
+    assert app.get_trend_scores() == expected
+
+
+def test_rows_are_built_from_history_once(app):
+    for morale in (9, 8, 7):
+        app.ingest_checkins([checkin('Amy', morale)])
+    with app.trend_lock:
+        app.trend_store.append('replace', fields=None, rows={})  # e.g. rows saved before TREND_FIELDS changed
+    assert app.get_trend_scores()['Amy']['count'] == 3
+    assert app.update_trend_scores([{'name': 'Amy', 'morale': 6, 'understanding': 7}])['Amy']['count'] == 4
+
+
+def test_trend_alerts_have_their_own_style(app, client):
+    app.add_open_alerts([{'id': 'a1', 'title': 'Declining Morale Trend for Amy', 'message': 'Sliding.', 'date': '2026-01-05',
+                          'type': 'trend', 'metric': 'morale', 'student': 'Amy', 'status': 'open'}])
+    html = client.get('/admin?tab=alerts', follow_redirects=True).get_data(as_text=True)
+    assert 'class="p-4 rounded-lg mb-4 alert-item-trend"' in html